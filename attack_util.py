@@ -4,5 +4,321 @@ Author: Tri Minh Cao
 Email: tricao@utdallas.edu
 Date: December 2016
 """
+import array
+import gzip
+import hashlib
+import json
+import os
+import pickle
 
+# change this when the attack result changes for the same inputs, so old
+# cache entries are not used anymore.
+CACHE_VERSION = 1
 
+
+def file_hash(file_path):
+    """
+    Get the SHA-256 hash of a file's content.
+    :param file_path: path of the file.
+    :return: hex digest string.
+    """
+    h = hashlib.sha256()
+    f = open(file_path, 'rb')
+    chunk = f.read(1 << 20)
+    while chunk:
+        h.update(chunk)
+        chunk = f.read(1 << 20)
+    f.close()
+    return h.hexdigest()
+
+
+def attack_key(input_files, options):
+    """
+    Build the key of an attack run from its input files and options.
+    The key only depends on the content of the files, not on their paths.
+    :param input_files: a list of input file paths (LEF, DEF, ...).
+    :param options: a dictionary of the options that change the result.
+    :return: hex digest string.
+    """
+    h = hashlib.sha256()
+    h.update(('version ' + str(CACHE_VERSION) + '\n').encode())
+    for each_file in input_files:
+        h.update((file_hash(each_file) + '\n').encode())
+    h.update(json.dumps(options, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def connections_to_list(connections):
+    """
+    Convert a connections dictionary to lists, so it can be saved as JSON.
+    :param connections: connections dictionary
+    :return: a list of [source pin, list of sink pins]
+    """
+    result = []
+    for each_source in connections:
+        sinks = [list(each_sink) for each_sink in connections[each_source]]
+        result.append([list(each_source), sinks])
+    return result
+
+
+def connections_from_list(connection_list):
+    """
+    Convert the output of connections_to_list back to a connections
+    dictionary.
+    :param connection_list: a list of [source pin, list of sink pins]
+    :return: connections dictionary
+    """
+    connections = {}
+    for each_source, sinks in connection_list:
+        connections[tuple(each_source)] = [tuple(each_sink) for each_sink in sinks]
+    return connections
+
+
+class ResultCache:
+    """
+    ResultCache stores attack results on the local disk, one gzipped JSON file
+    per key. When the total size is larger than max_size, the least recently
+    used entries are removed.
+    """
+
+    def __init__(self, cache_dir, max_size):
+        """
+        :param cache_dir: directory of the cache, created if needed.
+        :param max_size: maximum total size of the cache in bytes.
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + '.json.gz')
+
+    def get(self, key):
+        """
+        Get the result stored for a key.
+        :param key: the key, see attack_key().
+        :return: the result dictionary, or None if the key is not cached.
+        """
+        path = self.entry_path(key)
+        try:
+            f = gzip.open(path, 'rt')
+            result = json.load(f)
+            f.close()
+        except (IOError, OSError, ValueError):
+            # missing or broken entry
+            return None
+        # the modification time is used as the last access time
+        os.utime(path, None)
+        result['connections'] = connections_from_list(result['connections'])
+        return result
+
+    def put(self, key, connections, cost, stats, verilog):
+        """
+        Store an attack result.
+        :param key: the key, see attack_key().
+        :param connections: connections dictionary
+        :param cost: cost of the flow.
+        :param stats: dictionary of statistics of the attack stages.
+        :param verilog: the verilog netlist string.
+        :return: void
+        """
+        result = {'connections': connections_to_list(connections),
+                  'cost': cost, 'stats': stats, 'verilog': verilog}
+        path = self.entry_path(key)
+        # write to a temporary file first, so other runs never see a partial
+        # entry.
+        temp_path = path + '.' + str(os.getpid()) + '.tmp'
+        f = gzip.open(temp_path, 'wt')
+        json.dump(result, f, separators=(',', ':'))
+        f.close()
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in
+        max_size.
+        :return: void
+        """
+        entries = []
+        total_size = 0
+        for each_file in os.listdir(self.cache_dir):
+            if not each_file.endswith('.json.gz'):
+                continue
+            path = os.path.join(self.cache_dir, each_file)
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((file_stat.st_mtime, file_stat.st_size, path))
+            total_size += file_stat.st_size
+        entries.sort()
+        idx = 0
+        while total_size > self.max_size and idx < len(entries):
+            try:
+                os.remove(entries[idx][2])
+            except OSError:
+                pass
+            total_size -= entries[idx][1]
+            idx += 1
+
+
+def edges_to_arrays(edges):
+    """
+    Store a list of candidate edges in compact arrays.
+    :param edges: a list of (source index, sink index, weight)
+    :return: three arrays: source indices, sink indices, weights.
+    """
+    sources = array.array('q')
+    sinks = array.array('q')
+    weights = array.array('q')
+    for i, j, weight in edges:
+        sources.append(i)
+        sinks.append(j)
+        weights.append(weight)
+    return sources, sinks, weights
+
+
+def edges_from_arrays(sources, sinks, weights):
+    """
+    Convert the output of edges_to_arrays back to a list of edges.
+    :return: a list of (source index, sink index, weight)
+    """
+    return list(zip(sources, sinks, weights))
+
+
+def save_graph(graph_file, source_pins, sink_pins, edges, source_caps,
+               sink_caps, sink_points=None):
+    """
+    Save the candidate graph of an attack (the input of the flow solver) to
+    a gzipped pickle file, see load_graph().
+    :param graph_file: path of the file.
+    :param source_pins: the source pins.
+    :param sink_pins: the sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param source_caps: capacity of each source pin.
+    :param sink_caps: capacity of each sink pin.
+    :param sink_points: the location (x, y) of each sink pin (optional).
+    :return: void
+    """
+    graph = {'source_pins': source_pins, 'sink_pins': sink_pins,
+             'edges': edges_to_arrays(edges),
+             'source_caps': array.array('q', source_caps),
+             'sink_caps': array.array('q', sink_caps),
+             'sink_points': sink_points}
+    f = gzip.open(graph_file, 'wb')
+    pickle.dump(graph, f, pickle.HIGHEST_PROTOCOL)
+    f.close()
+
+
+def load_graph(graph_file):
+    """
+    Load a candidate graph saved by save_graph().
+    :param graph_file: path of the file.
+    :return: a dictionary with 'source_pins', 'sink_pins', 'edges' (a list of
+    (source index, sink index, weight)), 'source_caps', 'sink_caps' and
+    'sink_points' (None if they were not saved).
+    """
+    f = gzip.open(graph_file, 'rb')
+    graph = pickle.load(f)
+    f.close()
+    graph['edges'] = edges_from_arrays(*graph['edges'])
+    graph['source_caps'] = list(graph['source_caps'])
+    graph['sink_caps'] = list(graph['sink_caps'])
+    return graph
+
+
+# stages of the attack that are saved by Checkpoint, in order.
+CHECKPOINT_STAGES = ['net_ends', 'connected', 'candidates', 'flow']
+
+
+class Checkpoint:
+    """
+    Checkpoint saves the output of each attack stage to a directory, so a
+    run that crashes can resume from the last completed stage. The output of
+    a stage is a gzipped pickle file, and a small JSON manifest records the
+    key of the run and the completed stages.
+    """
+
+    def __init__(self, checkpoint_dir, key, resume=False):
+        """
+        :param checkpoint_dir: directory of the checkpoint files.
+        :param key: key of the run (see attack_key), a checkpoint is only
+        resumed by a run with the same key.
+        :param resume: use the stages completed by an earlier run.
+        """
+        self.checkpoint_dir = checkpoint_dir
+        self.key = key
+        self.completed = []
+        if not os.path.isdir(checkpoint_dir):
+            os.makedirs(checkpoint_dir)
+        manifest = self.load_manifest()
+        if resume:
+            if manifest and manifest['key'] == key:
+                self.completed = manifest['completed']
+            else:
+                print('No checkpoint of this run to resume from, starting '
+                      'from the beginning.')
+        self.save_manifest()
+
+    def manifest_path(self):
+        return os.path.join(self.checkpoint_dir, 'manifest.json')
+
+    def stage_path(self, stage):
+        return os.path.join(self.checkpoint_dir, stage + '.pkl.gz')
+
+    def load_manifest(self):
+        try:
+            f = open(self.manifest_path(), 'r')
+            manifest = json.load(f)
+            f.close()
+        except (IOError, OSError, ValueError):
+            return None
+        return manifest
+
+    def save_manifest(self):
+        manifest = {'key': self.key, 'completed': self.completed}
+        temp_path = self.manifest_path() + '.tmp'
+        f = open(temp_path, 'w')
+        json.dump(manifest, f)
+        f.close()
+        os.replace(temp_path, self.manifest_path())
+
+    def last_stage(self):
+        """
+        Get the index of the last completed stage in CHECKPOINT_STAGES.
+        :return: the index, -1 if no stage is completed.
+        """
+        last = -1
+        for each_stage in self.completed:
+            last = max(last, CHECKPOINT_STAGES.index(each_stage))
+        return last
+
+    def save(self, stage, data):
+        """
+        Save the output of a stage and mark the stage as completed.
+        :param stage: name of the stage, one of CHECKPOINT_STAGES.
+        :param data: the output of the stage (must be picklable).
+        :return: void
+        """
+        path = self.stage_path(stage)
+        temp_path = path + '.tmp'
+        f = gzip.open(temp_path, 'wb', compresslevel=1)
+        pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        f.close()
+        os.replace(temp_path, path)
+        if stage not in self.completed:
+            self.completed.append(stage)
+        self.save_manifest()
+
+    def load(self, stage):
+        """
+        Load the output of a completed stage.
+        :param stage: name of the stage, one of CHECKPOINT_STAGES.
+        :return: the output of the stage.
+        """
+        f = gzip.open(self.stage_path(stage), 'rb')
+        data = pickle.load(f)
+        f.close()
+        return data
@@ -0,0 +1,388 @@
+"""
+Auction algorithm for the sink-to-source assignment of the attack
+Author: Tri Minh Cao
+Email: tricao@utdallas.edu
+Date: December 2016
+"""
+import heapq
+import numpy as np
+
+
+class SourcePrices:
+    """
+    Class SourcePrices keeps the prices of the copies of the source pins.
+    A source pin with capacity c is c identical objects (copies). Copies that
+    nobody has bid for yet have price 0, the others are kept in a heap of
+    (price, holder sink) per source pin (holder -1 means the copy is free).
+    """
+
+    def __init__(self, caps):
+        self.caps = caps
+        self.heaps = [[] for i in range(len(caps))]
+        # lowest and second lowest copy price of each source
+        self.price1 = np.zeros(len(caps), dtype=np.int64)
+        self.price2 = np.zeros(len(caps), dtype=np.int64)
+
+    def untouched(self, i):
+        return self.caps[i] - len(self.heaps[i])
+
+    def update(self, i):
+        """
+        Update price1 and price2 of source i after its heap changed.
+        """
+        heap = self.heaps[i]
+        prices = [0] * min(2, self.untouched(i))
+        prices += [each[0] for each in heap[:3]]
+        if not prices:
+            # the source has no candidate edge
+            return
+        prices.sort()
+        self.price1[i] = prices[0]
+        self.price2[i] = prices[1] if len(prices) > 1 else prices[0]
+
+    def lowest(self, i):
+        if self.untouched(i) > 0:
+            return 0
+        return self.heaps[i][0][0]
+
+    def take(self, i, bid, sink):
+        """
+        Give the cheapest copy of source i to a sink at the bid price.
+        :return: the sink that held the copy before, or -1.
+        """
+        heap = self.heaps[i]
+        if self.untouched(i) > 0:
+            heapq.heappush(heap, (bid, sink))
+            evicted = -1
+        else:
+            evicted = heapq.heapreplace(heap, (bid, sink))[1]
+        return evicted
+
+    def free_copy(self, i):
+        """
+        Get the position (in the heap of source i) of the most expensive free
+        copy with a positive price, -1 if there is none.
+        """
+        best = -1
+        heap = self.heaps[i]
+        for k in range(len(heap)):
+            if heap[k][1] == -1 and heap[k][0] > 0:
+                if best < 0 or heap[k][0] > heap[best][0]:
+                    best = k
+        return best
+
+    def free(self, i, price, sink):
+        """
+        Make the copy of source i that a sink holds free.
+        """
+        heap = self.heaps[i]
+        k = heap.index((price, sink))
+        heap[k] = (price, -1)
+        heapq.heapify(heap)
+
+    def replace(self, i, k, price, sink):
+        """
+        Set the price and the holder of copy k of source i.
+        """
+        heap = self.heaps[i]
+        heap[k] = (price, sink)
+        heapq.heapify(heap)
+
+    def drop(self, i, k):
+        """
+        Make copy k of source i a price 0 (untouched) copy again.
+        """
+        heap = self.heaps[i]
+        heap.pop(k)
+        heapq.heapify(heap)
+
+    def drop_free(self, i):
+        """
+        Make all free copies of source i price 0 copies again.
+        """
+        heap = self.heaps[i]
+        self.heaps[i] = [each for each in heap if each[1] != -1]
+        heapq.heapify(self.heaps[i])
+
+    def release_all(self):
+        """
+        Make every copy free, the prices are kept (used between the epsilon
+        scaling phases).
+        """
+        for i in range(len(self.heaps)):
+            self.heaps[i] = [(each[0], -1) for each in self.heaps[i]]
+            heapq.heapify(self.heaps[i])
+
+
+def sink_major(num_sinks, edges):
+    """
+    Store the candidate edges grouped by sink pin (CSR format).
+    :param num_sinks: number of sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :return: indptr, source indices, weights and the original edge index of
+    each entry.
+    """
+    sources = np.array([each[0] for each in edges], dtype=np.int64)
+    sinks = np.array([each[1] for each in edges], dtype=np.int64)
+    weights = np.array([each[2] for each in edges], dtype=np.int64)
+    order = np.argsort(sinks, kind='stable')
+    counts = np.bincount(sinks, minlength=num_sinks)
+    indptr = np.zeros(num_sinks + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return indptr, sources[order], weights[order], order
+
+
+def compute_bids(bidders, indptr, src, value, prices, eps, max_gap):
+    """
+    Compute the bids of a group of unassigned sink pins (all at once, so the
+    bidding of different sinks is independent and vectorized).
+    :param bidders: array of sink indices, each must have >= 1 entry.
+    :param indptr: CSR row pointer of the candidate entries.
+    :param src: source index of each entry.
+    :param value: value (negative scaled cost) of each entry.
+    :param prices: a SourcePrices object.
+    :param eps: current epsilon.
+    :param max_gap: used as the bid increment when a sink has only one choice.
+    :return: best entry of each bidder and its bid price.
+    """
+    starts = indptr[bidders]
+    lengths = indptr[bidders + 1] - starts
+    seg_starts = np.zeros(len(bidders), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=seg_starts[1:])
+    # index of every candidate entry of the bidders
+    entries = np.repeat(starts - seg_starts, lengths) + np.arange(lengths.sum())
+    entry_src = src[entries]
+    profit = value[entries] - prices.price1[entry_src]
+    best = np.maximum.reduceat(profit, seg_starts)
+    seg_id = np.repeat(np.arange(len(bidders)), lengths)
+    positions = np.arange(len(entries))
+    best_pos = np.minimum.reduceat(
+        np.where(profit == best[seg_id], positions, len(entries)), seg_starts)
+    # second best profit: best of the other entries, or the second copy of
+    # the best source.
+    profit[best_pos] = np.iinfo(np.int64).min
+    second = np.maximum.reduceat(profit, seg_starts)
+    second[lengths == 1] = np.iinfo(np.int64).min
+    best_entry = entries[best_pos]
+    best_src = src[best_entry]
+    same_source = value[best_entry] - prices.price2[best_src]
+    second = np.maximum(second, same_source)
+    second = np.maximum(second, best - max_gap)
+    bid = prices.price1[best_src] + (best - second) + eps
+    return best_entry, bid
+
+
+def auction_assignment(num_sources, num_sinks, edges, source_caps=None,
+                       final_eps=None, alpha=5):
+    """
+    Min cost assignment of sink pins to source pins with the auction
+    algorithm and epsilon scaling. Every sink pin has capacity 1, source pin i
+    has capacity source_caps[i].
+    When a sink pin may not get a source pin (the source capacities are
+    limited), it can take a dummy source with a cost larger than any
+    augmenting path, so the result is still a min cost maximum flow.
+    :param num_sources: number of source pins.
+    :param num_sinks: number of sink pins.
+    :param edges: a list of (source index, sink index, weight), weights are
+    integers >= 0.
+    :param source_caps: capacity of each source pin (default: no limit).
+    :param final_eps: stop the epsilon scaling at this epsilon (in cost
+    units). None means scale down to an exact optimal assignment.
+    :param alpha: epsilon is divided by alpha in each phase.
+    :return: a list of the edge indices (in edges) that are used, the cost,
+    the epsilon gap (the cost is at most this much above the optimal cost)
+    and the final epsilon.
+    """
+    if source_caps is not None:
+        # a source with capacity 0 can not take a bid, drop its edges
+        kept = [k for k in range(len(edges)) if source_caps[edges[k][0]] > 0]
+        if len(kept) < len(edges):
+            used, cost, gap, eps = auction_assignment(
+                num_sources, num_sinks, [edges[k] for k in kept], source_caps,
+                final_eps, alpha)
+            return [kept[k] for k in used], cost, gap, eps
+    if len(edges) == 0:
+        return [], 0, 0, 0
+    indptr, src, weights, order = sink_major(num_sinks, edges)
+    degree = np.bincount(src, minlength=num_sources)
+    if source_caps is None:
+        caps = degree.tolist()
+    else:
+        caps = [int(min(source_caps[i], degree[i])) for i in range(num_sources)]
+    max_w = int(weights.max())
+    # the assignment is exact when eps < 1 / n in cost units, so the costs
+    # are multiplied by n + 1 and the last phase has eps = 1.
+    n = num_sinks
+    scale = n + 1
+    need_dummy = any(caps[i] < degree[i] for i in range(num_sources))
+    dummy_cost = (min(num_sources, num_sinks) + 1) * (max_w + 1)
+    if need_dummy and 4 * dummy_cost * scale > np.iinfo(np.int64).max:
+        raise ValueError('cost range is too large for the auction solver')
+    value = -weights * scale
+    # sinks that have candidate edges
+    active = np.nonzero(indptr[1:] > indptr[:-1])[0]
+    dummy = -1
+    if need_dummy:
+        # add one dummy entry (source index num_sources) per active sink
+        dummy = num_sources
+        caps = caps + [0]
+        all_sinks = np.concatenate([np.repeat(np.arange(num_sinks),
+                                              indptr[1:] - indptr[:-1]),
+                                    active])
+        resort = np.argsort(all_sinks, kind='stable')
+        src = np.concatenate([src, np.full(len(active), dummy,
+                                           dtype=np.int64)])[resort]
+        value = np.concatenate([value, np.full(len(active),
+                                               -dummy_cost * scale,
+                                               dtype=np.int64)])[resort]
+        order = np.concatenate([order, np.full(len(active), -1,
+                                               dtype=np.int64)])[resort]
+        counts = np.bincount(all_sinks, minlength=num_sinks)
+        indptr = np.zeros(num_sinks + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+    market = AuctionMarket(indptr, src, value, caps, dummy)
+    max_gap = int(value.max() - value.min()) + 1
+    if final_eps is None:
+        stop_eps = 1
+    else:
+        stop_eps = max(1, int(final_eps * scale))
+    eps = max(stop_eps, max_gap // alpha)
+    while True:
+        market.forward_phase(active, eps, max_gap)
+        market.reverse_phase(eps)
+        if eps <= stop_eps:
+            break
+        eps = max(stop_eps, eps // alpha)
+        market.prices.release_all()
+    used = []
+    cost = 0
+    for j in active:
+        k = order[market.assigned[j]]
+        if k >= 0:
+            used.append(int(k))
+            cost += edges[k][2]
+    gap = n * eps / float(scale)
+    return used, cost, gap, eps / float(scale)
+
+
+class AuctionMarket:
+    """
+    Class AuctionMarket keeps the candidate entries (sink-major and
+    source-major), the prices, and the current assignment of the sinks.
+    """
+
+    def __init__(self, indptr, src, value, caps, dummy):
+        """
+        :param indptr: CSR row pointer of the candidate entries of each sink.
+        :param src: source index of each entry.
+        :param value: value (negative scaled cost) of each entry.
+        :param caps: capacity of each source.
+        :param dummy: index of the dummy source (no capacity limit, price 0),
+        -1 if there is no dummy source.
+        """
+        self.indptr = indptr
+        self.src = src
+        self.value = value
+        self.dummy = dummy
+        self.prices = SourcePrices(caps)
+        num_sinks = len(indptr) - 1
+        self.entry_sink = np.repeat(np.arange(num_sinks),
+                                    indptr[1:] - indptr[:-1])
+        # entries of each source
+        self.src_entries = np.argsort(src, kind='stable')
+        self.src_ptr = np.zeros(len(caps) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(caps)),
+                  out=self.src_ptr[1:])
+        # assigned entry of each sink and the price of the copy it holds
+        self.assigned = np.full(num_sinks, -1, dtype=np.int64)
+        self.held = np.zeros(num_sinks, dtype=np.int64)
+
+    def forward_phase(self, active, eps, max_gap):
+        """
+        One epsilon phase of the (Jacobi) auction: every unassigned sink bids,
+        then each source keeps the highest bids that beat its cheapest copy.
+        :return: void
+        """
+        prices = self.prices
+        self.assigned[:] = -1
+        unassigned = active
+        while len(unassigned) > 0:
+            best_entry, bid = compute_bids(unassigned, self.indptr, self.src,
+                                           self.value, prices, eps, max_gap)
+            best_src = self.src[best_entry]
+            # resolve the bids of each source, highest bid first
+            bid_order = np.lexsort((-bid, best_src))
+            next_unassigned = []
+            changed = set()
+            for idx in bid_order.tolist():
+                i = int(best_src[idx])
+                sink = int(unassigned[idx])
+                if i == self.dummy:
+                    self.assigned[sink] = best_entry[idx]
+                    self.held[sink] = 0
+                    continue
+                if prices.untouched(i) == 0 and bid[idx] <= prices.lowest(i):
+                    # another sink took the copy in this round
+                    next_unassigned.append(sink)
+                    continue
+                evicted = prices.take(i, int(bid[idx]), sink)
+                self.assigned[sink] = best_entry[idx]
+                self.held[sink] = bid[idx]
+                changed.add(i)
+                if evicted >= 0:
+                    self.assigned[evicted] = -1
+                    next_unassigned.append(evicted)
+            for i in changed:
+                prices.update(i)
+            unassigned = np.array(sorted(next_unassigned), dtype=np.int64)
+
+    def reverse_phase(self, eps):
+        """
+        Free copies must have price 0 at the end of a phase (a price that was
+        set in an earlier phase may be too high for every sink now). A free
+        copy with a positive price takes the sink that wants it most, at a
+        lower price, until no such copy is left.
+        :return: void
+        """
+        prices = self.prices
+        stack = []
+        for i in range(len(prices.heaps)):
+            if prices.free_copy(i) >= 0:
+                stack.append(i)
+        while stack:
+            i = stack.pop()
+            if prices.untouched(i) > 0:
+                # the cheapest copy of source i is free with price 0 already,
+                # so no sink wants another free copy more.
+                prices.drop_free(i)
+                prices.update(i)
+                continue
+            k = prices.free_copy(i)
+            if k < 0:
+                continue
+            entries = self.src_entries[self.src_ptr[i]:self.src_ptr[i + 1]]
+            sinks = self.entry_sink[entries]
+            profit = self.value[self.assigned[sinks]] - self.held[sinks]
+            want = self.value[entries] - profit
+            best_idx = int(np.argmax(want))
+            if want[best_idx] <= eps:
+                # no sink wants the copy, make it a price 0 copy
+                prices.drop(i, k)
+                prices.update(i)
+                stack.append(i)
+                continue
+            want[best_idx] = np.iinfo(np.int64).min
+            second = int(want.max()) if len(want) > 1 else 0
+            new_price = max(0, second - eps)
+            sink = int(sinks[best_idx])
+            old_src = int(self.src[self.assigned[sink]])
+            if old_src != self.dummy:
+                prices.free(old_src, int(self.held[sink]), sink)
+            prices.replace(i, k, new_price, sink)
+            self.assigned[sink] = entries[best_idx]
+            self.held[sink] = new_price
+            prices.update(i)
+            stack.append(i)
+            if old_src != self.dummy:
+                prices.update(old_src)
+                stack.append(old_src)
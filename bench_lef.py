@@ -0,0 +1,88 @@
+"""
+Benchmark of the LEF parser on a set of LEF files, such as a technology LEF
+and several standard cell LEFs
+Author: Tri Minh Cao
+Email: tricao@utdallas.edu
+Date: December 2016
+"""
+from lef_parser import LefParser
+import argparse
+import os
+import sys
+import time
+
+
+def bench_file(lef_file, repeat=3):
+    """
+    Time the full parse and the macro index scan of a LEF file.
+    :param lef_file: path of the LEF file.
+    :param repeat: number of runs, the best time is kept.
+    :return: a dictionary of the sizes and the best times (seconds).
+    """
+    result = {'file': lef_file, 'bytes': os.path.getsize(lef_file),
+              'parse_time': None, 'index_time': None}
+    f = open(lef_file, 'rb')
+    result['lines'] = sum(1 for line in f)
+    f.close()
+    stdout = sys.stdout
+    for k in range(repeat):
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            start = time.time()
+            lef_parser = LefParser(lef_file)
+            lef_parser.parse()
+            parse_time = time.time() - start
+            start = time.time()
+            index_parser = LefParser(lef_file)
+            index_parser.index_macros()
+            index_time = time.time() - start
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        if result['parse_time'] is None or parse_time < result['parse_time']:
+            result['parse_time'] = parse_time
+        if result['index_time'] is None or index_time < result['index_time']:
+            result['index_time'] = index_time
+    result['macros'] = len(lef_parser.macro_dict)
+    result['layers'] = len(lef_parser.layer_dict)
+    result['vias'] = len(lef_parser.via_dict)
+    return result
+
+
+def print_report(results):
+    """
+    Print the throughput of each file and of the whole set.
+    :param results: a list of the outputs of bench_file().
+    :return: void
+    """
+    header = '{:<30} {:>8} {:>9} {:>7} {:>6} {:>6} {:>9} {:>9} {:>9}'
+    row = '{:<30} {:>8.1f} {:>9} {:>7} {:>6} {:>6} {:>9.3f} {:>9.1f} {:>9.1f}'
+    print(header.format('file', 'MB', 'lines', 'macros', 'layers', 'vias',
+                        'parse (s)', 'MB/s', 'index MB/s'))
+    total = {'bytes': 0, 'lines': 0, 'macros': 0, 'layers': 0, 'vias': 0,
+             'parse_time': 0, 'index_time': 0}
+    for result in results + [None]:
+        if result is None:
+            result = total
+            result['file'] = 'total'
+        else:
+            for each in total:
+                total[each] += result[each]
+        megabytes = result['bytes'] / 1e6
+        print(row.format(os.path.basename(result['file'])[:30], megabytes,
+                         result['lines'], result['macros'], result['layers'],
+                         result['vias'], result['parse_time'],
+                         megabytes / max(result['parse_time'], 1e-9),
+                         megabytes / max(result['index_time'], 1e-9)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='LEF parser benchmark.')
+    parser.add_argument('lef', nargs='+',
+                        help='LEF files, such as a technology LEF and the '
+                             'standard cell LEFs')
+    parser.add_argument('-n', '--repeat', type=int, default=3,
+                        help='Number of runs per file, the best time is '
+                             'kept (default: 3)')
+    args = parser.parse_args()
+    print_report([bench_file(each_file, args.repeat) for each_file in args.lef])
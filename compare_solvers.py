@@ -0,0 +1,176 @@
+"""
+Compare the flow solvers on a candidate graph saved by network_attack.py
+(--dump_graph)
+Author: Tri Minh Cao
+Email: tricao@utdallas.edu
+Date: December 2016
+"""
+from attack_util import load_graph
+from network_attack import solve_flow
+from multiprocessing import Process, Queue
+import argparse
+import os
+import queue as queue_module
+import sys
+import time
+import tracemalloc
+
+# solver name -> solver options of network_attack.solve_flow()
+SOLVERS = {
+    'networkx': {},
+    # the anytime solver without a deadline: greedy assignment, maximum flow
+    # and cycle cancelling on the residual graph.
+    'residual': {'deadline': float('inf')},
+    'auction': {'solver': 'auction'},
+    'budget': {'candidate_budget': 2},
+    'multilevel': {'multilevel': 1000, 'workers': 1},
+}
+
+
+def run_solver(graph, solver_options, queue, verbose):
+    """
+    Solve the flow of the graph with one solver (run in a child process, so
+    the peak memory of each solver is measured on its own). The solver runs
+    twice: the first run is timed, and the second run measures the peak
+    memory with tracemalloc, which would slow down the first run (much more
+    for the pure Python solvers than for the numpy ones).
+    :param graph: the graph, see attack_util.load_graph().
+    :param solver_options: options of solve_flow().
+    :param queue: the result is put in this queue: (run time, peak memory in
+    bytes, cost, list of (source pin, sink pin)).
+    :param verbose: keep the messages of the solver.
+    :return: void
+    """
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+    start = time.time()
+    connections, cost = solve_flow(graph['source_pins'], graph['sink_pins'],
+                                   graph['edges'], {}, solver_options,
+                                   graph['sink_points'], graph['source_caps'])
+    run_time = time.time() - start
+    tracemalloc.start()
+    solve_flow(graph['source_pins'], graph['sink_pins'], graph['edges'], {},
+               solver_options, graph['sink_points'], graph['source_caps'])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    pairs = []
+    for each_source in connections:
+        for each_sink in connections[each_source]:
+            pairs.append((each_source, each_sink))
+    queue.put((run_time, peak, cost, pairs))
+
+
+def compare_solvers(graph, solvers, timeout=None, verbose=False):
+    """
+    Run the solvers on the graph, one child process per solver.
+    :param graph: the graph, see attack_util.load_graph().
+    :param solvers: a list of (name, solver options).
+    :param timeout: time limit of each solver in seconds (optional).
+    :param verbose: keep the messages of the solvers.
+    :return: a list of (name, result), where result is the tuple of
+    run_solver(), or None if the solver did not finish.
+    """
+    results = []
+    for name, solver_options in solvers:
+        print('Running ' + name + '...')
+        queue = Queue()
+        process = Process(target=run_solver,
+                          args=(graph, solver_options, queue, verbose))
+        process.start()
+        result = None
+        start = time.time()
+        # wait for the result while the child is running (if the solver
+        # fails, the child prints the error and exits)
+        while result is None and process.is_alive():
+            if timeout is not None and time.time() - start > timeout:
+                print(name + ' did not finish in ' + str(timeout) + ' s.')
+                break
+            try:
+                result = queue.get(timeout=1)
+            except queue_module.Empty:
+                pass
+        if result is None and not queue.empty():
+            result = queue.get()
+        process.join(1)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+        results.append((name, result))
+    return results
+
+
+def print_report(results):
+    """
+    Print the run time, peak memory, cost and number of connections of each
+    solver, and the differences of its connections from the first solver.
+    :param results: output of compare_solvers().
+    :return: void
+    """
+    reference = None
+    for name, result in results:
+        if result is not None:
+            reference = (name, set(result[3]))
+            break
+    print('%-12s %10s %10s %12s %12s %10s %10s' % (
+        'solver', 'time (s)', 'peak (MB)', 'cost', 'connections', 'added',
+        'removed'))
+    for name, result in results:
+        if result is None:
+            print('%-12s %10s' % (name, 'failed'))
+            continue
+        run_time, peak, cost, pairs = result
+        pairs = set(pairs)
+        print('%-12s %10.2f %10.1f %12d %12d %10d %10d' % (
+            name, run_time, peak / 1048576.0, cost, len(pairs),
+            len(pairs - reference[1]), len(reference[1] - pairs)))
+    if reference:
+        print('added/removed: connections that are not/only in the result of ' +
+              reference[0])
+
+
+# Main Class
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the flow solvers '
+                                                 'on a candidate graph.')
+    parser.add_argument('-g', '--graph', required=True,
+                        help='Candidate graph file (network_attack.py '
+                             '--dump_graph)')
+    parser.add_argument('-s', '--solvers', nargs='+',
+                        default=['networkx', 'residual', 'auction', 'budget',
+                                 'multilevel'],
+                        choices=sorted(SOLVERS),
+                        help='Solvers to run, the first one is the reference '
+                             'of the connection differences (default: all)')
+    parser.add_argument('--candidate_budget', type=int, default=2,
+                        help='Candidate budget of the budget solver '
+                             '(default: 2)')
+    parser.add_argument('--multilevel', type=int, default=1000,
+                        help='Tile size of the multilevel solver '
+                             '(default: 1000)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes of the multilevel solver '
+                             '(default: 1)')
+    parser.add_argument('--timeout', type=float,
+                        help='Time limit of each solver in seconds (the '
+                             'timed run and the memory run together)')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Show the messages of the solvers')
+    args = parser.parse_args()
+
+    graph = load_graph(args.graph)
+    print('Graph: ' + str(len(graph['source_pins'])) + ' source pins, ' +
+          str(len(graph['sink_pins'])) + ' sink pins, ' +
+          str(len(graph['edges'])) + ' edges')
+    solvers = []
+    for name in args.solvers:
+        solver_options = dict(SOLVERS[name])
+        if name == 'budget':
+            solver_options['candidate_budget'] = args.candidate_budget
+        elif name == 'multilevel':
+            if graph['sink_points'] is None:
+                print('Skip multilevel: the graph has no sink locations.')
+                continue
+            solver_options['multilevel'] = args.multilevel
+            solver_options['workers'] = args.workers
+        solvers.append((name, solver_options))
+    print_report(compare_solvers(graph, solvers, args.timeout, args.verbose))
@@ -7,6 +7,7 @@ Date: August 2016
 
 from def_util import *
 from util import *
+from route_store import RouteStore
 
 
 class DefParser:
@@ -14,8 +15,17 @@ class DefParser:
     DefParser will parse a DEF file and store related information of the design.
     """
 
-    def __init__(self, def_file):
+    def __init__(self, def_file, route_dir=None):
+        """
+        :param def_file: path of the DEF file.
+        :param route_dir: directory of a RouteStore (optional). If it is
+        given, the route points are kept on disk instead of in memory.
+        """
         self.file_path = def_file
+        self.route_dir = route_dir
+        self.route_store = None
+        # layer ranks of the LEF, set by rank_layers()
+        self.layer_ranks = None
         # can make the stack to be an object if needed
         self.stack = []
         # store the statements info in a list
@@ -82,6 +92,9 @@ class DefParser:
                         self.stack.append(new_comps)
                     elif info[0] == "NETS":
                         new_nets = Nets(int(info[1]))
+                        if self.route_dir:
+                            self.route_store = RouteStore(self.route_dir)
+                            new_nets.store = self.route_store
                         self.stack.append(new_nets)
                     elif info[0] == "TRACKS":
                         new_tracks = Tracks(info[1])
@@ -114,6 +127,11 @@ class DefParser:
                             latest_obj = self.stack[-1]
                             latest_obj.parse_next(info)
         f.close()
+        if self.route_store:
+            self.route_store.close()
+            print ("Stored " + str(self.route_store.num_routes) + " routes (" +
+                   str(self.route_store.num_points) + " points) in " +
+                   self.route_dir)
         # put the elements in sections list into separate variables
         for sec in self.sections:
             if sec.type == "PROPERTY_DEF":
@@ -126,6 +144,25 @@ class DefParser:
                 self.nets = sec
         print ("Parsing DEF file done.\n")
 
+    def rank_layers(self, ranks):
+        """
+        Set the layer rank of every route and the top layer of every net. The
+        ranks come from the LEF file (see LefParser.layer_ranks), so this is
+        done when both files are parsed.
+        :param ranks: layer ranks (see util.layer_ranks).
+        :return: void
+        """
+        self.layer_ranks = ranks
+        if self.route_store:
+            self.route_store.rank_layers(ranks)
+        else:
+            for each_net in self.nets.nets:
+                for each_route in each_net.routed:
+                    each_route.rank = ranks[each_route.layer]
+        for each_net in self.nets.nets:
+            each_net.find_top_layer(ranks)
+        self.nets.top_metal_layer = None
+
     def to_def_format(self):
         s = ""
         s += "#  Generated by tricao@utdallas.edu for testing only.\n\n"
@@ -214,6 +214,8 @@ class Nets:
         self.nets = []
         self.net_dict = {}
         self.top_metal_layer = None
+        # route_store.RouteStore that keeps the routes on disk (optional)
+        self.store = None
 
     def parse_next(self, info):
         # remember to check for "(" before using split_parentheses
@@ -235,8 +237,6 @@ class Nets:
             elif info[0] == "ROUTED" or info[0] == "NEW":
                 new_routed = Routed()
                 new_routed.layer = info[1]
-                if compare_metal(new_routed.layer, current_net.top_layer) > 0:
-                    current_net.top_layer = new_routed.layer
                 # add points to the new_routed
                 for idx in range(2, len(info)):
                     if isinstance(info[idx], list):
@@ -259,6 +259,9 @@ class Nets:
                         new_routed.end_via = info[idx]
                         # the location of end_via is the last point in the route
                         new_routed.end_via_loc = new_routed.points[-1]
+                if self.store is not None:
+                    # only a small handle of the route stays in memory
+                    new_routed = self.store.add(len(self.nets) - 1, new_routed)
                 # add new_routed to the current_net
                 current_net.routed.append(new_routed)
 
@@ -274,17 +277,26 @@ class Nets:
         return s
 
 
-    def get_top_layer(self):
+    def get_top_layer(self, ranks):
         if self.top_metal_layer:
             return self.top_metal_layer
         else:
-            return self.find_top_layer()
-
-    def find_top_layer(self):
-        top_layer = 'metal1'
+            return self.find_top_layer(ranks)
+
+    def find_top_layer(self, ranks):
+        """
+        Find the top layer of the nets (see Net.find_top_layer).
+        :param ranks: layer ranks of the LEF (see util.layer_ranks).
+        :return: name of the top layer.
+        """
+        top_layer = rank_layer(ranks, 1)
+        top_rank = 1
         for each_net in self.nets:
-            if compare_metal(each_net.top_layer, top_layer) > 0:
+            if each_net.top_rank is None:
+                each_net.find_top_layer(ranks)
+            if each_net.top_rank >= top_rank:
                 top_layer = each_net.top_layer
+                top_rank = each_net.top_rank
         self.top_metal_layer = top_layer
         return top_layer
 
@@ -300,15 +312,32 @@ class Net:
         self.name = name
         self.comp_pin = []
         self.routed = []
-        self.top_layer = 'metal1'
-
-    def find_top_layer(self):
-        # find the top metal layer among the routes.
-        top_layer = 'metal1'
+        # top layer and its rank, 1 is the lowest routing layer. They are
+        # not known before the routes are ranked (see find_top_layer)
+        self.top_layer = None
+        self.top_rank = None
+
+    def find_top_layer(self, ranks):
+        """
+        Find the top layer among the routes, the lowest routing layer if the
+        net has no routes. The routes must be ranked (see
+        DefParser.rank_layers).
+        :param ranks: layer ranks of the LEF (see util.layer_ranks).
+        :return: name of the top layer.
+        """
+        top_layer = rank_layer(ranks, 1)
+        top_rank = 1
         for each_route in self.routed:
-            if compare_metal(each_route.layer, top_layer) > 0:
+            if each_route.rank is None:
+                raise ValueError('The route on ' + str(each_route.layer) +
+                                 ' of net ' + self.name + ' has no layer '
+                                 'rank, rank the DEF data with '
+                                 'DefParser.rank_layers() first')
+            if each_route.rank >= top_rank:
                 top_layer = each_route.layer
+                top_rank = each_route.rank
         self.top_layer = top_layer
+        self.top_rank = top_rank
         return top_layer
 
 
@@ -352,6 +381,9 @@ class Routed:
         self.points = []
         self.end_via = None
         self.end_via_loc = None
+        # rank of the layer, set when the LEF is known (see
+        # DefParser.rank_layers)
+        self.rank = None
 
     def __str__(self):
         s = ""
@@ -0,0 +1,937 @@
+"""
+Min cost flow solvers for the network flow attack
+Author: Tri Minh Cao
+Email: tricao@utdallas.edu
+Date: December 2016
+"""
+import array
+from collections import deque
+import heapq
+import time
+
+# NOTE: need to find the actual load capacitance later
+SOURCE_CAP = 100000
+SINK_CAP = 1 # we want the input pin can receive only 1 connection
+
+
+class MinCostFlow:
+    """
+    Class MinCostFlow stores a flow network as a residual graph. Edge e and
+    edge e ^ 1 are a forward edge and its reverse edge, the flow on the
+    forward edge is the residual capacity of the reverse edge.
+    The residual graph is kept between the solver methods, so they can start
+    from the current flow instead of starting from zero.
+    """
+
+    def __init__(self, num_nodes):
+        self.num_nodes = num_nodes
+        # adjacency list: edge ids that start from each node
+        self.adj = [[] for i in range(num_nodes)]
+        self.to = []
+        self.cap = []
+        self.cost = []
+        # set of nodes whose residual edges were changed by push(), only
+        # recorded when it is a set (see reoptimize).
+        self.touched = None
+
+    def add_edge(self, u, v, cap, cost):
+        """
+        Add an edge (and its reverse edge) to the network.
+        :param u: start node
+        :param v: end node
+        :param cap: capacity
+        :param cost: cost of one unit of flow
+        :return: edge id of the forward edge
+        """
+        e = len(self.to)
+        self.to.append(v)
+        self.cap.append(cap)
+        self.cost.append(cost)
+        self.adj[u].append(e)
+        self.to.append(u)
+        self.cap.append(0)
+        self.cost.append(-cost)
+        self.adj[v].append(e + 1)
+        return e
+
+    def flow(self, e):
+        """
+        Get the flow on a forward edge.
+        """
+        return self.cap[e ^ 1]
+
+    def push(self, e, amount):
+        """
+        Push flow along an edge of the residual graph.
+        """
+        self.cap[e] -= amount
+        self.cap[e ^ 1] += amount
+        if self.touched is not None:
+            self.touched.add(self.to[e])
+            self.touched.add(self.to[e ^ 1])
+
+    def total_cost(self):
+        total = 0
+        for e in range(0, len(self.to), 2):
+            total += self.cost[e] * self.cap[e ^ 1]
+        return total
+
+    def flow_value(self, s):
+        """
+        Get the value of the flow that leaves node s.
+        """
+        value = 0
+        for e in self.adj[s]:
+            if e % 2 == 0:
+                value += self.cap[e ^ 1]
+        return value
+
+    def max_flow(self, s, t):
+        """
+        Increase the current flow to a maximum flow (Dinic's algorithm). The
+        cost is not considered.
+        :param s: source node
+        :param t: sink node
+        :return: the flow value added.
+        """
+        added = 0
+        while True:
+            level = self.bfs_levels(s)
+            if level[t] < 0:
+                return added
+            # current edge pointer of each node
+            current = [0] * self.num_nodes
+            while True:
+                pushed = self.blocking_path(s, t, level, current)
+                if pushed == 0:
+                    break
+                added += pushed
+
+    def bfs_levels(self, s, admissible=False):
+        """
+        Get the BFS level of each node from s in the residual graph (-1 if
+        it can not be reached).
+        :param s: start node
+        :param admissible: only use the edges with reduced cost 0.
+        """
+        level = [-1] * self.num_nodes
+        level[s] = 0
+        queue = deque([s])
+        while queue:
+            u = queue.popleft()
+            for e in self.adj[u]:
+                v = self.to[e]
+                if self.cap[e] > 0 and level[v] < 0:
+                    if admissible and self.reduced_cost(e, u) != 0:
+                        continue
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        return level
+
+    def blocking_path(self, s, t, level, current, admissible=False):
+        """
+        Find one path from s to t in the level graph and push flow on it.
+        :param admissible: only use the edges with reduced cost 0.
+        :return: the flow value pushed (0 if there is no path).
+        """
+        path = []
+        u = s
+        while u != t:
+            adj = self.adj[u]
+            while current[u] < len(adj):
+                e = adj[current[u]]
+                if self.cap[e] > 0 and level[self.to[e]] == level[u] + 1:
+                    if not admissible or self.reduced_cost(e, u) == 0:
+                        break
+                current[u] += 1
+            if current[u] == len(adj):
+                # dead end, go back
+                if u == s:
+                    return 0
+                level[u] = -1
+                e = path.pop()
+                u = self.to[e ^ 1]
+                current[u] += 1
+            else:
+                e = adj[current[u]]
+                path.append(e)
+                u = self.to[e]
+        amount = min(self.cap[e] for e in path)
+        for e in path:
+            self.push(e, amount)
+        return amount
+
+    def find_negative_cycle(self, deadline=None, seeds=None):
+        """
+        Find a cycle with negative cost in the residual graph (Bellman-Ford
+        with a queue; the predecessor graph is checked for a cycle once every
+        num_nodes relaxations).
+        When there is no negative cycle, the shortest distances are stored in
+        self.potential.
+        :param deadline: time.time() value to stop searching (optional).
+        :param seeds: nodes whose residual edges changed since self.potential
+        was computed (optional). The search starts from self.potential and
+        only these nodes, instead of every node.
+        :return: a list of edge ids of the cycle, None if there is no
+        negative cycle, or -1 if the deadline is reached.
+        """
+        n = self.num_nodes
+        pred = [-1] * n
+        if seeds is None:
+            dist = [0] * n
+            in_queue = [True] * n
+            queue = deque(range(n))
+        else:
+            dist = list(self.potential)
+            in_queue = [False] * n
+            for u in seeds:
+                in_queue[u] = True
+            queue = deque(seeds)
+        relaxed = 0
+        pops = 0
+        while queue:
+            u = queue.popleft()
+            in_queue[u] = False
+            pops += 1
+            if deadline and pops % 1024 == 0 and time.time() > deadline:
+                return -1
+            du = dist[u]
+            for e in self.adj[u]:
+                if self.cap[e] > 0:
+                    v = self.to[e]
+                    new_dist = du + self.cost[e]
+                    if new_dist < dist[v]:
+                        dist[v] = new_dist
+                        pred[v] = e
+                        relaxed += 1
+                        if relaxed % n == 0:
+                            cycle = self.pred_cycle(pred)
+                            if cycle:
+                                return cycle
+                        if not in_queue[v]:
+                            in_queue[v] = True
+                            queue.append(v)
+        self.potential = dist
+        return None
+
+    def pred_cycle(self, pred):
+        """
+        Find a cycle in the predecessor graph.
+        :param pred: predecessor edge of each node (-1 if none).
+        :return: a list of edge ids of the cycle, or None.
+        """
+        n = self.num_nodes
+        stamp = [-1] * n
+        for start in range(n):
+            u = start
+            while u != -1 and stamp[u] == -1:
+                stamp[u] = start
+                e = pred[u]
+                u = self.to[e ^ 1] if e != -1 else -1
+            if u != -1 and stamp[u] == start:
+                # u is on a cycle
+                cycle = []
+                v = u
+                while True:
+                    e = pred[v]
+                    cycle.append(e)
+                    v = self.to[e ^ 1]
+                    if v == u:
+                        break
+                return cycle
+        return None
+
+    def cancel_negative_cycles(self, deadline=None, seeds=None):
+        """
+        Reduce the cost of the current flow by cancelling negative cycles,
+        without changing the flow value.
+        :param deadline: time.time() value to stop (optional).
+        :param seeds: nodes whose residual edges changed since self.potential
+        was computed (optional, see find_negative_cycle).
+        :return: True if there is no negative cycle left (the flow has the
+        minimum cost for its value), False if the deadline is reached.
+        """
+        while True:
+            cycle = self.find_negative_cycle(deadline, seeds)
+            if cycle is None:
+                return True
+            if cycle == -1:
+                return False
+            amount = min(self.cap[e] for e in cycle)
+            for e in cycle:
+                self.push(e, amount)
+            if seeds is not None:
+                # self.potential is not updated until the search succeeds, so
+                # the old seeds are still needed.
+                seeds = set(seeds)
+                for e in cycle:
+                    seeds.add(self.to[e])
+                    seeds.add(self.to[e ^ 1])
+
+    def reduced_cost(self, e, u):
+        """
+        Get the reduced cost of edge e (that starts from node u) with
+        self.potential.
+        """
+        return self.cost[e] + self.potential[u] - self.potential[self.to[e]]
+
+    def dijkstra(self, s, stop=None, limit=None):
+        """
+        Shortest distances from s in the residual graph with the reduced
+        costs (self.potential must be feasible: no residual edge has a
+        negative reduced cost).
+        :param s: start node
+        :param stop: a node whose edges are not followed (optional).
+        :param limit: the search stops at this distance (optional); nodes
+        that are farther may be missing or have a larger distance.
+        :return: a dictionary of the distances of the reachable nodes.
+        """
+        dist = {s: 0}
+        visited = set()
+        heap = [(0, s)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if limit is not None and d > limit:
+                break
+            if u in visited:
+                continue
+            visited.add(u)
+            if u == stop:
+                continue
+            for e in self.adj[u]:
+                if self.cap[e] > 0:
+                    v = self.to[e]
+                    new_dist = d + self.reduced_cost(e, u)
+                    if v not in dist or new_dist < dist[v]:
+                        dist[v] = new_dist
+                        heapq.heappush(heap, (new_dist, v))
+        return dist
+
+    def tighten_potentials(self, s):
+        """
+        Change self.potential (which must be feasible) to the shortest
+        distances from s for the nodes that s can reach, and to the smallest
+        feasible potentials for the other nodes. The reduced costs of edges
+        that are not in the network yet (e.g. pruned candidate edges) are
+        then as large as possible.
+        :param s: start node
+        :return: void
+        """
+        reached = self.dijkstra(s)
+        # the other nodes: a reverse Dijkstra from the reached nodes, with
+        # the labels -distance
+        label = {}
+        for u in reached:
+            label[u] = -reached[u]
+        settled = set()
+        heap = [(label[u], u) for u in reached]
+        heapq.heapify(heap)
+        while heap:
+            d, v = heapq.heappop(heap)
+            if v in settled:
+                continue
+            settled.add(v)
+            for f in self.adj[v]:
+                # f ^ 1 is the edge from u into v
+                u = self.to[f]
+                if u in reached or self.cap[f ^ 1] <= 0:
+                    continue
+                new_label = d + self.reduced_cost(f ^ 1, u)
+                if u not in label or new_label < label[u]:
+                    label[u] = new_label
+                    heapq.heappush(heap, (new_label, u))
+        lowest = min(-each for each in label.values())
+        for u in range(self.num_nodes):
+            if u in label:
+                self.potential[u] -= label[u]
+            else:
+                # these nodes can not reach the others, they keep their
+                # reduced costs if they all move down together
+                self.potential[u] += lowest
+
+    def route_excess(self, x, y, deficit_edges):
+        """
+        Send flow from node x to node y at the minimum cost, where the edges
+        into y (from the deficit nodes) are all equally good. In each phase,
+        Dijkstra's algorithm updates the potentials, the edges into y are
+        given reduced cost 0, and a blocking flow is pushed on the edges with
+        reduced cost 0, so every deficit node gets its shortest path in the
+        same phase.
+        self.potential must be feasible, and it stays feasible.
+        :param x: source node
+        :param y: sink node
+        :param deficit_edges: a list of (deficit node, edge id of the edge to
+        y).
+        :return: void
+        """
+        while True:
+            dist = self.dijkstra(x, y)
+            reached = [v for v, e in deficit_edges
+                       if self.cap[e] > 0 and v in dist]
+            if len(reached) == 0:
+                return
+            farthest = max(dist.values())
+            for u in range(self.num_nodes):
+                self.potential[u] += dist.get(u, farthest)
+            for v, e in deficit_edges:
+                self.cost[e] = self.potential[y] - self.potential[v]
+                self.cost[e ^ 1] = -self.cost[e]
+            while True:
+                level = self.bfs_levels(x, True)
+                if level[y] < 0:
+                    break
+                current = [0] * self.num_nodes
+                while self.blocking_path(x, y, level, current, True) > 0:
+                    pass
+
+    def add_node(self):
+        """
+        Add a node to the network.
+        :return: the node id.
+        """
+        self.adj.append([])
+        self.num_nodes += 1
+        if hasattr(self, 'potential'):
+            self.potential.append(0)
+        return self.num_nodes - 1
+
+    def remove_last(self, num_nodes, num_edges):
+        """
+        Remove the nodes and edges added after the network had num_nodes
+        nodes and num_edges edge ids (the edges must be the last edges in the
+        adjacency lists of their nodes).
+        """
+        for e in range(len(self.to) - 1, num_edges - 1, -1):
+            u = self.to[e ^ 1]
+            if u < num_nodes:
+                self.adj[u].pop()
+        del self.to[num_edges:]
+        del self.cap[num_edges:]
+        del self.cost[num_edges:]
+        del self.adj[num_nodes:]
+        self.num_nodes = num_nodes
+        if hasattr(self, 'potential'):
+            del self.potential[num_nodes:]
+
+    def ban_bound(self, e):
+        """
+        Lower bound of the cost increase if a forward edge that carries flow
+        is banned: the flow goes back on the reverse edge (reduced cost
+        -reduced_cost(e)) and needs another path from the start node to the
+        end node, which uses at least one other residual edge out of the
+        start node and one into the end node (reduced costs are >= 0).
+        self.potential must be feasible.
+        :param e: edge id of the forward edge.
+        :return: the lower bound, None if there is no other path.
+        """
+        u = self.to[e ^ 1]
+        v = self.to[e]
+        best_out = None
+        for f in self.adj[u]:
+            if f != e and self.cap[f] > 0:
+                rc = self.reduced_cost(f, u)
+                if best_out is None or rc < best_out:
+                    best_out = rc
+        best_in = None
+        for f in self.adj[v]:
+            # f ^ 1 is an edge into v
+            if f ^ 1 != e and self.cap[f ^ 1] > 0:
+                rc = self.reduced_cost(f ^ 1, self.to[f])
+                if best_in is None or rc < best_in:
+                    best_in = rc
+        if best_out is None or best_in is None:
+            return None
+        return max(best_out, best_in) - self.reduced_cost(e, u)
+
+    def fix_path(self, path):
+        """
+        Take one unit of flow out of the network, together with the
+        capacity it uses, along a path of forward edges that carry flow. The
+        potentials stay feasible (only residual capacity is removed).
+        :param path: a list of edge ids.
+        :return: void
+        """
+        for e in path:
+            self.cap[e ^ 1] -= 1
+
+    def snapshot(self):
+        """
+        Save the flow and the potentials. Banning edges only changes the
+        capacities, so this is enough to go back to this state.
+        :return: a tuple (capacities, potentials).
+        """
+        return array.array('q', self.cap), list(self.potential)
+
+    def restore(self, state):
+        """
+        Go back to a state saved by snapshot().
+        """
+        self.cap = list(state[0])
+        self.potential = list(state[1])
+
+    def reoptimize(self, s, t, banned, deadline=None):
+        """
+        Make the current flow a min cost max flow again after some edges are
+        banned, starting from the current residual graph and potentials.
+        The flow on the banned edges leaves an excess at their start nodes
+        and a deficit at their end nodes, which are connected again by a min
+        cost flow (route_excess). If some excess can not reach a deficit, that
+        flow goes back to s and t.
+        The current flow must be a min cost flow (self.potential is set).
+        :param s: source node
+        :param t: sink node
+        :param banned: a list of edge ids of the forward edges to ban.
+        :param deadline: time.time() value to stop (optional).
+        :return: True if the flow is optimal, False if the deadline is
+        reached.
+        """
+        excess = {}
+        deficit = {}
+        for e in banned:
+            amount = self.flow(e)
+            if amount > 0:
+                u = self.to[e ^ 1]
+                v = self.to[e]
+                excess[u] = excess.get(u, 0) + amount
+                deficit[v] = deficit.get(v, 0) + amount
+            self.cap[e] = 0
+            self.cap[e ^ 1] = 0
+        num_nodes = self.num_nodes
+        num_edges = len(self.to)
+        # super nodes of the excess and deficit nodes, their potentials keep
+        # the reduced costs of the new edges >= 0.
+        x = self.add_node()
+        y = self.add_node()
+        if excess:
+            self.potential[x] = max(self.potential[u] for u in excess)
+            self.potential[y] = min(self.potential[v] for v in deficit)
+        excess_edges = [(u, self.add_edge(x, u, excess[u], 0)) for u in excess]
+        deficit_edges = [(v, self.add_edge(v, y, deficit[v], 0))
+                         for v in deficit]
+        self.route_excess(x, y, deficit_edges)
+        left_excess = [(u, self.cap[e]) for u, e in excess_edges]
+        left_deficit = [(v, self.cap[e]) for v, e in deficit_edges]
+        self.remove_last(num_nodes, num_edges)
+        self.touched = set()
+        for u, amount in left_excess:
+            if amount > 0:
+                for e in self.adj[u]:
+                    if e % 2 == 1 and self.to[e] == s:
+                        # e is the reverse edge of s -> u
+                        self.push(e, amount)
+                        break
+        for v, amount in left_deficit:
+            if amount > 0:
+                for e in self.adj[v]:
+                    if e % 2 == 0 and self.to[e] == t:
+                        self.push(e ^ 1, amount)
+                        break
+        # the flow value is smaller if some flow went back to s and t, other
+        # paths may be able to take it.
+        self.max_flow(s, t)
+        seeds = self.touched
+        self.touched = None
+        return self.cancel_negative_cycles(deadline, seeds)
+
+
+def assignment_network(num_sources, num_sinks, edges, source_cap=SOURCE_CAP,
+                       sink_cap=SINK_CAP):
+    """
+    Build the flow network of the attack: super source -> source pins ->
+    sink pins -> super sink.
+    Node ids: 0 = super source, 1..num_sources = source pins, then the sink
+    pins, and the last node is the super sink.
+    :param num_sources: number of source pins.
+    :param num_sinks: number of sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param source_cap: capacity of each source pin, or a list with the
+    capacity of every source pin.
+    :param sink_cap: capacity of each sink pin.
+    :return: a MinCostFlow object and the list of edge ids of the candidate
+    edges (in the same order as edges).
+    """
+    s = 0
+    t = num_sources + num_sinks + 1
+    network = MinCostFlow(num_sources + num_sinks + 2)
+    network.s = s
+    network.t = t
+    edge_ids = []
+    for i, j, weight in edges:
+        edge_ids.append(network.add_edge(1 + i, 1 + num_sources + j, 1,
+                                         weight))
+    network.source_edges = []
+    for i in range(num_sources):
+        if isinstance(source_cap, list):
+            cap = source_cap[i]
+        else:
+            cap = source_cap
+        network.source_edges.append(network.add_edge(s, 1 + i, cap, 0))
+    network.sink_edges = []
+    for j in range(num_sinks):
+        network.sink_edges.append(network.add_edge(1 + num_sources + j, t,
+                                                   sink_cap, 0))
+    return network, edge_ids
+
+
+def greedy_assignment(network, edges, edge_ids):
+    """
+    Build a greedy flow: take the candidate edges from the shortest to the
+    longest, and use an edge if its sink pin is still free and its source
+    pin still has capacity.
+    :param network: a MinCostFlow object built by assignment_network.
+    :param edges: a list of (source index, sink index, weight)
+    :param edge_ids: edge ids of the candidate edges.
+    :return: void
+    """
+    order = sorted(range(len(edges)), key=lambda k: edges[k][2])
+    for k in order:
+        i, j, weight = edges[k]
+        # edge from the super source to the source pin, and edge from the
+        # sink pin to the super sink
+        in_e = network.source_edges[i]
+        out_e = network.sink_edges[j]
+        if network.cap[in_e] > 0 and network.cap[out_e] > 0:
+            network.push(in_e, 1)
+            network.push(edge_ids[k], 1)
+            network.push(out_e, 1)
+
+
+def sink_lower_bound(num_sinks, edges, flow_value):
+    """
+    Lower bound of the cost of any flow with the given value: every unit of
+    flow goes to a different sink pin, and it costs at least the shortest
+    candidate edge of that sink.
+    :param num_sinks: number of sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param flow_value: value of the flow.
+    :return: the lower bound.
+    """
+    best = [None] * num_sinks
+    for i, j, weight in edges:
+        if best[j] is None or weight < best[j]:
+            best[j] = weight
+    best = sorted(each for each in best if each is not None)
+    return sum(best[:flow_value])
+
+
+def anytime_flow(num_sources, num_sinks, edges, deadline, source_cap=SOURCE_CAP):
+    """
+    Anytime min cost max flow: start from a greedy assignment, make it a
+    maximum flow, then cancel negative cycles until the flow is optimal or
+    the deadline is reached.
+    :param num_sources: number of source pins.
+    :param num_sinks: number of sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param deadline: time.time() value to stop improving the flow.
+    :param source_cap: capacity of each source pin (see assignment_network).
+    :return: a list of the edge indices (in edges) that carry flow, the cost
+    of the flow, a lower bound of the optimal cost, and True if the flow is
+    optimal.
+    """
+    network, edge_ids = assignment_network(num_sources, num_sinks, edges,
+                                           source_cap)
+    greedy_assignment(network, edges, edge_ids)
+    print('Greedy assignment: cost = ' + str(network.total_cost()) +
+          ', flow = ' + str(network.flow_value(network.s)))
+    network.max_flow(network.s, network.t)
+    cost = network.total_cost()
+    value = network.flow_value(network.s)
+    print('Maximum flow: cost = ' + str(cost) + ', flow = ' + str(value))
+    optimal = network.cancel_negative_cycles(deadline)
+    cost = network.total_cost()
+    if optimal:
+        lower_bound = cost
+    else:
+        lower_bound = sink_lower_bound(num_sinks, edges, value)
+    used = []
+    for k in range(len(edge_ids)):
+        if network.flow(edge_ids[k]) > 0:
+            used.append(k)
+    return used, cost, lower_bound, optimal
+
+
+def adaptive_flow(num_sources, num_sinks, edges, budget, source_cap=SOURCE_CAP):
+    """
+    Min cost max flow on a sparse network: each sink pin starts with its
+    budget shortest candidate edges, and the other (pruned) edges are only
+    added when they could change the result:
+    - pruned edges on an augmenting path (found by a BFS in the residual
+    graph together with the pruned edges) may increase the maximum flow.
+    - a pruned edge with a negative reduced cost may decrease the cost.
+    The added edges are solved warm (maximum flow, then cycle cancelling from
+    their nodes). When no pruned edge is left in these two cases, the flow
+    is a certified min cost max flow of the full network.
+    :param num_sources: number of source pins.
+    :param num_sinks: number of sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param budget: number of candidate edges of each sink pin at the start.
+    :param source_cap: capacity of each source pin (see assignment_network).
+    :return: a list of the edge indices (in edges) that carry flow, the cost
+    of the flow, the number of edges in the sparse network and the number of
+    rounds.
+    """
+    by_sink = [[] for j in range(num_sinks)]
+    for k in range(len(edges)):
+        by_sink[edges[k][1]].append(k)
+    active = []
+    # pruned edges of each source pin
+    pruned = [[] for i in range(num_sources)]
+    for j in range(num_sinks):
+        by_sink[j].sort(key=lambda k: edges[k][2])
+        active += by_sink[j][:budget]
+        for k in by_sink[j][budget:]:
+            pruned[edges[k][0]].append(k)
+    network, ids = assignment_network(num_sources, num_sinks,
+                                      [edges[k] for k in active], source_cap)
+    edge_ids = dict(zip(active, ids))
+    greedy_assignment(network, [edges[k] for k in active], ids)
+    s = network.s
+    t = network.t
+
+    def add_pruned(new_edges):
+        for k in new_edges:
+            i, j, weight = edges[k]
+            edge_ids[k] = network.add_edge(1 + i, 1 + num_sources + j, 1,
+                                           weight)
+            network.touched.add(1 + i)
+        for i in set(edges[k][0] for k in new_edges):
+            pruned[i] = [k for k in pruned[i] if k not in edge_ids]
+
+    def augmenting_pruned():
+        # BFS from s; parent of a node: ('edge', edge id) in the network or
+        # ('pruned', edge index).
+        parent = [None] * network.num_nodes
+        parent[s] = ('start', -1)
+        queue = deque([s])
+        while queue and parent[t] is None:
+            u = queue.popleft()
+            for e in network.adj[u]:
+                v = network.to[e]
+                if network.cap[e] > 0 and parent[v] is None:
+                    parent[v] = ('edge', e)
+                    queue.append(v)
+            if 1 <= u <= num_sources:
+                for k in pruned[u - 1]:
+                    v = 1 + num_sources + edges[k][1]
+                    if parent[v] is None:
+                        parent[v] = ('pruned', k)
+                        queue.append(v)
+        if parent[t] is None:
+            return []
+        path = []
+        v = t
+        while v != s:
+            kind, e = parent[v]
+            if kind == 'pruned':
+                path.append(e)
+                v = 1 + edges[e][0]
+            else:
+                v = network.to[e ^ 1]
+        return path
+
+    seeds = None
+    rounds = 0
+    while True:
+        rounds += 1
+        network.touched = set()
+        while True:
+            network.max_flow(s, t)
+            path = augmenting_pruned()
+            if not path:
+                break
+            add_pruned(path)
+        if seeds is not None:
+            seeds |= network.touched
+        network.touched = None
+        network.cancel_negative_cycles(seeds=seeds)
+        network.tighten_potentials(s)
+        potential = network.potential
+        negative = []
+        for i in range(num_sources):
+            for k in pruned[i]:
+                weight = edges[k][2]
+                j = edges[k][1]
+                if weight + potential[1 + i] - potential[1 + num_sources + j] < 0:
+                    negative.append(k)
+        print('Candidate budget round ' + str(rounds) + ': ' +
+              str(len(edge_ids)) + ' edges, cost = ' +
+              str(network.total_cost()) + ', ' + str(len(negative)) +
+              ' pruned edges with negative reduced cost')
+        if not negative:
+            break
+        network.touched = set()
+        add_pruned(negative)
+        seeds = network.touched
+    used = sorted(k for k in edge_ids if network.flow(edge_ids[k]) > 0)
+    return used, network.total_cost(), len(edge_ids), rounds
+
+
+def optimal_network(num_sources, num_sinks, edges, source_cap=SOURCE_CAP):
+    """
+    Solve the min cost max flow of the attack network with the residual graph
+    solver (greedy assignment, maximum flow, then cycle cancelling). The
+    network keeps the optimal residual graph and potentials, so it can be
+    solved again quickly after edges are banned (see reoptimize).
+    :param num_sources: number of source pins.
+    :param num_sinks: number of sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param source_cap: capacity of each source pin (see assignment_network).
+    :return: a MinCostFlow object and the list of edge ids of the candidate
+    edges.
+    """
+    network, edge_ids = assignment_network(num_sources, num_sinks, edges,
+                                           source_cap)
+    greedy_assignment(network, edges, edge_ids)
+    network.max_flow(network.s, network.t)
+    network.cancel_negative_cycles()
+    return network, edge_ids
+
+
+def flow_network(num_sources, num_sinks, edges, used, source_cap=SOURCE_CAP):
+    """
+    Build the residual graph of a given flow of the attack network, and its
+    potentials. If the flow does not have the minimum cost, it is improved by
+    cycle cancelling first.
+    :param num_sources: number of source pins.
+    :param num_sinks: number of sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param used: indices (in edges) of the edges that carry flow.
+    :param source_cap: capacity of each source pin (see assignment_network).
+    :return: a MinCostFlow object and the list of edge ids of the candidate
+    edges.
+    """
+    network, edge_ids = assignment_network(num_sources, num_sinks, edges,
+                                           source_cap)
+    for k in used:
+        i, j, weight = edges[k]
+        network.push(network.source_edges[i], 1)
+        network.push(edge_ids[k], 1)
+        network.push(network.sink_edges[j], 1)
+    network.cancel_negative_cycles()
+    return network, edge_ids
+
+
+def ban_costs(network, edge_ids, used):
+    """
+    For each used candidate edge, get the increase of the optimal cost if the
+    edge is forbidden and the flow value stays the same. The unit of flow on
+    an edge u -> v then takes the shortest other residual path from u to v.
+    Such a path either goes back through s (the distances from s are computed
+    once for all edges), or it does not. A search from u that does not go on
+    from s finds both: the paths that avoid s, and the distance from u to s.
+    It stops at the cost of the direct path u -> s -> v, which is an upper
+    bound.
+    The flow must have the minimum cost (self.potential is set).
+    :param network: a MinCostFlow object built by assignment_network.
+    :param edge_ids: edge ids of the candidate edges.
+    :param used: indices (in edges) of the edges that carry flow.
+    :return: a dictionary, edge index -> cost increase, None if the
+    connection can not be replaced (forbidding it loses one unit of flow).
+    """
+    s = network.s
+    from_s = network.dijkstra(s)
+    by_source = {}
+    for k in used:
+        u = network.to[edge_ids[k] ^ 1]
+        by_source.setdefault(u, []).append(k)
+    costs = {}
+    for u in by_source:
+        # reduced cost of u -> s, the reverse edge of s -> u
+        back = None
+        for e in network.adj[u]:
+            if e % 2 == 1 and network.to[e] == s and network.cap[e] > 0:
+                back = network.reduced_cost(e, u)
+                break
+        limit = None
+        targets = [network.to[edge_ids[k]] for k in by_source[u]]
+        if back is not None and all(v in from_s for v in targets):
+            limit = max(back + from_s[v] for v in targets)
+        # the used edges out of u have no residual capacity, so the search
+        # does not take them. The distances that are not final are still
+        # costs of residual paths, and the shortest path is always found.
+        dist = network.dijkstra(u, stop=s, limit=limit)
+        for k in by_source[u]:
+            e = edge_ids[k]
+            v = network.to[e]
+            best = dist.get(v)
+            if s in dist and v in from_s:
+                through_s = dist[s] + from_s[v]
+                if best is None or through_s < best:
+                    best = through_s
+            if best is not None:
+                # the flow also leaves e, whose reduced cost is <= 0
+                best -= network.reduced_cost(e, u)
+            costs[k] = best
+    return costs
+
+
+def used_edges(network, edge_ids):
+    """
+    Get the candidate edges that carry flow.
+    :return: a list of the edge indices (in edges).
+    """
+    return [k for k in range(len(edge_ids)) if network.flow(edge_ids[k]) > 0]
+
+
+def k_best_flows(num_sources, num_sinks, edges, k, source_cap=SOURCE_CAP):
+    """
+    Enumerate the k best distinct flows (largest flow value first, then
+    lowest cost), with Murty's branching: the children of a solution
+    include its first i - 1 free edges and ban its i-th free edge.
+    A child is first queued with a lower bound of its cost (see ban_bound),
+    and it is solved only when it reaches the top of the queue, starting
+    from the residual graph and potentials of its parent.
+    This is a generator, so every flow is given as soon as it is found.
+    :param num_sources: number of source pins.
+    :param num_sinks: number of sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param k: number of flows.
+    :param source_cap: capacity of each source pin (see assignment_network).
+    :return: yields (rank, used edge indices, cost, flow value).
+    """
+    network, edge_ids = optimal_network(num_sources, num_sinks, edges,
+                                        source_cap)
+    s = network.s
+    t = network.t
+    # queue entries: (-flow value, cost, counter, node). A node is a
+    # dictionary: 'fixed' edge indices (included edges, they are taken out of
+    # the network with their flow), 'state' (snapshot of the solved network,
+    # None if it is not solved yet), and for a node that is not solved, the
+    # 'parent' state and the edges to 'fix' and to 'ban'.
+    root = {'fixed': [], 'state': network.snapshot()}
+    queue = [(-network.flow_value(s), network.total_cost(), 0, root)]
+    counter = 1
+    rank = 0
+    while queue and rank < k:
+        neg_value, cost, unused, node = heapq.heappop(queue)
+        if node['state'] is None:
+            # solve the node from the state of its parent
+            network.restore(node['parent'])
+            for idx in node['fix']:
+                i, j, weight = edges[idx]
+                network.fix_path([network.source_edges[i], edge_ids[idx],
+                                  network.sink_edges[j]])
+            network.reoptimize(s, t, [edge_ids[node['ban']]])
+            node['state'] = network.snapshot()
+            del node['parent']
+            fixed_cost = sum(edges[idx][2] for idx in node['fixed'])
+            value = network.flow_value(s) + len(node['fixed'])
+            heapq.heappush(queue, (-value, network.total_cost() + fixed_cost,
+                                   counter, node))
+            counter += 1
+            continue
+        rank += 1
+        network.restore(node['state'])
+        free = used_edges(network, edge_ids)
+        yield rank, sorted(node['fixed'] + free), cost, -neg_value
+        # branch on the edges that are not fixed yet
+        for i in range(len(free)):
+            bound = network.ban_bound(edge_ids[free[i]])
+            if bound is None:
+                bound = 0
+            child = {'fixed': node['fixed'] + free[:i], 'fix': free[:i],
+                     'ban': free[i], 'state': None, 'parent': node['state']}
+            heapq.heappush(queue, (neg_value, cost + bound, counter, child))
+            counter += 1
+        # the state is kept by the children that need it
+        node['state'] = None
@@ -6,25 +6,52 @@ Date: August 2016
 """
 from lef_util import *
 from util import *
+from contextlib import contextmanager
+import gc
 
 SCALE = 2000
 
+
+@contextmanager
+def gc_paused():
+    """
+    Pause the garbage collector while a LEF file is parsed: the parser makes
+    many small objects and no reference cycles, so the collections only slow
+    it down.
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled:
+            gc.enable()
+
 class LefParser:
     """
     LefParser object will parse the LEF file and store information about the
     cell library.
+    The macros can also be loaded one by one (see parse_macros): a quick scan
+    finds the byte range of each MACRO block, and only the macros used by the
+    design are parsed, without their OBS geometry until it is needed.
     """
     def __init__(self, lef_file):
         self.lef_path = lef_file
         # dictionaries to map the definitions
         self.macro_dict = {}
         self.layer_dict = {}
+        # rank of each layer in LEF order (see util.layer_ranks)
+        self.layer_ranks = {}
         self.via_dict = {}
         # can make the stack to be an object if needed
         self.stack = []
         # store the statements info in a list
         self.statements = []
+        # reads the lines outside of the statements
+        self.top = Statement()
         self.cell_height = -1
+        # byte range (start, end) of each MACRO block, see index_macros()
+        self.macro_index = None
 
     def get_cell_height(self):
         """
@@ -35,51 +62,147 @@ class LefParser:
             self.cell_height = self.macro_dict[macro].size[1]
             break
 
+    def parse_line(self, info):
+        """
+        Give the information of a line to the statement being parsed.
+        :param info: the words of the line (not empty).
+        :return: void
+        """
+        # check if the program is processing a statement
+        if len(self.stack) != 0:
+            curState = self.stack[-1]
+        else:
+            curState = self.top
+        nextState = curState.parse_next(info)
+        # check the status return from parse_next function
+        if nextState == 0:
+            # continue as normal
+            pass
+        elif nextState == 1:
+            # remove the done statement from stack, and add it to the statements
+            # list
+            if len(self.stack) != 0:
+                # add the done statement to a dictionary
+                done_obj = self.stack.pop()
+                if isinstance(done_obj, Macro):
+                    self.macro_dict[done_obj.name] = done_obj
+                elif isinstance(done_obj, Layer):
+                    self.layer_dict[done_obj.name] = done_obj
+                elif isinstance(done_obj, Via):
+                    self.via_dict[done_obj.name] = done_obj
+                self.statements.append(done_obj)
+        elif nextState == -1:
+            pass
+        else:
+            self.stack.append(nextState)
+
     def parse(self):
         # Now try using my data structure to parse
         # open the file and start reading
         print ("Start parsing LEF file...")
         f = open(self.lef_path, "r")
-        # the program will run until the end of file f
-        for line in f:
-            info = str_to_list(line)
-            if len(info) != 0:
-                # if info is a blank line, then move to next line
-                # check if the program is processing a statement
-                #print (info)
-                if len(self.stack) != 0:
-                    curState = self.stack[len(self.stack) - 1]
-                    nextState = curState.parse_next(info)
-                else:
-                    curState = Statement()
-                    nextState = curState.parse_next(info)
-                # check the status return from parse_next function
-                if nextState == 0:
-                    # continue as normal
-                    pass
-                elif nextState == 1:
-                    # remove the done statement from stack, and add it to the statements
-                    # list
-                    if len(self.stack) != 0:
-                        # add the done statement to a dictionary
-                        done_obj = self.stack.pop()
-                        if isinstance(done_obj, Macro):
-                            self.macro_dict[done_obj.name] = done_obj
-                        elif isinstance(done_obj, Layer):
-                            self.layer_dict[done_obj.name] = done_obj
-                        elif isinstance(done_obj, Via):
-                            self.via_dict[done_obj.name] = done_obj
-                        self.statements.append(done_obj)
-                elif nextState == -1:
-                    pass
-                else:
-                    self.stack.append(nextState)
-                    # print (nextState)
+        with gc_paused():
+            # the program will run until the end of file f, the blank lines
+            # are not in the stream
+            parse_line = self.parse_line
+            for lines in read_words(f):
+                for info in lines:
+                    parse_line(info)
         f.close()
+        self.layer_ranks = layer_ranks(self.layer_dict.values())
         # get the cell height of the library
         self.get_cell_height()
         print ("Parsing LEF file done.")
 
+    def index_macros(self):
+        """
+        Scan the LEF file: parse the statements outside of the MACRO blocks
+        (layers, vias, etc.), and only find the byte range of each MACRO
+        block.
+        :return: void
+        """
+        print ("Start indexing LEF file...")
+        self.macro_index = {}
+        f = open(self.lef_path, "rb")
+        offset = 0
+        # the macro being skipped: [name, start], and its pin being skipped
+        macro = None
+        pin = None
+        with gc_paused():
+            for line in f:
+                start = offset
+                offset += len(line)
+                words = line.split()
+                if len(words) == 0:
+                    continue
+                if macro is not None:
+                    if words[0] == b"PIN" and pin is None and len(words) > 1:
+                        pin = words[1]
+                    elif words[0] == b"END" and len(words) > 1:
+                        if pin is not None:
+                            if words[1] == pin:
+                                pin = None
+                        elif words[1] == macro[0]:
+                            name = macro[0].decode("latin-1")
+                            self.macro_index[name] = (macro[1], offset)
+                            macro = None
+                elif words[0] == b"MACRO" and len(words) == 2 and \
+                        len(self.stack) == 0:
+                    macro = [words[1], start]
+                else:
+                    self.parse_line(str_to_list(line.decode("latin-1")))
+        f.close()
+        self.layer_ranks = layer_ranks(self.layer_dict.values())
+        print ("Indexing LEF file done: " + str(len(self.macro_index)) +
+               " macros.")
+
+    def parse_macros(self, macro_names):
+        """
+        Parse the given macros only (see index_macros), in the order of the
+        LEF file. The OBS statement of a macro is parsed when it is first
+        used (see Macro.obs). The macros that are already loaded are not
+        parsed again.
+        :param macro_names: names of the macros, the names that are not in the
+        LEF file are ignored.
+        :return: void
+        """
+        if self.macro_index is None:
+            self.index_macros()
+        ranges = []
+        for each_name in set(macro_names):
+            if each_name in self.macro_index and \
+                    each_name not in self.macro_dict:
+                ranges.append(self.macro_index[each_name])
+        ranges.sort()
+        f = open(self.lef_path, "rb")
+        with gc_paused():
+            for start, end in ranges:
+                f.seek(start)
+                offset = start
+                # start of the OBS statement being skipped
+                obs_start = None
+                for line in f.read(end - start).splitlines(True):
+                    line_start = offset
+                    offset += len(line)
+                    info = str_to_list(line.decode("latin-1"))
+                    if len(info) == 0:
+                        continue
+                    if obs_start is not None:
+                        if info[0] == "END":
+                            self.stack[-1].obs_source = (self.lef_path,
+                                                         obs_start, offset)
+                            obs_start = None
+                        continue
+                    if info[0] == "OBS" and isinstance(self.stack[-1], Macro):
+                        obs_start = line_start
+                        continue
+                    self.parse_line(info)
+        f.close()
+        if self.cell_height == -1:
+            self.get_cell_height()
+        print ("Loaded " + str(len(ranges)) + " of " +
+               str(len(self.macro_index)) + " LEF macros.")
+
 
 def draw_cells():
     """
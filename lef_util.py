@@ -8,12 +8,116 @@ New version, updated Decemeber 2016.
 """
 from util import *
 
+# size of the chunks read from the LEF file (small chunks keep few word
+# lists alive at a time)
+CHUNK_SIZE = 1 << 16
+
+
+def read_words(f, chunk_size=CHUNK_SIZE):
+    """
+    Read a LEF file as a stream of lines split into words. The file is read
+    in chunks, and each chunk is split at once.
+    :param f: the LEF file opened in text mode.
+    :param chunk_size: number of characters read at a time.
+    :return: yields the list of the (not blank) lines of each chunk, each line
+    is a list of words.
+    """
+    rest = ""
+    chunk = f.read(chunk_size)
+    while chunk:
+        lines = (rest + chunk).split("\n")
+        # the last line may go on in the next chunk
+        rest = lines.pop()
+        yield [words for words in map(str.split, lines) if words]
+        chunk = f.read(chunk_size)
+    words = rest.split()
+    if words:
+        yield [words]
+
+
+def end_block(statement, data):
+    """
+    Handler of the END line of a statement without a name (PORT, OBS, VIA).
+    """
+    return 1
+
+
+def end_named(statement, data):
+    """
+    Handler of the END line of a named statement: 1 if it ends this
+    statement, -1 otherwise.
+    """
+    if data[1] == statement.name:
+        return 1
+    return -1
+
+
+def skip_line(statement, data):
+    """
+    Handler of a line that is not read.
+    """
+    return 0
+
+
+def keep_word(field):
+    """
+    Make a handler that saves the first value of the line to a field.
+    :param field: name of the field.
+    :return: the handler function.
+    """
+    def handler(statement, data):
+        setattr(statement, field, data[1])
+        return 0
+    return handler
+
+
+def keep_float(field):
+    """
+    Make a handler that saves the first value of the line as a float.
+    :param field: name of the field.
+    :return: the handler function.
+    """
+    def handler(statement, data):
+        setattr(statement, field, float(data[1]))
+        return 0
+    return handler
+
+
+def keep_words(field):
+    """
+    Make a handler that saves all the values of the line.
+    :param field: name of the field.
+    :return: the handler function.
+    """
+    def handler(statement, data):
+        setattr(statement, field, data[1:])
+        return 0
+    return handler
+
+
+def keep_name_float(field):
+    """
+    Make a handler that saves (first value, float of the second value).
+    :param field: name of the field.
+    :return: the handler function.
+    """
+    def handler(statement, data):
+        setattr(statement, field, (data[1], float(data[2])))
+        return 0
+    return handler
+
 
 class Statement:
     """
     General class for all types of Statements in the LEF file
+    Each class has a dispatch table (handlers): the first word of a line ->
+    the function that reads the line, function(statement, data). A handler
+    returns what parse_next() returns. The lines whose first word is not in
+    the table are not read.
     """
 
+    handlers = {}
+
     def __init__(self):
         pass
 
@@ -22,25 +126,14 @@ class Statement:
         Method to add information from a statement from LEF file to the
         Statement object.
         :param data: a list of strings that contains pieces of information
-        :return: 1 if parsing is done, -1 if error, otherwise, return the
-        object that will be parsed next.
+        :return: 0 if in progress, 1 if parsing is done, -1 if error,
+        otherwise, return the object that will be parsed next.
         """
         # the program assumes the syntax of LEF file is correct
-        if data[0] == "MACRO":
-            name = data[1]
-            new_state = Macro(name)
-            return new_state
-        elif data[0] == "LAYER" and len(data) == 2:  # does not have ;
-            name = data[1]
-            new_state = Layer(name)
-            return new_state
-        elif data[0] == "VIA":
-            name = data[1]
-            new_state = Via(name)
-            return new_state
-        elif data[0] == "END":
-            return 1
-        return 0
+        handler = self.handlers.get(data[0])
+        if handler is None:
+            return 0
+        return handler(self, data)
 
     def __str__(self):
         """
@@ -51,6 +144,25 @@ class Statement:
         s += self.type + " " + self.name
         return s
 
+    def start_macro(self, data):
+        return Macro(data[1])
+
+    def start_layer(self, data):
+        if len(data) == 2:  # does not have ;
+            return Layer(data[1])
+        return 0
+
+    def start_via(self, data):
+        return Via(data[1])
+
+
+Statement.handlers = {
+    "MACRO": Statement.start_macro,
+    "LAYER": Statement.start_layer,
+    "VIA": Statement.start_via,
+    "END": end_block,
+}
+
 
 class Macro(Statement):
     """
@@ -71,7 +183,10 @@ class Macro(Statement):
         self.site = None
         self.size = None
         self.pins = []
-        self.obs = None
+        self._obs = None
+        # (LEF file path, start, end) of the OBS statement if it is not
+        # parsed yet, see LefParser.parse_macros()
+        self.obs_source = None
 
     def __str__(self):
         """
@@ -89,50 +204,83 @@ class Macro(Statement):
                 s += "    " + key + ": " + str(self.info[key]) + "\n"
         return s
 
-    def parse_next(self, data):
+    def parse_origin(self, data):
+        x_cor = float(data[1])
+        y_cor = float(data[2])
+        self.origin = (x_cor, y_cor)
+        return 0
+
+    def parse_size(self, data):
+        width = float(data[1])
+        height = float(data[3])
+        self.size = (width, height)
+        return 0
+
+    def start_pin(self, data):
+        new_pin = Pin(data[1])
+        self.pin_dict[data[1]] = new_pin
+        self.pins.append(new_pin)
+        return new_pin
+
+    def start_obs(self, data):
+        new_obs = Obs()
+        self.obs = new_obs
+        return new_obs
+
+    @property
+    def obs(self):
         """
-        Method to add information from a statement from LEF file to a Macro
-        object.
-        :param data: a list of strings that contains pieces of information
-        :return: 0 if in progress, 1 if parsing is done, -1 if error,
-        otherwise, return the object that will be parsed next.
+        The OBS statement of the macro, parsed on first access if the macro
+        was loaded without it.
         """
-        if data[0] == "CLASS":
-            self.class_name = data[1]
-        elif data[0] == "ORIGIN":
-            x_cor = float(data[1])
-            y_cor = float(data[2])
-            self.origin = (x_cor, y_cor)
-        elif data[0] == "FOREIGN":
-            self.foreign = data[1:]
-        elif data[0] == "SIZE":
-            width = float(data[1])
-            height = float(data[3])
-            self.size = (width, height)
-        elif data[0] == "SYMMETRY":
-            self.symmetry = data[1:]
-        elif data[0] == "SITE":
-            self.site = data[1]
-        elif data[0] == "PIN":
-            new_pin = Pin(data[1])
-            self.pin_dict[data[1]] = new_pin
-            self.pins.append(new_pin)
-            return new_pin
-        elif data[0] == "OBS":
-            new_obs = Obs()
-            self.obs = new_obs
-            return new_obs
-        elif data[0] == "END":
-            if data[1] == self.name:
-                return 1
-            else:
-                return -1
-        return 0
+        if self.obs_source is not None:
+            self._obs = read_block(Obs(), *self.obs_source)
+            self.obs_source = None
+        return self._obs
+
+    @obs.setter
+    def obs(self, new_obs):
+        self._obs = new_obs
+        self.obs_source = None
 
     def get_pin(self, pin_name):
         return self.pin_dict[pin_name]
 
 
+Macro.handlers = {
+    "CLASS": keep_word("class_name"),
+    "ORIGIN": Macro.parse_origin,
+    "FOREIGN": keep_words("foreign"),
+    "SIZE": Macro.parse_size,
+    "SYMMETRY": keep_words("symmetry"),
+    "SITE": keep_word("site"),
+    "PIN": Macro.start_pin,
+    "OBS": Macro.start_obs,
+    "END": end_named,
+}
+
+
+def read_block(statement, lef_path, start, end):
+    """
+    Parse a statement that has no inner statements (such as OBS) from a byte
+    range of the LEF file.
+    :param statement: the new statement object.
+    :param lef_path: path of the LEF file.
+    :param start: byte offset of the line of the statement keyword.
+    :param end: byte offset after the END line of the statement.
+    :return: the statement object.
+    """
+    f = open(lef_path, "rb")
+    f.seek(start)
+    data = f.read(end - start)
+    f.close()
+    for line in data.splitlines()[1:]:
+        info = str_to_list(line.decode("latin-1"))
+        if len(info) != 0 and statement.parse_next(info) == 1:
+            break
+    return statement
+
+
 class Pin(Statement):
     """
     Class Pin represents a PIN statement in the LEF file.
@@ -153,30 +301,25 @@ class Pin(Statement):
             s += layer.type + " " + layer.name + "\n"
         return s
 
-    def parse_next(self, data):
-        if data[0] == "DIRECTION":
-            self.direction = data[1]
-        elif data[0] == "USE":
-            self.use = data[1]
-        elif data[0] == "PORT":
-            new_port = Port()
-            self.port = new_port
-            return new_port
-        elif data[0] == "SHAPE":
-            self.shape = data[1]
-        elif data[0] == "END":
-            if data[1] == self.name:
-                return 1
-            else:
-                return -1
-        # return 0 when we parse a undefined statement
-        return 0
+    def start_port(self, data):
+        new_port = Port()
+        self.port = new_port
+        return new_port
+
+    def is_lower_metal(self, split_layer, ranks):
+        return self.port.is_lower_metal(split_layer, ranks)
+
+    def get_top_metal(self, ranks):
+        return self.port.get_top_metal(ranks)
 
-    def is_lower_metal(self, split_layer):
-        return self.port.is_lower_metal(split_layer)
 
-    def get_top_metal(self):
-        return self.port.get_top_metal()
+Pin.handlers = {
+    "DIRECTION": keep_word("direction"),
+    "USE": keep_word("use"),
+    "PORT": Pin.start_port,
+    "SHAPE": keep_word("shape"),
+    "END": end_named,
+}
 
 
 class Port(Statement):
@@ -192,36 +335,51 @@ class Port(Statement):
         self.info = {}
         self.layer = []
 
-    def parse_next(self, data):
-        if data[0] == "END":
-            return 1
-        elif data[0] == "LAYER":
-            name = data[1]
-            new_layerdef = LayerDef(data[1])
-            self.layer.append(new_layerdef)
-        elif data[0] == "RECT":
-            # error if the self.info["LAYER"] does not exist
-            self.layer[-1].add_rect(data)
-        elif data[0] == "POLYGON":
-            self.layer[-1].add_polygon(data)
+    def start_layer(self, data):
+        self.layer.append(LayerDef(data[1]))
+        return 0
+
+    def parse_rect(self, data):
+        # error if the LAYER does not exist
+        self.layer[-1].add_rect(data)
         return 0
 
-    def is_lower_metal(self, split_layer):
-        lower = True
+    def parse_polygon(self, data):
+        self.layer[-1].add_polygon(data)
+        return 0
+
+    def is_lower_metal(self, split_layer, ranks):
+        """
+        :param ranks: layer ranks of the LEF (see util.layer_ranks).
+        """
+        split_rank = ranks[split_layer]
         for layer in self.layer:
-            if compare_metal(layer.name, split_layer) >= 0:
-                lower = False
-                break
-        return lower
+            if ranks[layer.name] >= split_rank:
+                return False
+        return True
 
-    def get_top_metal(self):
+    def get_top_metal(self, ranks):
+        """
+        :param ranks: layer ranks of the LEF (see util.layer_ranks).
+        """
         highest = "poly"
+        highest_rank = 0
         for layer in self.layer:
-            if compare_metal(layer.name, highest) > 0:
+            rank = ranks[layer.name]
+            if rank > highest_rank:
                 highest = layer.name
+                highest_rank = rank
         return highest
 
 
+Port.handlers = {
+    "END": end_block,
+    "LAYER": Port.start_layer,
+    "RECT": Port.parse_rect,
+    "POLYGON": Port.parse_polygon,
+}
+
+
 class Obs(Statement):
     """
     Class Obs represents an OBS statement in the LEF file.
@@ -241,22 +399,19 @@ class Obs(Statement):
         return s
 
     def parse_next(self, data):
-        if data[0] == "END":
-            return 1
-        elif data[0] == "LAYER":
-            name = data[1]
-            new_layerdef = LayerDef(data[1])
-            self.layer.append(new_layerdef)
-        elif data[0] == "RECT":
-            # error if the self.info["LAYER"] does not exist
-            self.layer[-1].add_rect(data)
-        elif data[0] == "POLYGON":
-            self.layer[-1].add_polygon(data)
-        elif is_float_try(data[0]):
+        handler = self.handlers.get(data[0])
+        if handler is not None:
+            return handler(self, data)
+        if is_float_try(data[0]):
+            # more points of the last polygon
             self.layer[-1].add_more_polygon(data)
         return 0
 
 
+# the shapes of OBS are read like the shapes of PORT
+Obs.handlers = Port.handlers
+
+
 class LayerDef:
     """
     Class LayerDef represents the Layer definition inside a PORT or OBS
@@ -343,51 +498,36 @@ class Layer(Statement):
         self.edge_cap = None
         self.property = None
 
-    def parse_next(self, data):
-        """
-        Method to add information from a statement from LEF file to a Layer
-        object.
-        :param data: a list of strings that contains pieces of information
-        :return: 0 if in progress, 1 if parsing is done, -1 if error,
-        otherwise, return the object that will be parsed next.
-        """
-        if data[0] == "TYPE":
-            self.layer_type = data[1]
-        elif data[0] == "SPACINGTABLE":
-            pass
-        elif data[0] == "SPACING":
-            self.spacing = float(data[1])
-        elif data[0] == "WIDTH":
-            self.width = float(data[1])
-        elif data[0] == "PITCH":
-            self.pitch = float(data[1])
-        elif data[0] == "DIRECTION":
-            self.direction = data[1]
-        elif data[0] == "OFFSET":
-            self.offset = (float(data[1]), float(data[2]))
-        elif data[0] == "RESISTANCE":
-            if self.layer_type == "ROUTING":
-                self.resistance = (data[1], float(data[2]))
-            elif self.layer_type == "CUT":
-                self.resistance = float(data[1])
-        elif data[0] == "THICKNESS":
-            self.thickness = float(data[1])
-        elif data[0] == "HEIGHT":
-            self.height = float(data[1])
-        elif data[0] == "CAPACITANCE":
-            self.capacitance = (data[1], float(data[2]))
-        elif data[0] == "EDGECAPACITANCE":
-            self.edge_cap = float(data[1])
-        elif data[0] == "PROPERTY":
-            self.property = (data[1], float(data[2]))
-        elif data[0] == "END":
-            if data[1] == self.name:
-                return 1
-            else:
-                return -1
+    def parse_offset(self, data):
+        self.offset = (float(data[1]), float(data[2]))
+        return 0
+
+    def parse_resistance(self, data):
+        if self.layer_type == "ROUTING":
+            self.resistance = (data[1], float(data[2]))
+        elif self.layer_type == "CUT":
+            self.resistance = float(data[1])
         return 0
 
 
+Layer.handlers = {
+    "TYPE": keep_word("layer_type"),
+    "SPACINGTABLE": skip_line,
+    "SPACING": keep_float("spacing"),
+    "WIDTH": keep_float("width"),
+    "PITCH": keep_float("pitch"),
+    "DIRECTION": keep_word("direction"),
+    "OFFSET": Layer.parse_offset,
+    "RESISTANCE": Layer.parse_resistance,
+    "THICKNESS": keep_float("thickness"),
+    "HEIGHT": keep_float("height"),
+    "CAPACITANCE": keep_name_float("capacitance"),
+    "EDGECAPACITANCE": keep_float("edge_cap"),
+    "PROPERTY": keep_name_float("property"),
+    "END": end_named,
+}
+
+
 class Via(Statement):
     """
     Via class represents a VIA section in LEF file.
@@ -400,15 +540,22 @@ class Via(Statement):
         self.name = name
         self.layers = []
 
-    def parse_next(self, data):
-        if data[0] == "END":
-            return 1
-        elif data[0] == "LAYER":
-            name = data[1]
-            new_layerdef = LayerDef(data[1])
-            self.layers.append(new_layerdef)
-        elif data[0] == "RECT":
-            self.layers[-1].add_rect(data)  # [-1] means the latest layer
-        elif data[0] == "POLYGON":
-            self.layers.add_polygon(data)
+    def start_layer(self, data):
+        self.layers.append(LayerDef(data[1]))
         return 0
+
+    def parse_rect(self, data):
+        self.layers[-1].add_rect(data)  # [-1] means the latest layer
+        return 0
+
+    def parse_polygon(self, data):
+        self.layers[-1].add_polygon(data)
+        return 0
+
+
+Via.handlers = {
+    "END": end_block,
+    "LAYER": Via.start_layer,
+    "RECT": Via.parse_rect,
+    "POLYGON": Via.parse_polygon,
+}
@@ -4,55 +4,330 @@ Author: Tri Minh Cao
 Email: tricao@utdallas.edu
 Date: December 2016
 """
-
+import io
+import json
+import os
+import re
 from lib_util import *
-import util
+from attack_util import file_hash
+
+# size of the chunks read from the LIB file
+CHUNK_SIZE = 1 << 20
+# change this when the format of the cell index changes
+INDEX_VERSION = 1
+
+# a space, a line continuation or a comment
+BLANK = r'\s|\\\r?\n|/\*.*?\*/|//[^\n]*\n'
+SKIP = '(?:' + BLANK + ')*'
+# a quoted string (it can span lines with line continuations) or a word
+STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+WORD = r'(?:[^\s(){}:;,"\\/]|/(?![*/])|\\(?!\r?\n))+'
+# one statement of the LIB file: the end of a group, a simple attribute
+# (name : value ;), a complex attribute (name ( args ) ;) or the start of a
+# group (name ( args ) {). The ';' is optional.
+STATEMENT_RE = re.compile(
+    SKIP + r'(?:(?P<end>\})|(?P<name>' + WORD + ')' + SKIP +
+    r'(?::' + SKIP + '(?P<value>(?:' + STRING + '|' + WORD + ')' +
+    r'(?:(?:[ \t]|\\\r?\n)+(?:' + STRING + '|' + WORD + '))*)' +
+    r'|\((?P<args>(?:' + STRING + r'|[^()"/]|/(?![*/])|/\*.*?\*/|//[^\n]*\n)*)\)' +
+    SKIP + r'(?P<open>\{)?)' + SKIP + ';?)', re.DOTALL)
+# the tokens of the values and the arguments
+TOKEN_RE = re.compile('(' + STRING + ')|(' + WORD + ')|' + BLANK + '|,',
+                      re.DOTALL)
+# what is left at the end of the file: spaces and comments
+END_RE = re.compile(SKIP + r'(?://[^\n]*)?$', re.DOTALL)
+CONTINUATION_RE = re.compile(r'\\\r?\n')
+
+
+def split_tokens(text):
+    """
+    Split the value of a simple attribute or the arguments of a group or a
+    complex attribute into tokens, without the quotes, the commas, the
+    comments and the line continuations.
+    :param text: the value or the arguments.
+    :return: a list of strings.
+    """
+    if '"' not in text and '/' not in text and '\\' not in text:
+        return text.replace(',', ' ').split()
+    tokens = []
+    for string, word in TOKEN_RE.findall(text):
+        if word:
+            tokens.append(word)
+        elif string:
+            if '\\' in string:
+                string = CONTINUATION_RE.sub('', string)
+            tokens.append(string[1:-1])
+    return tokens
+
+
+def read_statements(f, chunk_size=CHUNK_SIZE, base=0):
+    """
+    Read the statements of a LIB file. The file is read in chunks, so the
+    whole file is never in memory.
+    :param f: the LIB file opened in binary mode.
+    :param chunk_size: number of bytes read at a time.
+    :param base: byte offset of the start of f in the LIB file (when f is a
+    part of the file).
+    :return: yields ('group', type, args, offset) when a group starts,
+    ('end', None, None, offset) when a group ends, and ('attribute', name,
+    values, offset) for the simple and complex attributes. offset is the
+    byte offset of the statement in the file.
+    """
+    buf = ''
+    pos = 0
+    # the statements that end after limit may go on in the next chunk: the
+    # last line of the buffer can be cut, and so can a comment before the
+    # '{' or the ';' of a statement
+    limit = 0
+    eof = False
+    match = STATEMENT_RE.match
+    while True:
+        m = match(buf, pos)
+        if not eof and (m is None or m.end() >= limit):
+            chunk = f.read(chunk_size)
+            if chunk:
+                # latin-1 keeps one character per byte, so the offsets are
+                # byte offsets
+                base += pos
+                buf = buf[pos:] + chunk.decode('latin-1')
+                pos = 0
+                limit = buf.rfind('\n') + 1
+                comment = buf.rfind('/*')
+                if comment > buf.rfind('*/'):
+                    limit = min(limit, comment)
+                continue
+            eof = True
+            continue
+        if m is None:
+            if END_RE.match(buf, pos):
+                return
+            raise ValueError('LIB syntax error at byte ' + str(base + pos) +
+                             ': ' + repr(buf[pos:pos + 40]))
+        pos = m.end()
+        name = m.group('name')
+        if name is None:
+            yield 'end', None, None, base + m.start('end')
+            continue
+        value = m.group('value')
+        if value is not None:
+            if value[0] == '"' and value[-1] == '"' and \
+                    value.count('"') == 2:
+                value = value[1:-1]
+                if '\\' in value:
+                    value = CONTINUATION_RE.sub('', value)
+            else:
+                value = ' '.join(split_tokens(value))
+            yield 'attribute', name, [value], base + m.start('name')
+            continue
+        args = split_tokens(m.group('args'))
+        if m.group('open'):
+            yield 'group', name, args, base + m.start('name')
+        else:
+            yield 'attribute', name, args, base + m.start('name')
+
+
+def build_index(f):
+    """
+    Scan a LIB file for the byte range of each cell group of its (first)
+    library, and of the other statements of the library (the header:
+    attributes, templates, etc.).
+    :param f: the LIB file opened in binary mode.
+    :return: name of the library, a list of [start, end] of the header
+    parts, and a dictionary, cell name -> [start, end].
+    """
+    library = None
+    header = []
+    cells = {}
+    depth = 0
+    # start of the header part being read, and the cell being read
+    span_start = None
+    cell = None
+    # the first library is done
+    done = False
+    for statement, name, args, offset in read_statements(f):
+        if statement == 'end':
+            depth -= 1
+            if done:
+                continue
+            if depth == 1 and cell is not None:
+                cells[cell[0]] = [cell[1], offset + 1]
+                cell = None
+            elif depth == 0 and library is not None:
+                if span_start is not None:
+                    header.append([span_start, offset])
+                done = True
+            continue
+        if not done:
+            if depth == 0 and statement == 'group' and name == 'library':
+                library = args[0]
+            elif depth == 1 and library is not None:
+                if statement == 'group' and name == 'cell':
+                    if span_start is not None:
+                        header.append([span_start, offset])
+                        span_start = None
+                    cell = (args[0], offset)
+                elif span_start is None:
+                    span_start = offset
+        if statement == 'group':
+            depth += 1
+    return library, header, cells
 
 
 class LibParser:
     """
     LibParser will gather information from a LIB file.
+    The file is read as a stream of statements (group start, group end,
+    simple attribute or complex attribute), each statement is given to the
+    object of the current group (see lib_util.Group).
+    The cells can also be loaded one by one (see parse_cells): a first scan
+    saves the byte range of each cell group to an index file next to the
+    LIB file, with the hash of its content, and the later runs only parse
+    the library header and the cells they need.
     """
 
-    def __init__(self, lib_file):
+    def __init__(self, lib_file, index_file=None):
+        """
+        :param lib_file: path of the LIB file.
+        :param index_file: path of the cell index (default: the LIB file
+        path + '.index.json').
+        """
         self.file_path = lib_file
-        # stack to store the ongoing sections (such as cell, timing, etc.)
+        if index_file is None:
+            index_file = lib_file + '.index.json'
+        self.index_file = index_file
+        # stack to store the ongoing groups (such as cell, timing, etc.),
+        # None for the groups that are skipped
         self.stack = []
         self.library = None
+        # the cell index, see load_index()
+        self.index = None
 
-    def parse(self):
-        print ("Start parsing DEF file...")
-        # open the file and start reading
-        f = open(self.file_path, "r+")
-        # the program will run until the end of file f
-        for line in f:
-            # print(line)
-            info = line.split()
-            # print(info)
-            if len(info) > 0:
-                if info[0][:2] == '/*':
-                    # print('comment')
-                    # check for done comment
-                    if info[-1][len(info[-1]) - 2:len(info[-1])] == '*/':
-                        # print('done comment')
-                        pass
-                    else:
-                        new_comment = Comment()
-                        self.stack.append(new_comment)
-                elif info[0] == 'library':
-                    print('library')
-                    lib_name = info[1][1:-1]
-                    new_lib = Library(lib_name)
-                    self.stack.append(new_lib)
-                    self.library = new_lib
+    def feed(self, statements):
+        """
+        Give the statements to the groups on the stack.
+        :param statements: output of read_statements().
+        :return: void
+        """
+        for statement, name, args, offset in statements:
+            current = self.stack[-1]
+            if statement == 'attribute':
+                if current is not None:
+                    current.attribute(name, args)
+            elif statement == 'group':
+                if current is None:
+                    new_group = None
+                elif len(self.stack) == 1 and name == 'library':
+                    new_group = Library(args[0])
+                    if self.library is None:
+                        self.library = new_group
                 else:
-                    # parse current section
-                    if len(self.stack) > 0:
-                        current = self.stack[-1]
-                        if current.parse_next(info):
-                            self.stack.pop()
+                    new_group = current.start_group(name, args)
+                self.stack.append(new_group)
+            else:
+                if len(self.stack) == 1:
+                    raise ValueError('LIB syntax error at byte ' + str(offset) +
+                                     ': unexpected }')
+                done = self.stack.pop()
+                if done is not None:
+                    if isinstance(done, Timing_Vals) and self.library:
+                        done.apply_template(self.library.templates)
+                    done.end()
+
+    def parse(self):
+        print("Start parsing LIB file...")
+        self.stack = [Group('root')]
+        f = open(self.file_path, 'rb')
+        self.feed(read_statements(f))
+        f.close()
+        if len(self.stack) != 1:
+            raise ValueError('LIB syntax error: ' + str(len(self.stack) - 1) +
+                             ' group(s) not closed at the end of the file')
+        print("Parsing LIB file done.")
+
+    def load_index(self):
+        """
+        Load the cell index of the LIB file. The index is built (and saved)
+        again if it is missing or if the LIB file has changed.
+        :return: the index dictionary: 'hash', 'library', 'header' and
+        'cells' (see build_index).
+        """
+        content_hash = file_hash(self.file_path)
+        try:
+            f = open(self.index_file, 'r')
+            index = json.load(f)
+            f.close()
+            if index.get('version') == INDEX_VERSION and \
+                    index.get('hash') == content_hash:
+                self.index = index
+                return index
+        except (IOError, OSError, ValueError):
+            pass
+        print("Indexing the cells of LIB file...")
+        f = open(self.file_path, 'rb')
+        library, header, cells = build_index(f)
+        f.close()
+        if library is None:
+            raise ValueError('LIB file ' + self.file_path + ' has no library')
+        index = {'version': INDEX_VERSION, 'hash': content_hash,
+                 'library': library, 'header': header, 'cells': cells}
+        try:
+            temp_path = self.index_file + '.tmp'
+            f = open(temp_path, 'w')
+            json.dump(index, f)
+            f.close()
+            os.replace(temp_path, self.index_file)
+        except (IOError, OSError):
+            print('Can not save the LIB index to ' + self.index_file)
+        self.index = index
+        return index
 
+    def read_range(self, f, start, end):
+        """
+        Parse a byte range of the LIB file inside the library group.
+        :param f: the LIB file opened in binary mode.
+        :param start: first byte.
+        :param end: byte after the last one.
+        :return: void
+        """
+        f.seek(start)
+        data = io.BytesIO(f.read(end - start))
+        self.feed(read_statements(data, base=start))
+        if len(self.stack) != 2:
+            raise ValueError('LIB syntax error: groups not closed in bytes ' +
+                             str(start) + ' to ' + str(end))
+
+    def parse_cells(self, cell_names):
+        """
+        Parse the library header and the given cells only (the cells that
+        are already loaded are not parsed again), with the cell index.
+        :param cell_names: names of the cells, the names that are not in the
+        library are ignored.
+        :return: the Library object.
+        """
+        if self.index is None:
+            self.load_index()
+        f = open(self.file_path, 'rb')
+        if self.library is None:
+            self.library = Library(self.index['library'])
+            for start, end in self.index['header']:
+                self.stack = [Group('root'), self.library]
+                self.read_range(f, start, end)
+        num_cells = 0
+        for each_name in sorted(set(cell_names)):
+            if each_name in self.library.cell_dict:
+                continue
+            cell_range = self.index['cells'].get(each_name)
+            if cell_range is None:
+                continue
+            self.stack = [Group('root'), self.library]
+            self.read_range(f, cell_range[0], cell_range[1])
+            num_cells += 1
         f.close()
+        self.stack = []
+        print("Loaded " + str(num_cells) + " of " +
+              str(len(self.index['cells'])) + " LIB cells.")
+        return self.library
+
 
 if __name__ == '__main__':
     print('testing...')
@@ -60,4 +335,4 @@ if __name__ == '__main__':
     lib_parser = LibParser(lib_file)
     lib_parser.parse()
 
-    print('Done parsing LIB file.')
\ No newline at end of file
+    print('Done parsing LIB file.')
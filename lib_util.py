@@ -4,251 +4,340 @@ Author: Tri Minh Cao
 Email: tricao@utdallas.edu
 Date: December 2016
 """
+import numpy as np
 
 
-class Library:
+def parse_numbers(text):
+    """
+    Parse a list of numbers separated by commas and/or spaces.
+    :param text: a string, such as "0.1, 0.2, 0.3"
+    :return: 1D NumPy array of float64.
+    """
+    return np.array(text.replace(',', ' ').split(), dtype=np.float64)
+
+
+def to_float(value):
+    """
+    Parse a number attribute, which may have a unit (e.g. 0.5ff is read as
+    0.5 if the unit is not separated from the number).
+    :param value: string value of the attribute.
+    :return: float value, or None if it is not a number.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        end = len(value)
+        while end > 0 and not (value[end - 1].isdigit() or value[end - 1] == '.'):
+            end -= 1
+        try:
+            return float(value[:end])
+        except ValueError:
+            return None
+
+
+class Group:
+    """
+    Class Group is the base class of the groups of the LIB file, such as
+    library, cell or pin. The parser calls start_group() for each group in
+    the group, attribute() for each simple or complex attribute, and end()
+    when the group is closed.
+    Groups that are not read into objects are skipped with their
+    attributes (start_group returns None).
+    """
+    def __init__(self, name):
+        self.name = name
+        # simple and complex attributes that do not have their own field
+        self.attributes = {}
+
+    def start_group(self, group_type, args):
+        """
+        Start a group inside this group.
+        :param group_type: type of the group, such as 'cell'.
+        :param args: list of the group arguments (usually the name).
+        :return: the object of the new group, or None to skip the group.
+        """
+        return None
+
+    def attribute(self, name, values):
+        """
+        Read an attribute of this group.
+        :param name: name of the attribute.
+        :param values: list of the values, one value for simple attributes.
+        :return: void
+        """
+        if len(values) == 1:
+            self.attributes[name] = values[0]
+        else:
+            self.attributes[name] = values
+
+    def end(self):
+        """
+        The group is closed.
+        :return: void
+        """
+        pass
+
+
+class Library(Group):
     """
     Class Library represents the library section in the LIB file.
     Usually one lib file only has one library.
     """
     def __init__(self, name):
-        self.name = name
-        self.stack = []
-        self.stack.append(name)
+        Group.__init__(self, name)
         self.cell_dict = {}
+        # lookup table templates: name -> LuTableTemplate
+        self.templates = {}
 
-    def parse_next(self, info):
-        if len(self.stack) > 0:
-            current = self.stack[-1]
-        # first case, the stack currently has some parsable object
-        if not isinstance(current, str):
-            if current.parse_next(info):
-                self.stack.pop()
-        else:
-            # the library will parse by itself
-            if info[-1][-1] == '{':
-                if info[0] == 'cell':
-                    cell_name = info[1][1:-1]
-                    new_cell = Cell(cell_name)
-                    print(cell_name)
-                    self.stack.append(new_cell)
-                    self.cell_dict[cell_name] = new_cell
-                else:
-                    self.stack.append(info[0])
-            elif info[-1][-1] == '}':
-                last_section = self.stack.pop()
-                if last_section == self.name:
-                    return 1
-                else:
-                    return 0
-
-
-class Comment:
-    """
-    Class Comment parses comment in the LIB file.
+    def start_group(self, group_type, args):
+        if group_type == 'cell':
+            new_cell = Cell(args[0])
+            self.cell_dict[new_cell.name] = new_cell
+            return new_cell
+        elif group_type in TEMPLATE_GROUPS:
+            new_template = LuTableTemplate(args[0])
+            self.templates[new_template.name] = new_template
+            return new_template
+        return None
+
+
+class LuTableTemplate(Group):
     """
-    def __init__(self):
-        pass
+    Class LuTableTemplate represents a lookup table template (such as
+    lu_table_template or power_lut_template): the variables and the default
+    indices of the tables that use it.
+    """
+    def __init__(self, name):
+        Group.__init__(self, name)
+        # variable_1, variable_2, variable_3
+        self.variables = [None, None, None]
+        # index_1, index_2, index_3 as NumPy arrays
+        self.indices = [None, None, None]
 
-    def parse_next(self, info):
-        if info[-1][len(info[-1]) - 2:len(info[-1])] == '*/':
-            # print('done comment')
-            return 1
+    def attribute(self, name, values):
+        if name[:9] == 'variable_' and name[9:] in ('1', '2', '3'):
+            self.variables[int(name[9:]) - 1] = values[0]
+        elif name[:6] == 'index_' and name[6:] in ('1', '2', '3'):
+            self.indices[int(name[6:]) - 1] = parse_numbers(','.join(values))
         else:
-            return 0
+            Group.attribute(self, name, values)
 
 
-class Cell:
+class Cell(Group):
     """
     Class Cell represents a cell section in the LIB file.
     """
     def __init__(self, name):
-        self.name = name
-        self.stack = []
-        self.stack.append(name)
+        Group.__init__(self, name)
         self.pin_dict = {}
         self.drive_strength = None
         self.area = None
 
-    def parse_next(self, info):
-        if len(self.stack) > 0:
-            current = self.stack[-1]
-        # first case, the stack currently has some parsable object
-        if not isinstance(current, str):
-            if current.parse_next(info):
-                self.stack.pop()
+    def start_group(self, group_type, args):
+        if group_type == 'pin':
+            new_pin = Pin(args[0])
+            # pin (A, B) { ... } defines pins with the same attributes
+            for each_name in args:
+                self.pin_dict[each_name] = new_pin
+            return new_pin
+        elif group_type in ('bus', 'bundle'):
+            return Bus(args[0], self)
+        return None
+
+    def attribute(self, name, values):
+        if name == 'drive_strength':
+            self.drive_strength = to_float(values[0])
+        elif name == 'area':
+            self.area = to_float(values[0])
         else:
-            if info[-1][-1] == '{':
-                # print('start section ' + info[0])
-                if info[0] == 'pin':
-                    pin_name = info[1][1:-1]
-                    new_pin = Pin(pin_name)
-                    self.stack.append(new_pin)
-                    self.pin_dict[pin_name] = new_pin
-                else:
-                    self.stack.append(info[0])
-            elif info[0] == 'drive_strength':
-                self.drive_strength = float(info[2][:-1])
-            elif info[0] == 'area':
-                self.area = float(info[2][:-1])
-            elif info[-1][-1] == '}':
-                last_section = self.stack.pop()
-                # print ('end section ' + last_section)
-                if last_section == self.name:
-                    return 1
-                else:
-                    return 0
-
-
-class Pin:
+            Group.attribute(self, name, values)
+
+
+class Bus(Group):
+    """
+    Class Bus represents a bus or bundle of a cell. Its pins are also added
+    to the pin dictionary of the cell.
+    """
+    def __init__(self, name, cell):
+        Group.__init__(self, name)
+        self.cell = cell
+        self.pin_dict = {}
+
+    def start_group(self, group_type, args):
+        if group_type == 'pin':
+            new_pin = Pin(args[0])
+            for each_name in args:
+                self.pin_dict[each_name] = new_pin
+                self.cell.pin_dict[each_name] = new_pin
+            return new_pin
+        return None
+
+
+class Pin(Group):
     """
     Class Pin represents information of a pin (which belongs to a cell).
     """
     def __init__(self, name):
-        self.name = name
-        self.stack = []
-        self.stack.append(name)
+        Group.__init__(self, name)
         self.direction = None
+        self.function = None
         self.capacitance = None
         self.rise_capacitance = None
         self.fall_capacitance = None
         self.max_capacitance = None
         self.timings = []
+        self.internal_powers = []
 
-    def parse_next(self, info):
-        if len(self.stack) > 0:
-            current = self.stack[-1]
-        # first case, the stack currently has some parsable object
-        if not isinstance(current, str):
-            if current.parse_next(info):
-                self.stack.pop()
+    def start_group(self, group_type, args):
+        if group_type == 'timing':
+            new_timing = Timing()
+            self.timings.append(new_timing)
+            return new_timing
+        elif group_type == 'internal_power':
+            new_power = InternalPower()
+            self.internal_powers.append(new_power)
+            return new_power
+        return None
+
+    def attribute(self, name, values):
+        if name == 'direction':
+            self.direction = values[0]
+        elif name == 'function':
+            self.function = values[0]
+        elif name in ('capacitance', 'rise_capacitance', 'fall_capacitance',
+                      'max_capacitance'):
+            setattr(self, name, to_float(values[0]))
         else:
-            if info[-1][-1] == '{' or (len(info) > 1 and info[1][0] == '{'):
-                # print('start section ' + info[0])
-                if info[0] == 'timing':
-                    new_timing = Timing()
-                    self.timings.append(new_timing)
-                    self.stack.append(new_timing)
-                elif info[0] == 'internal_power':
-                    # print('internal power')
-                    self.stack.append(info[0])
-                    # self.stack.append('internal_power')
-                else:
-                    self.stack.append(info[0])
-            elif info[0] == 'direction':
-                self.direction = info[2][:-1]
-            elif info[0] == 'capacitance':
-                self.capacitance = float(info[2][:-1])
-            elif info[0] == 'max_capacitance':
-                self.max_capacitance = float(info[2][:-1])
-            elif info[-1][-1] == '}':
-                last_section = self.stack.pop()
-                # print ('end section ' + last_section)
-                if last_section == self.name:
-                    return 1
-                else:
-                    return 0
-
-
-class Timing:
+            Group.attribute(self, name, values)
+
+
+class Timing(Group):
     """
     Class Timing represents timing information of a pin.
+    Every table of the timing group is kept in the tables dictionary (group
+    type -> Timing_Vals); the delay and transition tables also have their
+    own fields.
     """
     def __init__(self):
-        self.name = 'timing'
-        self.stack = []
-        self.stack.append(self.name)
-        # cell fall
-        # cell rise
-        # fall transition
-        # rise transition
+        Group.__init__(self, 'timing')
         self.related_pin = None
+        self.timing_sense = None
+        self.timing_type = None
         self.cell_fall = None
         self.cell_rise = None
         self.fall_transition = None
         self.rise_transition = None
+        self.tables = {}
+
+    def start_group(self, group_type, args):
+        new_table = Timing_Vals(group_type, args[0] if args else None)
+        self.tables[group_type] = new_table
+        if group_type in ('cell_fall', 'cell_rise', 'fall_transition',
+                          'rise_transition'):
+            setattr(self, group_type, new_table)
+        return new_table
+
+    def attribute(self, name, values):
+        if name == 'related_pin':
+            self.related_pin = values[0]
+        elif name == 'timing_sense':
+            self.timing_sense = values[0]
+        elif name == 'timing_type':
+            self.timing_type = values[0]
+        else:
+            Group.attribute(self, name, values)
+
+
+class InternalPower(Group):
+    """
+    Class InternalPower represents the internal power of a pin, the tables
+    (rise_power, fall_power or power) are kept in the tables dictionary.
+    """
+    def __init__(self):
+        Group.__init__(self, 'internal_power')
+        self.related_pin = None
+        self.tables = {}
 
-    def parse_next(self, info):
-        if len(self.stack) > 0:
-            current = self.stack[-1]
-        # first case, the stack currently has some parsable object
-        if not isinstance(current, str):
-            if current.parse_next(info):
-                self.stack.pop()
+    def start_group(self, group_type, args):
+        new_table = Timing_Vals(group_type, args[0] if args else None)
+        self.tables[group_type] = new_table
+        return new_table
+
+    def attribute(self, name, values):
+        if name == 'related_pin':
+            self.related_pin = values[0]
         else:
-            if info[-1][-1] == '{' or (len(info) > 1 and info[1][0] == '{'):
-            # if info[-1][-1] == '{':
-                # print('start section ' + info[0])
-                section_name = info[0][0:9]
-                if section_name == 'cell_fall':
-                    new_timing_val = Timing_Vals(section_name)
-                    self.stack.append(new_timing_val)
-                    self.cell_fall = new_timing_val
-                elif section_name == 'cell_rise':
-                    new_timing_val = Timing_Vals(section_name)
-                    self.stack.append(new_timing_val)
-                    self.cell_rise = new_timing_val
-                elif section_name == 'fall_tran':
-                    new_timing_val = Timing_Vals(section_name)
-                    self.stack.append(new_timing_val)
-                    self.fall_transition = new_timing_val
-                elif section_name == 'rise_tran':
-                    new_timing_val = Timing_Vals(section_name)
-                    self.stack.append(new_timing_val)
-                    self.rise_transition = new_timing_val
-                else:
-                    self.stack.append(info[0])
-            elif info[0] == 'related_pin':
-                pin_name = ''
-                for i in range(1, len(info[2])):
-                    if info[2][i] == '\"':
-                        break
-                    else:
-                        pin_name += info[2][i]
-                self.related_pin = pin_name
-            elif info[-1][-1] == '}':
-                last_section = self.stack.pop()
-                # print ('end section ' + last_section)
-                if last_section == self.name:
-                    return 1
-                else:
-                    return 0
-
-
-class Timing_Vals:
-    """
-    Class Timing_Vals represents timing values from a timing section.
-    Values can be: cell_rise, cell_fall, fall_transition, rise_transition.
-    """
-    def __init__(self, type):
+            Group.attribute(self, name, values)
+
+
+class Timing_Vals(Group):
+    """
+    Class Timing_Vals represents a lookup table of a timing or power group,
+    such as cell_rise, cell_fall, fall_transition, rise_transition or
+    rise_power.
+    The indices and the values are NumPy arrays. The indices that are not in
+    the table come from its template (see apply_template). A table with two
+    indices has a 2D values array (index_1 x index_2).
+    """
+    def __init__(self, type, template=None):
+        Group.__init__(self, type)
         self.type = type
-        # self.stack = []
-        # self.stack.append(name)
+        # name of the lookup table template, 'scalar' for a single value
+        self.template = template
+        self.variables = [None, None, None]
+        self.indices = [None, None, None]
+        self.values = None
+        # the first number of the table
         self.value = None
 
-    def parse_next(self, info):
-        # if len(self.stack) > 0:
-        #    current = self.stack[-1]
-        # # first case, the stack currently has some parsable object
-        # if not isinstance(current, str):
-        #    if current.parse_next(info):
-        #        self.stack.pop()
-        if info[-1][-1] == '}':
-            return 1
-        elif info[0] == 'values':
-            numbers = info[1]
-            value = ''
-            for i in range(2, len(numbers)):
-                if numbers[i] == ',':
-                    break
-                else:
-                    value += numbers[i]
-            self.value = float(value)
+    @property
+    def index_1(self):
+        return self.indices[0]
+
+    @property
+    def index_2(self):
+        return self.indices[1]
+
+    @property
+    def index_3(self):
+        return self.indices[2]
 
+    def attribute(self, name, values):
+        if name == 'values':
+            self.values = parse_numbers(','.join(values))
+            if len(values) > 1 and self.values.size % len(values) == 0:
+                # one string per row of the table
+                self.values = self.values.reshape(len(values), -1)
+            if self.values.size > 0:
+                self.value = float(self.values.flat[0])
+        elif name[:6] == 'index_' and name[6:] in ('1', '2', '3'):
+            self.indices[int(name[6:]) - 1] = parse_numbers(','.join(values))
         else:
-            return 0
+            Group.attribute(self, name, values)
 
+    def apply_template(self, templates):
+        """
+        Take the variables and the missing indices from the template, and
+        shape the values by the indices.
+        :param templates: dictionary of LuTableTemplate objects.
+        :return: void
+        """
+        template = templates.get(self.template)
+        if template is not None:
+            self.variables = list(template.variables)
+            for k in range(3):
+                if self.indices[k] is None:
+                    self.indices[k] = template.indices[k]
+        if self.values is None:
+            return
+        if self.indices[0] is not None and self.indices[1] is not None:
+            shape = (len(self.indices[0]), len(self.indices[1]))
+            if self.values.size == shape[0] * shape[1]:
+                self.values = self.values.reshape(shape)
+        elif self.values.ndim == 2 and self.values.shape[0] == 1:
+            self.values = self.values[0]
 
-# class Internal_Power:
-#     pass
 
+# groups of the library that define lookup table templates
+TEMPLATE_GROUPS = ('lu_table_template', 'power_lut_template',
+                   'output_current_template', 'ocv_table_template')
@@ -0,0 +1,85 @@
+"""
+Load the LEF, DEF and LIB inputs of the attack concurrently
+Author: Tri Minh Cao
+Email: tricao@utdallas.edu
+Date: December 2016
+"""
+from def_parser import DefParser
+from lef_parser import LefParser
+from lib_parser import LibParser
+from multiprocessing import Pool
+import time
+
+
+def index_lef(lef_file):
+    """
+    Scan a LEF file (run by a worker process of load_inputs).
+    :param lef_file: path of the LEF file.
+    :return: the LefParser object with the layers, the vias and the byte
+    range of each macro (see LefParser.index_macros).
+    """
+    lef_parser = LefParser(lef_file)
+    lef_parser.index_macros()
+    return lef_parser
+
+
+def index_lib(lib_file):
+    """
+    Load or build the cell index of a LIB file (run by a worker process of
+    load_inputs).
+    :param lib_file: path of the LIB file.
+    :return: the LibParser object with its cell index (see
+    LibParser.load_index).
+    """
+    lib_parser = LibParser(lib_file)
+    lib_parser.load_index()
+    return lib_parser
+
+
+def load_inputs(lef_file, def_file, lib_file=None, workers=1, route_dir=None):
+    """
+    Parse the inputs of the attack. With more than one worker, the LEF and
+    LIB files are scanned by worker processes while the DEF file is parsed.
+    The DEF data stays in this process (sending its objects back would cost
+    about as much as parsing it); the workers only send back the index of
+    their file, and the macros and cells used by the design are parsed from
+    it (see LefParser.parse_macros and LibParser.parse_cells).
+    :param lef_file: path of the LEF file.
+    :param def_file: path of the DEF file.
+    :param lib_file: path of the LIB file (optional).
+    :param workers: number of processes that can be used.
+    :param route_dir: directory of the route store of the DEF file (optional,
+    see route_store.RouteStore).
+    :return: LEF data (LefParser), DEF data (DefParser) and LIB data
+    (lib_util.Library, None without a LIB file).
+    """
+    start = time.time()
+    pool = None
+    lef_result = None
+    lib_result = None
+    if workers > 1:
+        pool = Pool(2 if lib_file else 1)
+        lef_result = pool.apply_async(index_lef, (lef_file,))
+        if lib_file:
+            lib_result = pool.apply_async(index_lib, (lib_file,))
+        pool.close()
+    def_parser = DefParser(def_file, route_dir)
+    def_parser.parse()
+    if pool:
+        lef_parser = lef_result.get()
+        lib_parser = lib_result.get() if lib_file else None
+        pool.join()
+    else:
+        lef_parser = index_lef(lef_file)
+        lib_parser = index_lib(lib_file) if lib_file else None
+    # the layers of the routes are ranked in the LEF order
+    def_parser.rank_layers(lef_parser.layer_ranks)
+    macros = set(each_comp.macro for each_comp in def_parser.components.comps)
+    # only the macros and the cells of the design are parsed
+    lef_parser.parse_macros(macros)
+    lib_data = None
+    if lib_parser:
+        lib_data = lib_parser.parse_cells(macros)
+    print('Loading the inputs done in ' + str(round(time.time() - start, 3)) +
+          ' s.')
+    return lef_parser, def_parser, lib_data
@@ -0,0 +1,214 @@
+"""
+Multilevel solving of the attack flow for large designs
+Author: Tri Minh Cao
+Email: tricao@utdallas.edu
+Date: December 2016
+"""
+import math
+from multiprocessing import Pool
+from flow_util import *
+
+
+def grid_tiles(points, tile_size):
+    """
+    Group points into the tiles of a grid with about tile_size points per
+    tile: the points are split into columns by their x coordinates, then each
+    column is split into rows by the y coordinates, so the tiles have about
+    the same number of points.
+    :param points: a list of (x, y)
+    :param tile_size: number of points per tile.
+    :return: the tile index of each point, and the number of tiles.
+    """
+    tiles = [0] * len(points)
+    if not points:
+        return tiles, 0
+    side = max(1, int(math.ceil(math.sqrt(len(points) / float(tile_size)))))
+    by_x = sorted(range(len(points)), key=lambda p: points[p])
+    column_size = int(math.ceil(len(by_x) / float(side)))
+    num_tiles = 0
+    for start in range(0, len(by_x), column_size):
+        column = by_x[start:start + column_size]
+        column.sort(key=lambda p: (points[p][1], points[p][0]))
+        row_size = int(math.ceil(len(column) / float(side)))
+        for row_start in range(0, len(column), row_size):
+            for p in column[row_start:row_start + row_size]:
+                tiles[p] = num_tiles
+            num_tiles += 1
+    return tiles, num_tiles
+
+
+def coarse_shares(num_sources, edges, sink_tile, num_tiles, source_caps):
+    """
+    Split the capacity of each source pin between the tiles of the sink pins.
+    A source pin with at least as much capacity as candidate edges can use
+    all its edges in every tile. The capacity of the other source pins is
+    split by a coarse min cost flow between the source pins and the tiles,
+    where a tile needs one unit per sink pin, and the cost of a unit from a
+    source pin to a tile is the shortest candidate edge between them.
+    :param num_sources: number of source pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param sink_tile: the tile index of each sink pin.
+    :param num_tiles: number of tiles.
+    :param source_caps: capacity of each source pin.
+    :return: a dictionary, (source index, tile index) -> capacity.
+    """
+    count = {}
+    shortest = {}
+    total = [0] * num_sources
+    tile_sinks = [set() for i in range(num_tiles)]
+    for i, j, weight in edges:
+        key = (i, sink_tile[j])
+        count[key] = count.get(key, 0) + 1
+        if key not in shortest or weight < shortest[key]:
+            shortest[key] = weight
+        total[i] += 1
+        tile_sinks[sink_tile[j]].add(j)
+    binding = [source_caps[i] < total[i] for i in range(num_sources)]
+    if not any(binding):
+        return count
+    # nodes: 0 = super source, the source pins, the tiles, the super sink
+    s = 0
+    t = num_sources + num_tiles + 1
+    network = MinCostFlow(num_sources + num_tiles + 2)
+    for i in range(num_sources):
+        network.add_edge(s, 1 + i, source_caps[i], 0)
+    for tile in range(num_tiles):
+        network.add_edge(1 + num_sources + tile, t, len(tile_sinks[tile]), 0)
+    coarse_edges = {}
+    for key in count:
+        i, tile = key
+        coarse_edges[key] = network.add_edge(1 + i, 1 + num_sources + tile,
+                                             count[key], shortest[key])
+    network.max_flow(s, t)
+    network.cancel_negative_cycles()
+    print('Coarse flow: cost = ' + str(network.total_cost()) + ', flow = ' +
+          str(network.flow_value(s)))
+    shares = {}
+    for key in count:
+        if binding[key[0]]:
+            shares[key] = network.flow(coarse_edges[key])
+        else:
+            shares[key] = count[key]
+    return shares
+
+
+def solve_tile(task):
+    """
+    Solve the flow of one tile (run by the worker processes).
+    :param task: (number of source pins, number of sink pins, edges, capacity
+    of each source pin), with the local indices of the tile.
+    :return: the used edge indices (in the edges of the tile) and the
+    potentials of the optimal flow.
+    """
+    num_sources, num_sinks, edges, caps = task
+    network, edge_ids = optimal_network(num_sources, num_sinks, edges, caps)
+    return used_edges(network, edge_ids), network.potential
+
+
+def multilevel_flow(num_sources, num_sinks, edges, sink_points, tile_size,
+                    workers=1, source_cap=SOURCE_CAP):
+    """
+    Solve the min cost max flow of the attack network in three levels:
+    1. the sink pins are grouped into tiles by their location, and a coarse
+    flow splits the capacity of the source pins between the tiles.
+    2. the flow of each tile is solved on its own, by worker processes.
+    3. the flows of the tiles are joined and refined along the tile borders:
+    the potentials of the tiles are joined too, and the cycle cancelling only
+    starts from the nodes where they do not fit (mostly source pins used by
+    several tiles), so the final flow is optimal.
+    :param num_sources: number of source pins.
+    :param num_sinks: number of sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param sink_points: the location (x, y) of each sink pin.
+    :param tile_size: number of sink pins per tile.
+    :param workers: number of worker processes for the tiles.
+    :param source_cap: capacity of each source pin, or a list with the
+    capacity of every source pin.
+    :return: a list of the edge indices (in edges) that carry flow, the cost
+    of the flow, the number of tiles and the cost of the joined tile flows.
+    """
+    if isinstance(source_cap, list):
+        source_caps = source_cap
+    else:
+        source_caps = [source_cap] * num_sources
+    sink_tile, num_tiles = grid_tiles(sink_points, tile_size)
+    print('Multilevel flow: ' + str(num_tiles) + ' tiles')
+    shares = coarse_shares(num_sources, edges, sink_tile, num_tiles,
+                           source_caps)
+    tile_edges = [[] for i in range(num_tiles)]
+    for k in range(len(edges)):
+        tile_edges[sink_tile[edges[k][1]]].append(k)
+    tasks = []
+    tile_pins = []
+    for tile in range(num_tiles):
+        if not tile_edges[tile]:
+            continue
+        local_sources = {}
+        local_sinks = {}
+        local_edges = []
+        for k in tile_edges[tile]:
+            i, j, weight = edges[k]
+            if i not in local_sources:
+                local_sources[i] = len(local_sources)
+            if j not in local_sinks:
+                local_sinks[j] = len(local_sinks)
+            local_edges.append((local_sources[i], local_sinks[j], weight))
+        source_list = sorted(local_sources, key=local_sources.get)
+        sink_list = sorted(local_sinks, key=local_sinks.get)
+        caps = [shares[(i, tile)] for i in source_list]
+        tasks.append((len(source_list), len(sink_list), local_edges, caps))
+        tile_pins.append((tile_edges[tile], source_list, sink_list))
+    if workers > 1 and len(tasks) > 1:
+        pool = Pool(min(workers, len(tasks)))
+        results = pool.map(solve_tile, tasks)
+        pool.close()
+        pool.join()
+    else:
+        results = [solve_tile(each_task) for each_task in tasks]
+
+    # join the tile flows and their potentials (shifted so the super source
+    # has potential 0 in every tile)
+    network, edge_ids = assignment_network(num_sources, num_sinks, edges,
+                                           source_cap)
+    s = network.s
+    t = network.t
+    potential = [0] * network.num_nodes
+    potential_t = None
+    for (ks, source_list, sink_list), (used, local_potential) in \
+            zip(tile_pins, results):
+        base = local_potential[0]
+        for idx in used:
+            i, j, weight = edges[ks[idx]]
+            network.push(network.source_edges[i], 1)
+            network.push(edge_ids[ks[idx]], 1)
+            network.push(network.sink_edges[j], 1)
+        for a in range(len(source_list)):
+            potential[1 + source_list[a]] = local_potential[1 + a] - base
+        for b in range(len(sink_list)):
+            potential[1 + num_sources + sink_list[b]] = \
+                local_potential[1 + len(source_list) + b] - base
+        local_t = local_potential[-1] - base
+        if potential_t is None or local_t > potential_t:
+            potential_t = local_t
+    if potential_t is not None:
+        potential[t] = potential_t
+    network.potential = potential
+    local_cost = network.total_cost()
+    print('Tile flows: cost = ' + str(local_cost) + ', flow = ' +
+          str(network.flow_value(s)))
+    # border refinement: the nodes changed by the maximum flow and the nodes
+    # with an edge that does not fit the joined potentials
+    network.touched = set()
+    network.max_flow(s, t)
+    seeds = network.touched
+    network.touched = None
+    for u in range(network.num_nodes):
+        for e in network.adj[u]:
+            if network.cap[e] > 0 and network.reduced_cost(e, u) < 0:
+                seeds.add(u)
+                break
+    network.cancel_negative_cycles(seeds=seeds)
+    cost = network.total_cost()
+    print('Border refinement: ' + str(len(seeds)) + ' nodes, cost = ' +
+          str(cost) + ', flow = ' + str(network.flow_value(s)))
+    return used_edges(network, edge_ids), cost, num_tiles, local_cost
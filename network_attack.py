@@ -6,9 +6,22 @@ Date: December 2016
 """
 from def_parser import *
 from lef_parser import *
+from load_util import load_inputs
+from route_store import routes_points
+from split_def import Splitter
+from attack_util import *
+from flow_util import *
+from auction_util import auction_assignment
+from multilevel_util import multilevel_flow
+from solver_model import design_stats, predict_modes, select_mode
 import networkx as nx
 # from networkx.algorithms.flow import max_flow_min_cost
 import argparse
+import csv
+import math
+import os
+from multiprocessing import Pool
+import time
 
 
 def get_done_sinks(sink_pins, source_pins, pin_net_dict):
@@ -38,10 +51,17 @@ def distance_two_nets(net1, net2, net_ends_dict):
     :param net2:
     :return: distance value
     """
-    min_dist = float('inf')
     points1 = net_ends_dict[net1.name][0]
     points2 = net_ends_dict[net2.name][0]
+    return ends_distance(points1, points2)
+
 
+def ends_distance(points1, points2):
+    """
+    Get the minimum Manhattan distance between two lists of end points.
+    :return: distance value (inf if a list is empty)
+    """
+    min_dist = float('inf')
     # find the pair of points with minimum distance
     for i in range(len(points1)):
         for j in range(len(points2)):
@@ -194,6 +214,17 @@ def output_verilog(connections, def_data, lef_data, verilog_file):
     :param verilog_file: verilog file name
     :return: void
     """
+    f = open(verilog_file, 'w')
+    f.write(verilog_netlist(connections, def_data, lef_data))
+    f.close()
+
+
+def verilog_netlist(connections, def_data, lef_data):
+    """
+    Build the verilog netlist from the connections inferred.
+    :param connections: connections dictionary
+    :return: a string that contains the netlist in verilog format.
+    """
     inputs = []
     outputs = []
     wires = []
@@ -237,7 +268,8 @@ def output_verilog(connections, def_data, lef_data, verilog_file):
                 new_pin = ''
                 pin_tuple = (each_cell, each_pin)
                 new_pin += '.' + each_pin + '('
-                net_name = netlist[pin_tuple]
+                # a pin is not connected if the flow can not reach it
+                net_name = netlist.get(pin_tuple, '')
                 new_pin += net_name + ')'
                 pin_list.append(new_pin)
         new_cell += ', '.join(pin_list)
@@ -247,7 +279,6 @@ def output_verilog(connections, def_data, lef_data, verilog_file):
     design_name = def_data.design_name
     inouts = inputs + outputs
     # start writing
-    f = open(verilog_file, 'w')
     s = '\n'
     s += 'module ' + design_name + ' ( '
     s += ', '.join(inouts)
@@ -264,9 +295,7 @@ def output_verilog(connections, def_data, lef_data, verilog_file):
         s += '  ' + each_cell + '\n'
     s += '\n'
     s += 'endmodule'
-    # write to file
-    f.write(s)
-    f.close()
+    return s
 
 
 def get_macro_pins(cell_name, def_data, lef_data):
@@ -287,25 +316,28 @@ def net_end_points(net_name, def_data):
     :param def_data: data from DEF file
     :return: a dictionary of end-points
     """
-    top_layer = def_data.nets.get_top_layer()
-    via_split = 'via' + top_layer[-1]
+    ranks = def_data.layer_ranks
+    top_layer = def_data.nets.get_top_layer(ranks)
+    via_split = 'via' + str(ranks[top_layer])
     die_area = def_data.diearea
     net_data = def_data.nets.net_dict[net_name]
     ends_dict = {} # end-points dictionary
     end_points = set() # set of end_points
     # initialize the ends_dict
-    for each_route in net_data.routed:
+    routes = net_data.routed
+    # the points of the stored routes are read from their columns at once
+    for each_route, points in zip(routes, routes_points(routes)):
         if each_route.end_via and each_route.end_via[:4] == via_split:
             tuple_pt = tuple(each_route.end_via_loc[:2])
             end_points.add(tuple_pt)
-        for each_pt in each_route.points:
+        for each_pt in points:
             # check for border (pin location)
             tuple_pt = tuple(each_pt[:2])
             # create the list in ends_dict if it does not exist
             if tuple_pt not in ends_dict:
                 ends_dict[tuple_pt] = []
             # add end points from the route
-            for each_end in each_route.points:
+            for each_end in points:
                 if each_end != each_pt:
                     ends_dict[tuple_pt].append(tuple(each_end[:2]))
     end_points = list(end_points)
@@ -327,8 +359,13 @@ def net_direction(end_points, ends_dict, def_data):
     :return: a list of pairs of corner points. If a connection is within
     one of those pairs, then it's possible.
     """
-    # find the maximum x and y coordinate
-    die_area = def_data.diearea
+    return direction_areas(end_points, ends_dict, def_data.diearea)
+
+
+def direction_areas(end_points, ends_dict, die_area):
+    """
+    Same as net_direction(), with the die area instead of the DEF data.
+    """
     # check for special case
     if len(end_points) == 0:
         return [die_area]
@@ -408,16 +445,30 @@ def dangling_net(net1, net2, net_ends_dict, def_data):
     # find the direction of net2
     net2_ends = net_ends_dict[net2.name]
     net2_direction = net_direction(net2_ends[0], net2_ends[1], def_data)
+    return ends_facing(net1_ends[0], net1_direction, net2_ends[0],
+                       net2_direction)
+
+
+def ends_facing(ends1, direction1, ends2, direction2):
+    """
+    Check if two nets point to each other: some end point of each net is in
+    the direction (see net_direction) of the other net.
+    :param ends1: end points of net1.
+    :param direction1: direction areas of net1.
+    :param ends2: end points of net2.
+    :param direction2: direction areas of net2.
+    :return: True or False
+    """
     # check if some end point of net1 is in net2's direction
     # that means some end point must be within of some net2 corner pair.
     result1 = False
-    for each_end in net1_ends[0]:
-        for each_rect in net2_direction:
+    for each_end in ends1:
+        for each_rect in direction2:
             if inside_area(each_end, each_rect):
                 result1 = True
     result2 = False
-    for each_end in net2_ends[0]:
-        for each_rect in net1_direction:
+    for each_end in ends2:
+        for each_rect in direction1:
             if inside_area(each_end, each_rect):
                 result2 = True
     return result1 and result2
@@ -464,54 +515,67 @@ def check_loop(source_pins, sink_pins, connected_dict):
     return loops
 
 
-# Main Class
-if __name__ == '__main__':
-    # log_file = './c432/c432_metal4_testrun.txt'
-    # log = open(log_file, 'w')
-    # inputs: LEF, DEF
-    # output: Verilog
-    parser = argparse.ArgumentParser(description='FEOL attack tool.')
-    parser.add_argument('-lef', '--lef', help='LEF file path', required=True)
-    parser.add_argument('-i', '--input', help='Input DEF layout file name', required=True)
-    parser.add_argument('-o', '--output', help='Output Verilog file name',
-                        required=True)
-    args = parser.parse_args()
+def pin_position(pin, pin_net_dict, net_ends_dict):
+    """
+    Get the location of a pin: the center of the end points of its net (or of
+    all the points of the net if it has no end point).
+    :param pin: the pin, (cell name, pin name)
+    :param pin_net_dict: dictionary of the net of each pin.
+    :param net_ends_dict: dictionary that store the end points of each net.
+    :return: (x, y)
+    """
+    end_points, ends_dict = net_ends_dict[pin_net_dict[pin].name]
+    points = end_points or list(ends_dict)
+    if not points:
+        return (0, 0)
+    x = sum(each[0] for each in points) / float(len(points))
+    y = sum(each[1] for each in points) / float(len(points))
+    return (x, y)
 
-    # Load the Layout
-    # lef_file = "./c17_example/NangateOpenCellLibrary.lef"
-    lef_file = args.lef
-    lef_parser = LefParser(lef_file)
-    lef_parser.parse()
 
-    # def_file = "./c17_example/c17_split_metal3.def"
-    def_file = args.input
-    def_parser = DefParser(def_file)
-    def_parser.parse()
+def get_net_ends(def_data):
+    """
+    Get the end points and the ends dictionary of every net.
+    :param def_data: DEF data
+    :return: a dictionary that stores (end_points, ends_dict) for each net.
+    """
+    net_ends_dict = {}
+    for each_net in def_data.nets.nets:
+        end_points, ends_dict = net_end_points(each_net.name, def_data)
+        net_ends_dict[each_net.name] = (end_points, ends_dict)
+    return net_ends_dict
+
 
-    # Build lists of source pins and sink pins
-    # source pins = primary input pins, output cell pins
-    # sink pins = primary output pins, input cell pins
+def get_pins(def_data, lef_data, net_ends_dict):
+    """
+    Build lists of source pins and sink pins.
+    source pins = primary input pins, output cell pins
+    sink pins = primary output pins, input cell pins
+    Primary pins that do not belong to any net get a new net, which is added
+    to def_data and net_ends_dict.
+    :param def_data: DEF data
+    :param lef_data: LEF data
+    :param net_ends_dict: dictionary that store the end points of each net.
+    :return: source_pins, sink_pins, primary_inputs, primary_outputs,
+    pin_net_dict
+    """
     source_pins = []
     sink_pins = []
-    input_cell_pins = set()
-    output_cell_pins = set()
     primary_inputs = set()
     primary_outputs = set()
 
-    # Get the end_points and ends_dict for each net
-    nets = def_parser.nets
-    net_ends_dict = {} # store the end points for each net
-    for each_net in nets.nets:
-        end_points, ends_dict = net_end_points(each_net.name, def_parser)
-        net_ends_dict[each_net.name] = (end_points, ends_dict)
-
     # Get pins from nets
-    pin_dict = def_parser.pins.pin_dict
+    pin_dict = def_data.pins.pin_dict
     pin_net_dict = {}
-    for each_net in nets.nets:
+    for each_net in def_data.nets.nets:
         for each_pin in each_net.comp_pin:
             current_pin = tuple(each_pin)
+            # after splitting, a pin can belong to more than one net; the pin
+            # is listed only once (the flow graph has one node per pin).
+            new_pin = current_pin not in pin_net_dict
             pin_net_dict[current_pin] = each_net
+            if not new_pin:
+                continue
             if current_pin[0] == 'PIN':
                 primary_pin = pin_dict[current_pin[1]]
                 if primary_pin.direction == 'INPUT':
@@ -521,15 +585,13 @@ if __name__ == '__main__':
                     sink_pins.append(current_pin)
                     primary_outputs.add(current_pin)
             else:
-                macro_name = def_parser.components.comp_dict[current_pin[0]].macro
-                macro_data = lef_parser.macro_dict[macro_name]
+                macro_name = def_data.components.comp_dict[current_pin[0]].macro
+                macro_data = lef_data.macro_dict[macro_name]
                 pin_data = macro_data.pin_dict[current_pin[1]]
                 if pin_data.direction == 'INPUT':
                     sink_pins.append(current_pin)
-                    input_cell_pins.add(current_pin)
                 elif pin_data.direction == 'OUTPUT':
                     source_pins.append(current_pin)
-                    output_cell_pins.add(current_pin)
 
     # some primary pins do not belong to any net, need to create a net for each
     # of them.
@@ -539,22 +601,20 @@ if __name__ == '__main__':
             # create a new net for the pin
             pin = pin_dict[each_pin]
             new_name = pin.name
-            # print(new_name)
             new_net = Net(new_name)
             new_net.comp_pin = [['PIN', new_name]]
             new_route = Routed()
             new_route.layer = pin.layer.name
+            new_route.rank = lef_data.layer_ranks[new_route.layer]
             new_route.points.append(pin.placed)
             new_net.routed.append(new_route)
-            new_net.find_top_layer()
-            def_parser.nets.nets.append(new_net)
-            def_parser.nets.net_dict[new_name] = new_net
-            # print(new_net)
+            new_net.find_top_layer(lef_data.layer_ranks)
+            def_data.nets.nets.append(new_net)
+            def_data.nets.net_dict[new_name] = new_net
             # update net_ends_dict
             end_points = [tuple(pin.placed)]
             ends_dict = {tuple(pin.placed): end_points}
             net_ends_dict[new_name] = (end_points, ends_dict)
-            # print(net_ends_dict[new_name])
             # update pin_net_dict
             pin_net_dict[pin_name] = new_net
             # add the pin to primary inputs or outputs
@@ -564,76 +624,1354 @@ if __name__ == '__main__':
             elif pin.direction == 'OUTPUT':
                 sink_pins.append(pin_name)
                 primary_outputs.add(pin_name)
+    return source_pins, sink_pins, primary_inputs, primary_outputs, pin_net_dict
+
+
+def candidate_edges(distances):
+    """
+    Get the list of possible connections from the distance table.
+    :param distances: 2D table of distance values (-1 = no connection).
+    :return: a list of (source index, sink index, weight)
+    """
+    edges = []
+    for i in range(len(distances)):
+        row = distances[i]
+        for j in range(len(row)):
+            if row[j] != -1:
+                edges.append((i, j, row[j]))
+    return edges
 
-    # find the connected dict (chain of cells):
-    connected_dict = connected_comps(def_parser, lef_parser, pin_net_dict)
-    # print(connected_dict)
-    # Get the distance table between source and sink pins
-    # NOTE: maybe a nested dictionary is better than a 2D list to represent
-    # the distance table.
-    distances = build_distances(source_pins, sink_pins, primary_inputs, primary_outputs,
-                    pin_net_dict, connected_dict, net_ends_dict, def_parser)
 
-    # start creating a graph
+def pin_loads(source_pins, sink_pins, pin_net_dict, def_data, lib_data):
+    """
+    Find the input capacitance of each sink pin, and the load capacitance
+    that each source pin can still drive: the max_capacitance of its cell pin
+    (LIB data) minus the capacitance of the sink pins that it already drives
+    in the FEOL layout.
+    Primary pins and pins that are not in the LIB data have no capacitance
+    and no limit.
+    :param source_pins: the source pins.
+    :param sink_pins: the sink pins.
+    :param pin_net_dict: dictionary, pin -> net.
+    :param def_data: DEF data
+    :param lib_data: LIB data (lib_util.Library)
+    :return: the capacitance of each sink pin, and the capacitance left for
+    each source pin (None = no limit).
+    """
+    def lib_pin(pin):
+        if pin[0] == 'PIN':
+            return None
+        macro_name = def_data.components.comp_dict[pin[0]].macro
+        cell = lib_data.cell_dict.get(macro_name)
+        if cell is None:
+            return None
+        return cell.pin_dict.get(pin[1])
+
+    sink_loads = []
+    for each_pin in sink_pins:
+        pin = lib_pin(each_pin)
+        load = 0.0
+        if pin is not None:
+            for each_cap in (pin.capacitance, pin.rise_capacitance,
+                             pin.fall_capacitance):
+                if each_cap is not None:
+                    load = max(load, each_cap)
+        sink_loads.append(load)
+    source_room = []
+    source_index = {}
+    for i in range(len(source_pins)):
+        pin = lib_pin(source_pins[i])
+        if pin is None or pin.max_capacitance is None:
+            source_room.append(None)
+        else:
+            source_room.append(pin.max_capacitance)
+        source_index[source_pins[i]] = i
+    done_sinks = get_done_sinks(sink_pins, source_pins, pin_net_dict)
+    for j in range(len(sink_pins)):
+        if sink_pins[j] not in done_sinks:
+            continue
+        for each_pin in pin_net_dict[sink_pins[j]].comp_pin:
+            i = source_index.get(tuple(each_pin))
+            if i is not None and source_room[i] is not None:
+                source_room[i] -= sink_loads[j]
+    return sink_loads, source_room
+
+
+def prune_overloads(edges, sink_loads, source_room):
+    """
+    Remove the candidate edges whose sink pin alone would overload the
+    source pin. The edges of weight 0 (the connections that are already in
+    the FEOL layout) are kept.
+    :param edges: a list of (source index, sink index, weight)
+    :param sink_loads: capacitance of each sink pin, see pin_loads().
+    :param source_room: capacitance left for each source pin, see pin_loads().
+    :return: the list of the edges that are kept.
+    """
+    kept = []
+    for i, j, weight in edges:
+        if weight == 0 or source_room[i] is None or \
+                sink_loads[j] <= source_room[i]:
+            kept.append((i, j, weight))
+    return kept
+
+
+def load_capacities(num_sources, edges, sink_loads, source_room):
+    """
+    Get the capacity (fanout) of each source pin from its load limit: the
+    number of its edges of weight 0 (the FEOL connections), plus the largest
+    number of its other candidate sink pins that fit in the capacitance left,
+    taking the sink pins with the smallest capacitance first. The capacity is
+    an upper bound of the fanout, the flow itself only counts sink pins.
+    :param num_sources: number of source pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param sink_loads: capacitance of each sink pin, see pin_loads().
+    :param source_room: capacitance left for each source pin, see pin_loads().
+    :return: the capacity of each source pin.
+    """
+    fixed = [0] * num_sources
+    loads = [[] for i in range(num_sources)]
+    for i, j, weight in edges:
+        if weight == 0:
+            fixed[i] += 1
+        else:
+            loads[i].append(sink_loads[j])
+    caps = []
+    for i in range(num_sources):
+        if source_room[i] is None:
+            caps.append(SOURCE_CAP)
+            continue
+        room = source_room[i]
+        count = 0
+        for each_load in sorted(loads[i]):
+            if each_load > room:
+                break
+            room -= each_load
+            count += 1
+        caps.append(min(SOURCE_CAP, fixed[i] + count))
+    return caps
+
+
+def tile_windows(points, die_area, tile_size, overlap):
+    """
+    Split the die area into square tiles, and find the tiles of each point.
+    The window of a tile is the tile grown by the overlap on each side.
+    :param points: a list of (x, y)
+    :param die_area: the die area, [[x1, y1], [x2, y2]]
+    :param tile_size: width and height of the tiles.
+    :param overlap: overlap of the windows.
+    :return: the owner tile of each point (the tile that contains it), the
+    list of the windows that contain each point, and the number of tiles.
+    Tile (column c, row r) has the index c * rows + r.
+    """
+    x0 = die_area[0][0]
+    y0 = die_area[0][1]
+    columns = max(1, int(math.ceil((die_area[1][0] - x0) / float(tile_size))))
+    rows = max(1, int(math.ceil((die_area[1][1] - y0) / float(tile_size))))
+
+    def tile_range(coord, start, count):
+        first = int(math.floor((coord - overlap - start) / float(tile_size)))
+        last = int(math.floor((coord + overlap - start) / float(tile_size)))
+        return range(max(0, first), min(count - 1, last) + 1)
+
+    owners = []
+    windows = []
+    for x, y in points:
+        c = min(columns - 1, max(0, int((x - x0) // tile_size)))
+        r = min(rows - 1, max(0, int((y - y0) // tile_size)))
+        owners.append(c * rows + r)
+        windows.append([each_c * rows + each_r
+                        for each_c in tile_range(x, x0, columns)
+                        for each_r in tile_range(y, y0, rows)])
+    return owners, windows, columns * rows
+
+
+def tile_tasks(window_sources, window_sinks, source_pins, sink_pins,
+               primary_inputs, primary_outputs, pin_net_dict, connected_dict,
+               net_ends_dict, die_area, done_sinks, sink_loads=None,
+               source_room=None):
+    """
+    Build the tasks of the windows for tile_flow(), one at a time, so only
+    the data of the windows being solved is in memory. A task only has the
+    pins, nets and end points of its window.
+    :param window_sources: the source indices of each window.
+    :param window_sinks: the sink indices of each window.
+    :param sink_loads: capacitance of each sink pin (optional, see
+    pin_loads).
+    :param source_room: capacitance left for each source pin (optional).
+    :return: yields the task dictionaries.
+    """
+    for w in range(len(window_sinks)):
+        if not window_sources[w] or not window_sinks[w]:
+            continue
+        sink_cells = set(sink_pins[j][0] for j in window_sinks[w])
+        net_ends = {}
+        sources = []
+        for i in window_sources[w]:
+            source_pin = source_pins[i]
+            source_net = pin_net_dict[source_pin]
+            net_ends[source_net.name] = net_ends_dict[source_net.name]
+            # the cells that would make a loop, see build_distances
+            connected_cells = set(each_pin[0] for each_pin in source_net.comp_pin)
+            chained_cells, parent_dict = find_cell_connected(source_pin[0],
+                                                             connected_dict)
+            excluded = (connected_cells ^ chained_cells) & sink_cells
+            sources.append((i, source_pin, source_net.name,
+                            source_pin in primary_inputs, excluded))
+        sinks = []
+        for j in window_sinks[w]:
+            sink_pin = sink_pins[j]
+            sink_net = pin_net_dict[sink_pin]
+            net_ends[sink_net.name] = net_ends_dict[sink_net.name]
+            done_by = None
+            if sink_pin in done_sinks:
+                done_by = set(tuple(each_pin) for each_pin in sink_net.comp_pin)
+            sinks.append((j, sink_pin, sink_net.name,
+                          sink_pin in primary_outputs, done_by))
+        task = {'die_area': die_area, 'sources': sources, 'sinks': sinks,
+                'net_ends': net_ends}
+        if source_room is not None:
+            task['sink_loads'] = [sink_loads[j] for j in window_sinks[w]]
+            task['source_room'] = [source_room[i] for i in window_sources[w]]
+        yield task
+
+
+def tile_flow(task):
+    """
+    Build the candidate edges of one window and solve its flow (run by the
+    worker processes of tiled_flow). The cases are the same as in
+    build_distances.
+    :param task: the data of the window, see tile_tasks().
+    :return: a list of the candidate edges (source index, sink index, weight)
+    and the indices of the edges that carry flow.
+    """
+    die_area = task['die_area']
+    net_ends = task['net_ends']
+    directions = {}
+    for each_net in net_ends:
+        end_points, ends_dict = net_ends[each_net]
+        directions[each_net] = direction_areas(end_points, ends_dict, die_area)
+    sources = task['sources']
+    sinks = task['sinks']
+    local_edges = []
+    for a in range(len(sources)):
+        i, source_pin, source_net, is_input, excluded = sources[a]
+        source_ends = net_ends[source_net][0]
+        for b in range(len(sinks)):
+            j, sink_pin, sink_net, is_output, done_by = sinks[b]
+            if done_by is not None:
+                # case 1: the sink pin is already connected
+                if source_pin in done_by:
+                    local_edges.append((a, b, 0))
+            elif is_input and is_output:
+                # case 2: primary input cannot connect to primary output
+                continue
+            elif sink_pin[0] in excluded:
+                # case 3: loop
+                continue
+            elif not ends_facing(source_ends, directions[source_net],
+                                 net_ends[sink_net][0], directions[sink_net]):
+                # case 4: dangling wire
+                continue
+            else:
+                local_edges.append((a, b, ends_distance(
+                    source_ends, net_ends[sink_net][0])))
+    caps = SOURCE_CAP
+    if 'source_room' in task:
+        local_edges = prune_overloads(local_edges, task['sink_loads'],
+                                      task['source_room'])
+        caps = load_capacities(len(sources), local_edges, task['sink_loads'],
+                               task['source_room'])
+    network, edge_ids = optimal_network(len(sources), len(sinks), local_edges,
+                                        caps)
+    edges = [(sources[a][0], sinks[b][0], weight)
+             for a, b, weight in local_edges]
+    return edges, used_edges(network, edge_ids)
+
+
+def tiled_flow(source_pins, sink_pins, primary_inputs, primary_outputs,
+               pin_net_dict, connected_dict, net_ends_dict, def_data, stats,
+               tile_size, overlap, workers=1, sink_loads=None,
+               source_room=None):
+    """
+    Region-tiled attack: the die area is split into tiles, and the candidate
+    edges and the flow of each window (a tile and its overlap) are found by
+    worker processes. A sink pin that is in one window only keeps the
+    connection of its window. The sink pins in the overlaps (and the sink
+    pins of source pins used too much by the windows) are connected by a
+    small stitching flow over all their candidate edges, with the capacity
+    left on the source pins.
+    Candidate edges longer than the overlap may be missed at the tile
+    borders, so the result can differ from the attack without tiles.
+    :param tile_size: width and height of the tiles (DEF distance units).
+    :param overlap: overlap of the windows (DEF distance units).
+    :param workers: number of worker processes.
+    :param sink_loads: capacitance of each sink pin (optional, see
+    pin_loads).
+    :param source_room: capacitance left for each source pin (optional). If
+    it is given, the overloading edges are pruned and the capacity of the
+    source pins comes from load_capacities().
+    :return: a list of candidate edges (source index, sink index, weight),
+    the indices of the edges that carry flow, and the cost of the flow.
+    """
+    die_area = def_data.diearea
+    source_points = [pin_position(each_pin, pin_net_dict, net_ends_dict)
+                     for each_pin in source_pins]
+    sink_points = [pin_position(each_pin, pin_net_dict, net_ends_dict)
+                   for each_pin in sink_pins]
+    source_owners, source_windows, num_tiles = tile_windows(
+        source_points, die_area, tile_size, overlap)
+    sink_owners, sink_windows, num_tiles = tile_windows(
+        sink_points, die_area, tile_size, overlap)
+    window_sources = [[] for w in range(num_tiles)]
+    window_sinks = [[] for w in range(num_tiles)]
+    for i in range(len(source_pins)):
+        for w in source_windows[i]:
+            window_sources[w].append(i)
+    for j in range(len(sink_pins)):
+        for w in sink_windows[j]:
+            window_sinks[w].append(j)
+    print('Tiled attack: ' + str(num_tiles) + ' tiles')
+    done_sinks = get_done_sinks(sink_pins, source_pins, pin_net_dict)
+    tasks = tile_tasks(window_sources, window_sinks, source_pins, sink_pins,
+                       primary_inputs, primary_outputs, pin_net_dict,
+                       connected_dict, net_ends_dict, die_area, done_sinks,
+                       sink_loads, source_room)
+    if workers > 1:
+        pool = Pool(workers)
+        results = pool.imap(tile_flow, tasks)
+    else:
+        pool = None
+        results = map(tile_flow, tasks)
+    weights = {}
+    # the connection of each sink pin that is only in its own window
+    fixed = {}
+    for window_edges, used in results:
+        for i, j, weight in window_edges:
+            weights[(i, j)] = weight
+        for k in used:
+            i, j, weight = window_edges[k]
+            if len(sink_windows[j]) == 1:
+                fixed[j] = i
+    if pool:
+        pool.close()
+        pool.join()
+    edges = sorted((i, j, weights[(i, j)]) for i, j in weights)
+    if source_room is None:
+        source_caps = [SOURCE_CAP] * len(source_pins)
+    else:
+        source_caps = load_capacities(len(source_pins), edges, sink_loads,
+                                      source_room)
+
+    # capacity left on the source pins, a source pin that is used too much
+    # gives its sink pins back to the stitching flow.
+    load = [0] * len(source_pins)
+    for j in fixed:
+        load[fixed[j]] += 1
+    for j in list(fixed):
+        if load[fixed[j]] > source_caps[fixed[j]]:
+            del fixed[j]
+    load = [0] * len(source_pins)
+    for j in fixed:
+        load[fixed[j]] += 1
+    stitch_sinks = {}
+    for j in range(len(sink_pins)):
+        if j not in fixed:
+            stitch_sinks[j] = len(stitch_sinks)
+    stitch_index = []
+    stitch_edges = []
+    for k in range(len(edges)):
+        i, j, weight = edges[k]
+        if j in stitch_sinks:
+            stitch_index.append(k)
+            stitch_edges.append((i, stitch_sinks[j], weight))
+    caps = [source_caps[i] - load[i] for i in range(len(source_pins))]
+    network, edge_ids = optimal_network(len(source_pins), len(stitch_sinks),
+                                        stitch_edges, caps)
+    used = [k for k in range(len(edges))
+            if edges[k][1] in fixed and edges[k][0] == fixed[edges[k][1]]]
+    used += [stitch_index[k] for k in used_edges(network, edge_ids)]
+    used.sort()
+    cost = sum(edges[k][2] for k in used)
+    print('Stitching flow: ' + str(len(stitch_sinks)) + ' sink pins, cost = ' +
+          str(network.total_cost()))
+    stats['num_tiles'] = num_tiles
+    stats['stitched_sinks'] = len(stitch_sinks)
+    return edges, used, cost
+
+
+def build_flow_graph(source_pins, sink_pins, edges, source_caps=None):
+    """
+    Build the flow network from the candidate edges.
+    :param source_pins: the source pins.
+    :param sink_pins: the sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param source_caps: capacity of each source pin (default: SOURCE_CAP).
+    :return: a networkx DiGraph with 'source' and 'sink' super nodes.
+    """
     G = nx.DiGraph()
     # NOTE: the capacity we use right now may not be optimal
     # add the edges between source pins and sink pins
-    for i in range(len(source_pins)):
-        for j in range(len(sink_pins)):
-            current_weight = distances[i][j]
-            if current_weight != -1:
-                G.add_edge(source_pins[i], sink_pins[j], weight=distances[i][j],
-                           capacity=1)
+    for i, j, weight in edges:
+        G.add_edge(source_pins[i], sink_pins[j], weight=weight, capacity=1)
     # add edges from the super source pin to other source pins.
+    # (SOURCE_CAP and SINK_CAP are in flow_util)
     source_name = 'source'
-    # NOTE: need to find the actual load capacitance later
-    SOURCE_CAP = 100000
     for i in range(len(source_pins)):
-        G.add_edge(source_name, source_pins[i], weight=0, capacity=SOURCE_CAP)
+        if source_caps is None:
+            capacity = SOURCE_CAP
+        else:
+            capacity = source_caps[i]
+        G.add_edge(source_name, source_pins[i], weight=0, capacity=capacity)
     # add edges from the sink pins to super sink
     sink_name = 'sink'
-    SINK_CAP = 1 # we want the input pin can receive only 1 connection
     # we can get load capacitance information later, but only for checking for
     # possible load, the capacity should be still 1.
     for i in range(len(sink_pins)):
         G.add_edge(sink_pins[i], sink_name, weight=0, capacity=SINK_CAP)
+    return G
 
-    mincostFlow = nx.max_flow_min_cost(G, source_name, sink_name)
-    mincost = nx.cost_of_flow(G, mincostFlow)
-    # print(mincostFlow)
-    # print(mincost)
-    # print()
 
-    # get the final connections
+def get_connections(flow, source_pins):
+    """
+    Get the final connections from the flow.
+    :param flow: flow dictionary, flow[u][v] is the flow on edge (u, v).
+    :param source_pins: the source pins.
+    :return: a dictionary, each source pin maps to a list of sink pins.
+    """
     connections = {}
     for each in source_pins:
         connections[each] = []
-        for each_sink in mincostFlow[each]:
-            if mincostFlow[each][each_sink] > 0:
+        for each_sink in flow[each]:
+            if flow[each][each_sink] > 0:
                 connections[each].append(each_sink)
-    # print()
-    # for each in connections:
-    #     print(each)
-    #     print(connections[each])
-    #     print()
+    return connections
 
-    # build new_connected_dict
+
+def connections_from_edges(source_pins, sink_pins, edges, used):
+    """
+    Get the final connections from the candidate edges that carry flow.
+    :param source_pins: the source pins.
+    :param sink_pins: the sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param used: indices (in edges) of the edges that carry flow.
+    :return: a dictionary, each source pin maps to a list of sink pins.
+    """
+    connections = {}
+    for each in source_pins:
+        connections[each] = []
+    for k in sorted(used):
+        i, j, weight = edges[k]
+        connections[source_pins[i]].append(sink_pins[j])
+    return connections
+
+
+def solve_flow(source_pins, sink_pins, edges, stats, solver_options=None,
+               sink_points=None, source_caps=None):
+    """
+    Find the min cost max flow between the source pins and the sink pins.
+    :param source_pins: the source pins.
+    :param sink_pins: the sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param stats: dictionary of statistics, updated by this function.
+    :param solver_options: dictionary of solver options (optional):
+        'solver': 'networkx' (default) or 'auction'.
+        'deadline': time.time() value. If it is given, the networkx solver is
+        replaced by the anytime solver, which stops improving the flow at the
+        deadline.
+        'auction_eps': final epsilon of the auction solver (None = exact).
+        'loop_free': if True, ban connections that create combinational loops
+        (see loop_free_flow, the solver option is not used).
+        'k_best': number of solutions to enumerate (see k_best_connections,
+        the solver option is not used), default 1.
+        'on_alternative': function(rank, connections, cost), called for each
+        solution after the best one as soon as it is found (with 'k_best').
+        'multilevel': number of sink pins per tile of the multilevel solver
+        (see multilevel_util.multilevel_flow, the solver option is not
+        used). 'workers' is the number of worker processes.
+        'candidate_budget': start with this number of candidate edges per
+        sink pin, and add the other edges only when they can change the
+        result (see flow_util.adaptive_flow, the solver option is not used).
+        'tile_size', 'tile_overlap': used by network_attack() for the tiled
+        attack (see tiled_flow), which also solves the flow.
+        'dump_graph': used by network_attack(), save the candidate graph to
+        this file before solving (see attack_util.save_graph).
+        'auto', 'max_time', 'max_memory': used by network_attack(), select
+        the candidate mode and the solver options (see auto_solver_options).
+    :param sink_points: the location of each sink pin (needed by
+    'multilevel', see pin_position).
+    :param source_caps: capacity of each source pin (default: SOURCE_CAP for
+    every source pin, see load_capacities).
+    :return: connections dictionary and the cost of the flow.
+    """
+    if solver_options is None:
+        solver_options = {}
+    if source_caps is None:
+        source_cap = SOURCE_CAP
+    else:
+        source_cap = list(source_caps)
+    solver = solver_options.get('solver', 'networkx')
+    deadline = solver_options.get('deadline')
+    if solver_options.get('loop_free'):
+        return loop_free_flow(source_pins, sink_pins, edges, stats, deadline,
+                              source_caps)
+    if solver_options.get('k_best', 1) > 1:
+        return k_best_connections(source_pins, sink_pins, edges, stats,
+                                  solver_options['k_best'],
+                                  solver_options.get('on_alternative'),
+                                  source_caps)
+    if solver_options.get('multilevel'):
+        used, mincost, num_tiles, local_cost = multilevel_flow(
+            len(source_pins), len(sink_pins), edges, sink_points,
+            solver_options['multilevel'], solver_options.get('workers', 1),
+            source_cap)
+        stats['num_tiles'] = num_tiles
+        stats['tile_cost'] = local_cost
+        return connections_from_edges(source_pins, sink_pins, edges, used), mincost
+    if solver_options.get('candidate_budget'):
+        used, mincost, num_active, rounds = adaptive_flow(
+            len(source_pins), len(sink_pins), edges,
+            solver_options['candidate_budget'], source_cap)
+        print('Candidate budget: optimal cost = ' + str(mincost) + ' with ' +
+              str(num_active) + ' of ' + str(len(edges)) + ' edges')
+        stats['active_edges'] = num_active
+        stats['budget_rounds'] = rounds
+        return connections_from_edges(source_pins, sink_pins, edges, used), mincost
+    if solver == 'auction':
+        used, mincost, gap, eps = auction_assignment(
+            len(source_pins), len(sink_pins), edges, source_caps,
+            final_eps=solver_options.get('auction_eps'))
+        print('Auction solver: cost = ' + str(mincost) + ', final epsilon = ' +
+              str(eps) + ', gap <= ' + str(gap))
+        stats['epsilon_gap'] = gap
+        stats['optimal'] = gap < 1
+        return connections_from_edges(source_pins, sink_pins, edges, used), mincost
+    if deadline is None:
+        G = build_flow_graph(source_pins, sink_pins, edges, source_caps)
+        mincostFlow = nx.max_flow_min_cost(G, 'source', 'sink')
+        mincost = nx.cost_of_flow(G, mincostFlow)
+        return get_connections(mincostFlow, source_pins), mincost
+    used, mincost, lower_bound, optimal = anytime_flow(
+        len(source_pins), len(sink_pins), edges, deadline, source_cap)
+    if optimal:
+        print('Anytime solver: optimal cost = ' + str(mincost))
+    else:
+        print('Anytime solver stopped at the deadline: cost = ' + str(mincost) +
+              ', lower bound = ' + str(lower_bound))
+    stats['lower_bound'] = lower_bound
+    stats['optimal'] = optimal
+    connections = connections_from_edges(source_pins, sink_pins, edges, used)
+    return connections, mincost
+
+
+def auto_solver_options(def_data, source_pins, sink_pins, net_ends_dict, stats,
+                        solver_options):
+    """
+    Select the candidate mode (dense or tiled) and the flow solver from the
+    predicted time and memory of each mode (see solver_model), within the
+    limits 'max_time' (seconds) and 'max_memory' (bytes) of solver_options.
+    :param def_data: DEF data
+    :param source_pins: the source pins.
+    :param sink_pins: the sink pins.
+    :param net_ends_dict: dictionary that store the end points of each net.
+    :param stats: dictionary of statistics, updated by this function.
+    :param solver_options: dictionary of solver options, see solve_flow().
+    :return: a copy of solver_options with the options of the selected mode.
+    """
+    design = design_stats(def_data, source_pins, sink_pins, net_ends_dict)
+    print('Design: ' + str(design['num_nets']) + ' nets, ' +
+          str(design['num_sources']) + ' source pins, ' +
+          str(design['num_sinks']) + ' sink pins, ' +
+          str(design['num_end_points']) + ' net end points (%.3g per square '
+          'unit)' % design['end_point_density'])
+    modes = predict_modes(design, solver_options.get('workers', 1))
+    max_time = solver_options.get('max_time')
+    max_memory = solver_options.get('max_memory')
+    mode, fits = select_mode(modes, max_time, max_memory)
+    print('%-16s %14s %14s' % ('mode', 'time (s)', 'memory (MB)'))
+    for each_mode in modes:
+        print('%-16s %14.2f %14.1f' % (each_mode['name'], each_mode['time'],
+                                       each_mode['memory'] / 1048576.0))
+    prediction = ' (predicted: %.2f s, %.1f MB)' % (mode['time'],
+                                                   mode['memory'] / 1048576.0)
+    if fits:
+        print('Auto solver: ' + mode['name'] + prediction)
+    else:
+        print('WARNING: no mode fits the limits, auto solver: ' +
+              mode['name'] + prediction)
+    stats['auto_mode'] = mode['name']
+    stats['predicted_time'] = mode['time']
+    stats['predicted_memory'] = mode['memory']
+    options = dict(solver_options)
+    options.update(mode['options'])
+    return options
+
+
+def k_best_connections(source_pins, sink_pins, edges, stats, k,
+                       on_alternative=None, source_caps=None):
+    """
+    Enumerate the k lowest cost distinct solutions of the flow (see
+    flow_util.k_best_flows). All solutions are solved from the residual graph
+    of the optimal flow, by banning and fixing edges.
+    :param source_pins: the source pins.
+    :param sink_pins: the sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param stats: dictionary of statistics, updated by this function.
+    :param k: number of solutions.
+    :param on_alternative: function(rank, connections, cost), called for each
+    solution after the best one as soon as it is found (optional).
+    :param source_caps: capacity of each source pin (optional).
+    :return: connections dictionary and the cost of the best solution.
+    """
+    best = None
+    costs = []
+    if source_caps is None:
+        source_cap = SOURCE_CAP
+    else:
+        source_cap = list(source_caps)
+    for rank, used, cost, value in k_best_flows(len(source_pins), len(sink_pins),
+                                                edges, k, source_cap):
+        print('Solution ' + str(rank) + ': cost = ' + str(cost) +
+              ', connections = ' + str(value))
+        connections = connections_from_edges(source_pins, sink_pins, edges, used)
+        costs.append(cost)
+        if best is None:
+            best = (connections, cost)
+        elif on_alternative:
+            on_alternative(rank, connections, cost)
+    stats['solution_costs'] = costs
+    return best
+
+
+def connection_confidence(source_pins, sink_pins, edges, connections,
+                          source_caps=None):
+    """
+    Get a confidence score for each connection: how much the min cost of the
+    flow increases if the connection is forbidden (see flow_util.ban_costs).
+    The scores come from the potentials of the min cost flow, without solving
+    the flow again for each connection. A connection that is not in the min
+    cost flow (e.g. with --loop_free) has the score 0.
+    :param source_pins: the source pins.
+    :param sink_pins: the sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param connections: connections dictionary
+    :param source_caps: capacity of each source pin (optional).
+    :return: a list of (source pin, sink pin, weight, cost increase), the cost
+    increase is None if the connection can not be replaced by another one.
+    """
+    edge_index = {}
+    for k in range(len(edges)):
+        i, j, weight = edges[k]
+        edge_index[(source_pins[i], sink_pins[j])] = k
+    used = []
+    for each_source in connections:
+        for each_sink in connections[each_source]:
+            used.append(edge_index[(each_source, each_sink)])
+    if source_caps is None:
+        source_cap = SOURCE_CAP
+    else:
+        source_cap = list(source_caps)
+    network, edge_ids = flow_network(len(source_pins), len(sink_pins), edges,
+                                     used, source_cap)
+    costs = ban_costs(network, edge_ids, used_edges(network, edge_ids))
+    rows = []
+    for k in sorted(used):
+        i, j, weight = edges[k]
+        rows.append((source_pins[i], sink_pins[j], weight, costs.get(k, 0)))
+    return rows
+
+
+def write_confidence(rows, csv_file):
+    """
+    Write the confidence scores of the connections to a CSV file.
+    :param rows: output of connection_confidence()
+    :param csv_file: path of the CSV file.
+    :return: void
+    """
+    f = open(csv_file, 'w', newline='')
+    writer = csv.writer(f)
+    writer.writerow(['source_cell', 'source_pin', 'sink_cell', 'sink_pin',
+                     'distance', 'cost_increase'])
+    for source_pin, sink_pin, weight, increase in rows:
+        # an empty cost_increase means the connection can not be replaced
+        writer.writerow([source_pin[0], source_pin[1], sink_pin[0],
+                         sink_pin[1], weight, '' if increase is None else increase])
+    f.close()
+
+
+def build_new_connected_dict(connections):
+    """
+    Build the connected dict (chain of cells) of the inferred netlist.
+    :param connections: connections dictionary
+    :return: a dictionary, each cell maps to the set of source pins that
+    connect to its input pins.
+    """
     new_connected_dict = {}
     for each_in in connections:
-        if each_in[0] != 'PIN':
+        # the cell may already be in the dict as the load of another cell
+        if each_in[0] != 'PIN' and each_in[0] not in new_connected_dict:
             new_connected_dict[each_in[0]] = set()
         for each_out in connections[each_in]:
             if each_out[0] != 'PIN':
                 if each_out[0] not in new_connected_dict:
                     new_connected_dict[each_out[0]] = set()
                 new_connected_dict[each_out[0]].add(each_in)
+    return new_connected_dict
+
+
+def cell_graph(source_pins, sink_pins, edges, used):
+    """
+    Build the graph of cells of the inferred netlist.
+    :param source_pins: the source pins.
+    :param sink_pins: the sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param used: indices (in edges) of the edges that carry flow.
+    :return: a dictionary, each cell maps to a list of (load cell, edge index).
+    """
+    out_edges = {}
+    for k in used:
+        i, j, weight = edges[k]
+        driver = source_pins[i][0]
+        load = sink_pins[j][0]
+        if driver != 'PIN' and load != 'PIN':
+            if driver not in out_edges:
+                out_edges[driver] = []
+            out_edges[driver].append((load, k))
+    return out_edges
+
+
+def strong_components(out_edges):
+    """
+    Find the strongly connected components of a cell graph (Tarjan's
+    algorithm without recursion).
+    :param out_edges: a dictionary, each cell maps to a list of
+    (load cell, edge index).
+    :return: a list of components (lists of cells).
+    """
+    index = {}
+    low = {}
+    on_stack = set()
+    stack = []
+    components = []
+    for root in out_edges:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, 0)]
+        while work:
+            cell, pos = work[-1]
+            succ = out_edges.get(cell, [])
+            if pos < len(succ):
+                work[-1] = (cell, pos + 1)
+                next_cell = succ[pos][0]
+                if next_cell not in index:
+                    index[next_cell] = low[next_cell] = len(index)
+                    stack.append(next_cell)
+                    on_stack.add(next_cell)
+                    work.append((next_cell, 0))
+                elif next_cell in on_stack:
+                    low[cell] = min(low[cell], index[next_cell])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[cell])
+                if low[cell] == index[cell]:
+                    component = []
+                    while True:
+                        each = stack.pop()
+                        on_stack.discard(each)
+                        component.append(each)
+                        if each == cell:
+                            break
+                    components.append(component)
+    return components
 
-    # print(new_connected_dict)
+
+def find_cycle(cells, out_edges):
+    """
+    Find a cycle among a group of cells. The cells are searched in sorted
+    order, so the same netlist always gives the same cycle.
+    :param cells: a list of cells (e.g. a strongly connected component).
+    :param out_edges: a dictionary, each cell maps to a list of
+    (load cell, edge index).
+    :return: a list of edge indices of the cycle (empty if there is none).
+    """
+    # depth first search, a cell that is on the current path closes a cycle
+    members = set(cells)
+    done = set()
+    for start in sorted(cells):
+        if start in done:
+            continue
+        path = []
+        on_path = {}
+        stack = [(start, None)]
+        while stack:
+            cell, k = stack.pop()
+            if cell is None:
+                # all edges of the last cell on the path are checked
+                last = path.pop()
+                del on_path[last[0]]
+                done.add(last[0])
+                continue
+            if cell in on_path:
+                cycle = [each[1] for each in path[on_path[cell] + 1:]]
+                return cycle + [k]
+            if cell in done:
+                continue
+            on_path[cell] = len(path)
+            path.append((cell, k))
+            stack.append((None, None))
+            for each in out_edges.get(cell, []):
+                if each[0] in members:
+                    stack.append(each)
+    return []
+
+
+def netlist_cycles(source_pins, sink_pins, edges, used):
+    """
+    Find combinational loops of the inferred netlist: one cycle in each
+    strongly connected component of the cell graph. This is linear in the
+    size of the netlist (check_loop searches from every source pin).
+    :param source_pins: the source pins.
+    :param sink_pins: the sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param used: indices (in edges) of the edges that carry flow.
+    :return: a list of cycles, each cycle is a list of edge indices.
+    """
+    out_edges = cell_graph(source_pins, sink_pins, edges, used)
+    cycles = []
+    for component in strong_components(out_edges):
+        cycle = find_cycle(component, out_edges)
+        if len(cycle) > 0:
+            cycles.append(cycle)
+    return cycles
+
+
+def ban_cost(k, edges, sink_edges, banned):
+    """
+    Estimate how much the cost increases if a candidate edge is banned: the
+    sink pin has to use its next shortest candidate edge.
+    :param k: index of the edge (in edges).
+    :param edges: a list of (source index, sink index, weight)
+    :param sink_edges: the edge indices of the candidate edges of each sink.
+    :param banned: set of the banned edge indices.
+    :return: the cost increase (inf if the sink has no other edge).
+    """
+    i, j, weight = edges[k]
+    best = float('inf')
+    for other in sink_edges[j]:
+        if other != k and other not in banned:
+            best = min(best, edges[other][2] - weight)
+    return best
+
+
+def loop_free_flow(source_pins, sink_pins, edges, stats, deadline=None,
+                   source_caps=None):
+    """
+    Find a min cost max flow whose netlist has no combinational loop. After
+    each solve, the connection that is cheapest to ban on each loop is
+    removed from the network, and the flow is solved again starting from the
+    previous residual graph and potentials.
+    :param source_pins: the source pins.
+    :param sink_pins: the sink pins.
+    :param edges: a list of (source index, sink index, weight)
+    :param stats: dictionary of statistics, updated by this function.
+    :param deadline: time.time() value to stop (optional).
+    :param source_caps: capacity of each source pin (optional).
+    :return: connections dictionary and the cost of the flow.
+    """
+    if source_caps is None:
+        source_cap = SOURCE_CAP
+    else:
+        source_cap = list(source_caps)
+    network, edge_ids = assignment_network(len(source_pins), len(sink_pins),
+                                           edges, source_cap)
+    greedy_assignment(network, edges, edge_ids)
+    network.max_flow(network.s, network.t)
+    optimal = network.cancel_negative_cycles(deadline)
+    sink_edges = [[] for j in range(len(sink_pins))]
+    for k in range(len(edges)):
+        sink_edges[edges[k][1]].append(k)
+    banned = set()
+    rounds = 0
+    while True:
+        used = [k for k in range(len(edges)) if network.flow(edge_ids[k]) > 0]
+        if not optimal:
+            print('Loop-free solver stopped at the deadline.')
+            break
+        # ban connections until the current netlist has no loop, then solve
+        # the flow again
+        cuts = []
+        num_loops = 0
+        while True:
+            cycles = netlist_cycles(source_pins, sink_pins, edges, used)
+            if len(cycles) == 0:
+                break
+            num_loops += len(cycles)
+            for cycle in cycles:
+                # ties go to the lowest edge index
+                k = min(cycle, key=lambda k: (ban_cost(k, edges, sink_edges,
+                                                       banned), k))
+                banned.add(k)
+                cuts.append(edge_ids[k])
+            used = [k for k in used if k not in banned]
+        if len(cuts) == 0:
+            break
+        rounds += 1
+        print('Loop cut round ' + str(rounds) + ': ' + str(num_loops) +
+              ' loops, ' + str(len(cuts)) + ' connections banned')
+        optimal = network.reoptimize(network.s, network.t, cuts, deadline)
+    connections = connections_from_edges(source_pins, sink_pins, edges, used)
+    stats['loop_cut_rounds'] = rounds
+    stats['loop_cuts'] = len(banned)
+    stats['optimal'] = optimal
+    return connections, network.total_cost()
+
+
+def network_attack(def_data, lef_data, checkpoint=None, solver_options=None,
+                   lib_data=None):
+    """
+    Run the network flow attack on a FEOL layout.
+    :param def_data: DEF data of the FEOL layout (a split DEF file, or a
+    layout split in memory by split_def.Splitter)
+    :param lef_data: LEF data
+    :param checkpoint: a Checkpoint object (optional). The output of each
+    stage is saved to it, and the stages it already has are not run again.
+    :param solver_options: dictionary of options of the flow solver
+    (optional), see solve_flow(). If it has 'on_confidence', a
+    function(rows), it is called with the confidence scores of the
+    connections (see connection_confidence).
+    :param lib_data: LIB data (optional). If it is given, the fanout of each
+    source pin is limited by the load capacitance it can drive, see
+    pin_loads() and load_capacities().
+    :return: connections dictionary, the cost of the flow and a dictionary of
+    statistics (sizes and run time of each stage).
+    """
+    if solver_options is None:
+        solver_options = {}
+    if def_data.layer_ranks is None:
+        # the DEF data was not loaded by load_inputs
+        def_data.rank_layers(lef_data.layer_ranks)
+    stats = {}
+    # index of the last stage we can resume from
+    last_stage = -1
+    if checkpoint:
+        last_stage = checkpoint.last_stage()
+        if last_stage >= 0:
+            stats['resumed_from'] = CHECKPOINT_STAGES[last_stage]
+            print('Resume the attack after stage ' + CHECKPOINT_STAGES[last_stage])
+    start = time.time()
+    # Get the end_points and ends_dict for each net
+    # the tiled attack does not save its candidate edges, it starts again
+    # from the connected dict.
+    tile_size = solver_options.get('tile_size')
+    if last_stage >= CHECKPOINT_STAGES.index('candidates') and \
+            not solver_options.get('multilevel') and not tile_size and \
+            not solver_options.get('dump_graph') and \
+            not solver_options.get('auto'):
+        # the later stages do not need the end points
+        net_ends_dict = {}
+    elif last_stage >= CHECKPOINT_STAGES.index('net_ends'):
+        net_ends_dict = checkpoint.load('net_ends')
+    else:
+        net_ends_dict = get_net_ends(def_data)
+    source_pins, sink_pins, primary_inputs, primary_outputs, pin_net_dict = \
+        get_pins(def_data, lef_data, net_ends_dict)
+    if checkpoint and last_stage < CHECKPOINT_STAGES.index('net_ends'):
+        checkpoint.save('net_ends', net_ends_dict)
+    stats['num_sources'] = len(source_pins)
+    stats['num_sinks'] = len(sink_pins)
+    stats['net_ends_time'] = time.time() - start
+    if solver_options.get('auto'):
+        solver_options = auto_solver_options(def_data, source_pins, sink_pins,
+                                             net_ends_dict, stats,
+                                             solver_options)
+        tile_size = solver_options.get('tile_size')
+
+    on_confidence = solver_options.get('on_confidence')
+    # the alternative solutions, the scores and the graph file need the
+    # candidate edges, so the flow is solved again
+    k_best = solver_options.get('k_best', 1)
+    if last_stage >= CHECKPOINT_STAGES.index('flow') and k_best == 1 and \
+            not on_confidence and not solver_options.get('dump_graph'):
+        connections, mincost = checkpoint.load('flow')
+    else:
+        tiled_used = None
+        sink_loads = None
+        source_room = None
+        if lib_data is not None:
+            sink_loads, source_room = pin_loads(source_pins, sink_pins,
+                                                pin_net_dict, def_data, lib_data)
+        if last_stage >= CHECKPOINT_STAGES.index('candidates') and not tile_size:
+            source_pins, sink_pins, edge_arrays = checkpoint.load('candidates')
+            edges = edges_from_arrays(*edge_arrays)
+        else:
+            # find the connected dict (chain of cells):
+            start = time.time()
+            if last_stage >= CHECKPOINT_STAGES.index('connected'):
+                connected_dict = checkpoint.load('connected')
+            else:
+                connected_dict = connected_comps(def_data, lef_data, pin_net_dict)
+                if checkpoint:
+                    checkpoint.save('connected', connected_dict)
+            stats['connected_time'] = time.time() - start
+            start = time.time()
+            if tile_size:
+                edges, tiled_used, mincost = tiled_flow(
+                    source_pins, sink_pins, primary_inputs, primary_outputs,
+                    pin_net_dict, connected_dict, net_ends_dict, def_data,
+                    stats, tile_size, solver_options.get('tile_overlap', 0),
+                    solver_options.get('workers', 1), sink_loads, source_room)
+                stats['tiles_time'] = time.time() - start
+            else:
+                # Get the distance table between source and sink pins
+                # NOTE: maybe a nested dictionary is better than a 2D list to
+                # represent the distance table.
+                distances = build_distances(source_pins, sink_pins, primary_inputs, primary_outputs,
+                                pin_net_dict, connected_dict, net_ends_dict, def_data)
+                edges = candidate_edges(distances)
+                if checkpoint:
+                    checkpoint.save('candidates', (source_pins, sink_pins,
+                                                   edges_to_arrays(edges)))
+                stats['distances_time'] = time.time() - start
+
+        source_caps = None
+        # the sink pins that have candidate edges without the load limits
+        # (the tiled attack has already pruned its edges)
+        candidate_sinks = None
+        if source_room is not None:
+            candidate_sinks = set(j for i, j, weight in edges)
+            # the candidates checkpoint keeps all the edges, so the limits
+            # are applied again on resume
+            if tiled_used is None:
+                num_edges = len(edges)
+                edges = prune_overloads(edges, sink_loads, source_room)
+                stats['overload_edges'] = num_edges - len(edges)
+            source_caps = load_capacities(len(source_pins), edges, sink_loads,
+                                          source_room)
+            stats['limited_sources'] = sum(1 for each in source_caps
+                                           if each < SOURCE_CAP)
+            print('Load limits: ' + str(stats['limited_sources']) +
+                  ' source pins limited, ' +
+                  str(stats.get('overload_edges', 0)) +
+                  ' overloading edges pruned')
+
+        # solve the flow and get the final connections
+        start = time.time()
+        stats['num_edges'] = len(edges)
+        sink_points = None
+        if solver_options.get('multilevel') or solver_options.get('dump_graph'):
+            sink_points = [pin_position(each_pin, pin_net_dict, net_ends_dict)
+                           for each_pin in sink_pins]
+        if solver_options.get('dump_graph'):
+            print('Writing the candidate graph to ' + solver_options['dump_graph'])
+            graph_caps = source_caps
+            if graph_caps is None:
+                graph_caps = [SOURCE_CAP] * len(source_pins)
+            save_graph(solver_options['dump_graph'], source_pins, sink_pins,
+                       edges, graph_caps,
+                       [SINK_CAP] * len(sink_pins), sink_points)
+        if tiled_used is not None:
+            # the tiles already solved the flow
+            connections = connections_from_edges(source_pins, sink_pins, edges,
+                                                 tiled_used)
+        else:
+            connections, mincost = solve_flow(source_pins, sink_pins, edges,
+                                              stats, solver_options, sink_points,
+                                              source_caps)
+        if source_caps is not None:
+            connected = set()
+            for each_source in connections:
+                connected.update(connections[each_source])
+            stats['unconnected_sinks'] = sum(
+                1 for j in candidate_sinks if sink_pins[j] not in connected)
+            if stats['unconnected_sinks']:
+                print('Warning: ' + str(stats['unconnected_sinks']) +
+                      ' sink pins are not connected within the load limits')
+        stats['flow_time'] = time.time() - start
+        if checkpoint:
+            checkpoint.save('flow', (connections, mincost))
+        if on_confidence:
+            start = time.time()
+            on_confidence(connection_confidence(source_pins, sink_pins, edges,
+                                                connections, source_caps))
+            stats['confidence_time'] = time.time() - start
+
+    # build new_connected_dict
+    new_connected_dict = build_new_connected_dict(connections)
     loops = check_loop(source_pins, sink_pins, new_connected_dict)
-    # print(loops)
-    # log.close()
+    stats['num_loops'] = len(loops)
+    return connections, mincost, stats
+
+
+# command line arguments that do not change the attack result, so they are
+# not part of the result cache key.
+CACHE_IGNORED_ARGS = {'lef', 'input', 'output', 'split_output', 'cache_dir',
+                      'cache_size', 'checkpoint_dir', 'resume', 'workers',
+                      'dump_graph', 'lib', 'route_dir'}
+
+
+# Main Class
+if __name__ == '__main__':
+    # inputs: LEF, DEF
+    # output: Verilog
+    parser = argparse.ArgumentParser(description='FEOL attack tool.')
+    parser.add_argument('-lef', '--lef', help='LEF file path', required=True)
+    parser.add_argument('-i', '--input', help='Input DEF layout file name', required=True)
+    parser.add_argument('-o', '--output', help='Output Verilog file name',
+                        required=True)
+    parser.add_argument('-split', '--split_layer',
+                        help='Split the input DEF layout in memory at this '
+                             'layer (e.g. metal3) before the attack. Without '
+                             'it, the input DEF must be a split DEF file.')
+    parser.add_argument('-split_out', '--split_output',
+                        help='Also write the split DEF to this file '
+                             '(only with --split_layer)')
+    parser.add_argument('-cache', '--cache_dir',
+                        help='Directory of the result cache. A run with the '
+                             'same LEF/DEF content and options reuses the '
+                             'cached result without parsing or solving '
+                             '(not used with --split_output).')
+    parser.add_argument('--cache_size', type=int, default=1024,
+                        help='Maximum size of the result cache in MB '
+                             '(default: 1024)')
+    parser.add_argument('-ckpt', '--checkpoint_dir',
+                        help='Save the output of each attack stage to this '
+                             'directory')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume from the last stage completed in '
+                             '--checkpoint_dir by an earlier run with the '
+                             'same inputs and options')
+    parser.add_argument('-t', '--time_budget', type=float,
+                        help='Time budget of the attack in minutes. The flow '
+                             'starts from a greedy assignment and is improved '
+                             'until the budget is used; the cost and a lower '
+                             'bound of the optimal cost are reported. Only '
+                             'for the networkx solver and --loop_free.')
+    parser.add_argument('-solver', '--solver', default='networkx',
+                        choices=['networkx', 'auction'],
+                        help='Min cost flow solver (default: networkx). '
+                             'auction is the auction algorithm with epsilon '
+                             'scaling.')
+    parser.add_argument('--auction_eps', type=float,
+                        help='Stop the auction solver at this epsilon; the '
+                             'cost is at most (number of sinks * epsilon) '
+                             'above the optimal cost. Default: exact.')
+    parser.add_argument('-no_loops', '--loop_free', action='store_true',
+                        help='Do not allow combinational loops in the '
+                             'inferred netlist: connections on loops are '
+                             'banned one by one and the flow is solved '
+                             'again from the previous solution.')
+    parser.add_argument('-k', '--k_best', type=int, default=1,
+                        help='Enumerate the k lowest cost distinct netlists. '
+                             'The best one is written to --output, solution '
+                             'i to <output>_i as soon as it is found '
+                             '(default: 1).')
+    parser.add_argument('-conf', '--confidence', action='store_true',
+                        help='Write a confidence score for each connection to '
+                             '<output>_confidence.csv: the increase of the min '
+                             'cost if the connection is forbidden.')
+    parser.add_argument('-ml', '--multilevel', type=int, metavar='TILE_SIZE',
+                        help='Multilevel solver for large designs: the sink '
+                             'pins are grouped into tiles of about TILE_SIZE '
+                             'pins, the flow of each tile is solved on its '
+                             'own, then refined along the tile borders.')
+    parser.add_argument('-budget', '--candidate_budget', type=int,
+                        help='Solve the flow with this number of shortest '
+                             'candidate edges per sink pin first, and add the '
+                             'other edges only where they can improve the '
+                             'flow. The result is still optimal.')
+    parser.add_argument('-dump', '--dump_graph',
+                        help='Save the candidate graph (the input of the flow '
+                             'solver) to this file, for compare_solvers.py')
+    parser.add_argument('-tile', '--tile_size', type=int,
+                        help='Tiled attack: split the die area into tiles of '
+                             'this size (DEF distance units); the candidates '
+                             'and the flow of each tile are found by worker '
+                             'processes, then stitched together.')
+    parser.add_argument('--tile_overlap', type=int,
+                        help='Overlap of the tile windows (DEF distance '
+                             'units, default: a quarter of --tile_size)')
+    parser.add_argument('-auto', '--auto_solver', action='store_true',
+                        help='Select the candidate mode (all pairs or tiled) '
+                             'and the flow solver from the predicted time '
+                             'and memory of the design, within --max_time '
+                             'and --max_memory (replaces --solver).')
+    parser.add_argument('--max_time', type=float,
+                        help='Time limit of the candidate and flow stages in '
+                             'seconds (implies --auto_solver)')
+    parser.add_argument('--max_memory', type=float,
+                        help='Memory limit of the candidate and flow stages '
+                             'in MB (implies --auto_solver)')
+    parser.add_argument('-lib', '--lib',
+                        help='LIB (Liberty) file of the cells. The fanout of '
+                             'each source pin is limited by its '
+                             'max_capacitance and the input capacitance of '
+                             'the sink pins.')
+    parser.add_argument('--route_dir',
+                        help='Directory of a memory-mapped store of the DEF '
+                             'routes. The route points are kept on disk '
+                             'instead of in memory, for designs larger than '
+                             'the RAM.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Number of worker processes of the input '
+                             'loading, the multilevel solver and the tiled '
+                             'attack (default: number of CPUs)')
+    args = parser.parse_args()
+    start_time = time.time()
+    if args.resume and not args.checkpoint_dir:
+        parser.error('--resume needs --checkpoint_dir')
+    if args.k_best < 1:
+        parser.error('--k_best must be at least 1')
+    if args.k_best > 1 and args.loop_free:
+        parser.error('--k_best can not be used with --loop_free')
+    if args.multilevel is not None:
+        if args.multilevel < 1:
+            parser.error('--multilevel must be at least 1')
+        if args.loop_free or args.k_best > 1:
+            parser.error('--multilevel can not be used with --loop_free or '
+                         '--k_best')
+    if args.candidate_budget is not None:
+        if args.candidate_budget < 1:
+            parser.error('--candidate_budget must be at least 1')
+        if args.loop_free or args.k_best > 1 or args.multilevel is not None:
+            parser.error('--candidate_budget can not be used with '
+                         '--loop_free, --k_best or --multilevel')
+    if args.tile_size is not None:
+        if args.tile_size < 1:
+            parser.error('--tile_size must be at least 1')
+        if args.loop_free or args.k_best > 1 or args.multilevel is not None:
+            parser.error('--tile_size can not be used with --loop_free, '
+                         '--k_best or --multilevel')
+        if args.candidate_budget is not None:
+            parser.error('--tile_size can not be used with '
+                         '--candidate_budget')
+        if args.tile_overlap is None:
+            args.tile_overlap = args.tile_size // 4
+    if args.solver == 'auction':
+        if args.loop_free or args.k_best > 1 or args.multilevel is not None or \
+                args.candidate_budget is not None or args.tile_size is not None:
+            parser.error('--solver auction can not be used with --loop_free, '
+                         '--k_best, --multilevel, --candidate_budget or '
+                         '--tile_size')
+    if args.time_budget is not None:
+        # only the anytime and the loop-free solvers stop at the deadline
+        if args.k_best > 1 or args.multilevel is not None or \
+                args.candidate_budget is not None or args.tile_size is not None:
+            parser.error('--time_budget can not be used with --k_best, '
+                         '--multilevel, --candidate_budget or --tile_size')
+        if args.solver == 'auction':
+            parser.error('--time_budget can not be used with --solver auction')
+    if args.max_time is not None and args.max_time <= 0:
+        parser.error('--max_time must be positive')
+    if args.max_memory is not None and args.max_memory <= 0:
+        parser.error('--max_memory must be positive')
+    if args.max_time is not None or args.max_memory is not None:
+        args.auto_solver = True
+    if args.auto_solver:
+        if args.loop_free or args.k_best > 1 or args.multilevel is not None or \
+                args.candidate_budget is not None or args.tile_size is not None:
+            parser.error('--auto_solver can not be used with --loop_free, '
+                         '--k_best, --multilevel, --candidate_budget or '
+                         '--tile_size')
+        if args.time_budget is not None:
+            parser.error('--auto_solver can not be used with --time_budget')
+
+    # the key of this run, used by the result cache and the checkpoint
+    run_key = None
+    if args.cache_dir or args.checkpoint_dir:
+        options = {}
+        for each_arg in vars(args):
+            if each_arg not in CACHE_IGNORED_ARGS:
+                options[each_arg] = getattr(args, each_arg)
+        input_files = [args.lef, args.input]
+        if args.lib:
+            input_files.append(args.lib)
+        run_key = attack_key(input_files, options)
+
+    cache = None
+    result = None
+    # the cache only keeps the best solution, without the scores or the
+    # candidate graph
+    if args.cache_dir and not args.split_output and args.k_best == 1 and \
+            not args.confidence and not args.dump_graph:
+        cache = ResultCache(args.cache_dir, args.cache_size * 1024 * 1024)
+        result = cache.get(run_key)
 
     verilog_out = args.output
-    output_verilog(connections, def_parser, lef_parser, verilog_out)
+    if result is not None:
+        print('Found the attack result in the cache, cost = ' +
+              str(result['cost']))
+        f = open(verilog_out, 'w')
+        f.write(result['verilog'])
+        f.close()
+    else:
+        # Load the Layout (and the cells), the inputs are read concurrently
+        lef_parser, def_parser, lib_data = load_inputs(args.lef, args.input,
+                                                       args.lib, args.workers,
+                                                       args.route_dir)
+
+        if args.split_layer:
+            # split the layout without the DEF round-trip
+            splitter = Splitter(def_parser, lef_parser, args.split_layer)
+            def_parser = splitter.split()
+            if args.split_output:
+                print('Writing split DEF to ' + args.split_output)
+                splitter.write_def(def_parser, args.split_output)
+
+        checkpoint = None
+        if args.checkpoint_dir:
+            checkpoint = Checkpoint(args.checkpoint_dir, run_key, args.resume)
+        solver_options = {'solver': args.solver,
+                          'auction_eps': args.auction_eps,
+                          'loop_free': args.loop_free,
+                          'multilevel': args.multilevel,
+                          'candidate_budget': args.candidate_budget,
+                          'tile_size': args.tile_size,
+                          'tile_overlap': args.tile_overlap,
+                          'dump_graph': args.dump_graph,
+                          'workers': args.workers}
+        if args.auto_solver:
+            solver_options['auto'] = True
+            solver_options['max_time'] = args.max_time
+            if args.max_memory is not None:
+                solver_options['max_memory'] = args.max_memory * 1024 * 1024
+        if args.time_budget is not None:
+            solver_options['deadline'] = start_time + args.time_budget * 60
+        out_root, out_ext = os.path.splitext(verilog_out)
+        if args.k_best > 1:
+
+            def write_alternative(rank, alt_connections, alt_cost):
+                alt_out = out_root + '_' + str(rank) + out_ext
+                print('Writing solution ' + str(rank) + ' to ' + alt_out)
+                f = open(alt_out, 'w')
+                f.write(verilog_netlist(alt_connections, def_parser, lef_parser))
+                f.close()
+            solver_options['k_best'] = args.k_best
+            solver_options['on_alternative'] = write_alternative
+        if args.confidence:
+            confidence_out = out_root + '_confidence.csv'
+
+            def save_confidence(rows):
+                print('Writing confidence scores to ' + confidence_out)
+                write_confidence(rows, confidence_out)
+            solver_options['on_confidence'] = save_confidence
+        connections, mincost, stats = network_attack(def_parser, lef_parser,
+                                                     checkpoint, solver_options,
+                                                     lib_data)
+
+        verilog = verilog_netlist(connections, def_parser, lef_parser)
+        f = open(verilog_out, 'w')
+        f.write(verilog)
+        f.close()
+        if cache and args.time_budget is not None and \
+                stats.get('optimal') is False:
+            # the result depends on how far the solver got by the deadline,
+            # not only on the inputs
+            print('The flow is not proven optimal, the result is not cached.')
+        elif cache:
+            cache.put(run_key, connections, mincost, stats, verilog)
 
     print('Writing inferred netlist to Verilog output done.')
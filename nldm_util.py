@@ -0,0 +1,197 @@
+"""
+Vectorized NLDM delay and transition lookup for the LIB timing tables
+Author: Tri Minh Cao
+Email: tricao@utdallas.edu
+Date: December 2016
+"""
+import numpy as np
+
+# the NLDM tables of a timing arc
+NLDM_TABLES = ('cell_rise', 'cell_fall', 'rise_transition', 'fall_transition')
+
+
+def load_axis(table):
+    """
+    Check which index of a table is the output load, the other one is the
+    input transition (the order of the variables is set by the template).
+    :param table: a Timing_Vals object.
+    :return: 0 if index_1 is the load, 1 otherwise.
+    """
+    variable = table.variables[0]
+    if variable is not None and 'capacitance' in variable:
+        return 0
+    return 1
+
+
+class NldmTables:
+    """
+    Class NldmTables keeps the NLDM tables of every timing arc of a library
+    in padded NumPy arrays, so thousands of lookups are interpolated at once.
+    A timing arc is a timing group of a pin: (cell, pin, related pin).
+    For each table type, the arrays are (arcs x max index length): index_1,
+    index_2 (padded with inf), and (arcs x max length 1 x max length 2):
+    values. A missing table gives NaN.
+    """
+    def __init__(self, library, tables=NLDM_TABLES):
+        """
+        :param library: a lib_util.Library object.
+        :param tables: the table types to keep.
+        """
+        # (cell, pin, related pin) of each arc
+        self.arcs = []
+        # (cell, pin, related pin) -> index of the first arc
+        self.arc_dict = {}
+        arc_tables = dict((each, []) for each in tables)
+        for cell_name in library.cell_dict:
+            cell = library.cell_dict[cell_name]
+            for pin_name in cell.pin_dict:
+                pin = cell.pin_dict[pin_name]
+                if pin.name != pin_name:
+                    # the other names of pin (A, B) { ... }
+                    continue
+                for each_timing in pin.timings:
+                    arc = len(self.arcs)
+                    related = each_timing.related_pin or ''
+                    self.arcs.append((cell_name, pin_name, related))
+                    # related_pin : "A B" is an arc from each pin
+                    for related_pin in related.split():
+                        key = (cell_name, pin_name, related_pin)
+                        if key not in self.arc_dict:
+                            self.arc_dict[key] = arc
+                    for each in tables:
+                        arc_tables[each].append(each_timing.tables.get(each))
+        self.tables = {}
+        for each in tables:
+            self.tables[each] = self.pack(arc_tables[each])
+
+    @staticmethod
+    def pack(tables):
+        """
+        Pack the tables of one type into padded arrays. The tables are stored
+        with the input transition as index 1 and the load as index 2.
+        :param tables: a list of Timing_Vals objects (or None).
+        :return: a dictionary of the arrays: 'index_1', 'index_2', 'values',
+        'length_1', 'length_2' (number of index values), 'valid'.
+        """
+        num = len(tables)
+        grids = []
+        for table in tables:
+            if table is None or table.values is None:
+                grids.append(None)
+                continue
+            values = np.atleast_1d(table.values)
+            index_1 = table.indices[0]
+            index_2 = table.indices[1]
+            if index_1 is None:
+                # scalar table
+                index_1 = np.zeros(1)
+                values = values[:1]
+            if values.ndim == 1:
+                if values.size != len(index_1):
+                    # the values do not fit the indices
+                    grids.append(None)
+                    continue
+                values = values.reshape(len(index_1), 1)
+                index_2 = np.zeros(1)
+            elif index_2 is None:
+                index_2 = np.zeros(values.shape[1])
+            if load_axis(table) == 0:
+                index_1, index_2 = index_2, index_1
+                values = values.T
+            grids.append((index_1, index_2, values))
+        max_1 = max([len(each[0]) for each in grids if each] + [1])
+        max_2 = max([len(each[1]) for each in grids if each] + [1])
+        index_1 = np.full((num, max_1), np.inf)
+        index_2 = np.full((num, max_2), np.inf)
+        # (a missing table has one index value)
+        index_1[:, 0] = 0
+        index_2[:, 0] = 0
+        values = np.full((num, max_1, max_2), np.nan)
+        length_1 = np.ones(num, dtype=np.int64)
+        length_2 = np.ones(num, dtype=np.int64)
+        valid = np.zeros(num, dtype=bool)
+        for t in range(num):
+            if grids[t] is None:
+                continue
+            grid_1, grid_2, grid_values = grids[t]
+            index_1[t, :len(grid_1)] = grid_1
+            index_2[t, :len(grid_2)] = grid_2
+            values[t, :len(grid_1), :len(grid_2)] = grid_values
+            length_1[t] = len(grid_1)
+            length_2[t] = len(grid_2)
+            valid[t] = True
+        return {'index_1': index_1, 'index_2': index_2, 'values': values,
+                'length_1': length_1, 'length_2': length_2, 'valid': valid}
+
+    def arc_indices(self, cells, pins, related_pins):
+        """
+        Find the arcs of lists of (cell, pin, related pin).
+        :return: NumPy array of the arc indices, -1 if there is no arc.
+        """
+        return np.array([self.arc_dict.get(key, -1)
+                         for key in zip(cells, pins, related_pins)],
+                        dtype=np.int64)
+
+    def interpolate(self, table_type, arcs, slews, loads):
+        """
+        Bilinear interpolation of one table type for many queries. Queries
+        outside the index range are extrapolated from the closest two index
+        values, as done by timing tools.
+        :param table_type: such as 'cell_rise'.
+        :param arcs: NumPy array of arc indices (-1 gives NaN).
+        :param slews: NumPy array of input transitions.
+        :param loads: NumPy array of output loads.
+        :return: NumPy array of the interpolated values.
+        """
+        packed = self.tables[table_type]
+        arcs = np.asarray(arcs, dtype=np.int64)
+        x = np.asarray(slews, dtype=np.float64)
+        y = np.asarray(loads, dtype=np.float64)
+        missing = arcs < 0
+        t = np.where(missing, 0, arcs)
+        if len(self.arcs) == 0:
+            return np.full(arcs.shape, np.nan)
+        i0, i1, wx = self.bracket(packed['index_1'][t], packed['length_1'][t], x)
+        j0, j1, wy = self.bracket(packed['index_2'][t], packed['length_2'][t], y)
+        values = packed['values']
+        v00 = values[t, i0, j0]
+        v01 = values[t, i0, j1]
+        v10 = values[t, i1, j0]
+        v11 = values[t, i1, j1]
+        result = (1 - wx) * ((1 - wy) * v00 + wy * v01) + \
+            wx * ((1 - wy) * v10 + wy * v11)
+        result[missing | ~packed['valid'][t]] = np.nan
+        return result
+
+    @staticmethod
+    def bracket(index, length, x):
+        """
+        Find the two index values around each query and the weight of the
+        second one.
+        :param index: (queries x max length) index values, padded with inf.
+        :param length: number of index values of each query.
+        :param x: the query values.
+        :return: first position, second position, weight of the second.
+        """
+        below = np.sum(index <= x[:, None], axis=1)
+        first = np.clip(below - 1, 0, np.maximum(length - 2, 0))
+        second = np.minimum(first + 1, length - 1)
+        rows = np.arange(len(x))
+        x0 = index[rows, first]
+        x1 = index[rows, second]
+        span = x1 - x0
+        weight = np.where(span != 0, (x - x0) / np.where(span != 0, span, 1), 0)
+        return first, second, weight
+
+    def lookup(self, arcs, slews, loads):
+        """
+        Interpolate every table type for many queries.
+        :param arcs: NumPy array of arc indices (see arc_indices).
+        :param slews: NumPy array of input transitions.
+        :param loads: NumPy array of output loads.
+        :return: a dictionary, table type -> NumPy array of the values.
+        """
+        result = {}
+        for each in self.tables:
+            result[each] = self.interpolate(each, arcs, slews, loads)
+        return result
@@ -0,0 +1,239 @@
+"""
+Index of the absolute pin shapes of the placed components
+Author: Tri Minh Cao
+Email: tricao@utdallas.edu
+Date: December 2016
+"""
+from lef_parser import SCALE
+import numpy as np
+
+# DEF orientations. The location of a point (px, py) of a macro of size
+# (w, h) relative to the PLACED point of the component is
+#     x = a * px + b * py + c * w + d * h
+#     y = e * px + f * py + g * w + k * h
+# ORIENT_MATRIX[code] gives [[a, b, c, d], [e, f, g, k]].
+ORIENTS = {"N": 0, "S": 1, "W": 2, "E": 3, "FN": 4, "FS": 5, "FW": 6, "FE": 7}
+ORIENT_MATRIX = np.array([
+    [[1, 0, 0, 0], [0, 1, 0, 0]],     # N: (px, py)
+    [[-1, 0, 1, 0], [0, -1, 0, 1]],   # S: (w - px, h - py)
+    [[0, -1, 0, 1], [1, 0, 0, 0]],    # W: (h - py, px)
+    [[0, 1, 0, 0], [-1, 0, 1, 0]],    # E: (py, w - px)
+    [[-1, 0, 1, 0], [0, 1, 0, 0]],    # FN: (w - px, py)
+    [[1, 0, 0, 0], [0, -1, 0, 1]],    # FS: (px, h - py)
+    [[0, -1, 0, 1], [-1, 0, 1, 0]],   # FW: (h - py, w - px)
+    [[0, 1, 0, 0], [1, 0, 0, 0]],     # FE: (py, px)
+], dtype=np.float64)
+
+
+def orient_points(orients, px, py, width, height):
+    """
+    Transform macro points to the orientation of their components.
+    :param orients: array of orientation codes (see ORIENTS).
+    :param px: array of x coordinates, relative to the lower left corner of
+    the macro.
+    :param py: array of y coordinates.
+    :param width: array of macro widths.
+    :param height: array of macro heights.
+    :return: arrays of x and y coordinates relative to the PLACED point.
+    """
+    coef = ORIENT_MATRIX[orients]
+    terms = np.stack([px, py, width, height])
+    x = np.einsum('ij,ji->i', coef[:, 0, :], terms)
+    y = np.einsum('ij,ji->i', coef[:, 1, :], terms)
+    return x, y
+
+
+def macro_shapes(macro):
+    """
+    Get the port shapes of a macro in DEF database units.
+    A POLYGON is replaced by its bounding box.
+    :param macro: a lef_util.Macro object.
+    :return: list of pin names, list of [start, end) shape ranges of each
+    pin, list of shape layers and an array of the shapes [x0, y0, x1, y1]
+    relative to the lower left corner of the macro.
+    """
+    origin = macro.origin if macro.origin else (0.0, 0.0)
+    pin_names = []
+    pin_ranges = []
+    layers = []
+    rects = []
+    for pin_name, pin in macro.pin_dict.items():
+        start = len(rects)
+        if pin.port:
+            for layer in pin.port.layer:
+                for shape in layer.shapes:
+                    xs = [pt[0] for pt in shape.points]
+                    ys = [pt[1] for pt in shape.points]
+                    rects.append([min(xs), min(ys), max(xs), max(ys)])
+                    layers.append(layer.name)
+        pin_names.append(pin_name)
+        pin_ranges.append((start, len(rects)))
+    rects = np.array(rects, dtype=np.float64).reshape(-1, 4)
+    # the pin shapes are relative to the origin of the macro
+    rects += [origin[0], origin[1], origin[0], origin[1]]
+    return pin_names, pin_ranges, layers, np.rint(rects * SCALE)
+
+
+class PinIndex:
+    """
+    Class PinIndex keeps the absolute shapes (in DEF database units) of the
+    pins of all placed components. The shapes of a component are stored
+    together, so the shapes of a cell pin are a slice of the arrays, and a
+    copy of the shapes sorted by x0 answers point and rectangle queries with
+    a binary search.
+    """
+
+    def __init__(self, def_data, lef_data):
+        """
+        :param def_data: DEF data.
+        :param lef_data: LEF data.
+        """
+        macro_names = []
+        macro_id = {}
+        self.macro_pins = []
+        self.macro_shape_pins = []
+        macro_layers = []
+        macro_rects = []
+        comps = []
+        comp_macros = []
+        for comp in def_data.components.comps:
+            if comp.placed is None or comp.macro not in lef_data.macro_dict:
+                continue
+            if comp.macro not in macro_id:
+                pin_names, pin_ranges, layers, rects = macro_shapes(
+                    lef_data.macro_dict[comp.macro])
+                macro_id[comp.macro] = len(macro_names)
+                macro_names.append(comp.macro)
+                self.macro_pins.append(dict(zip(pin_names, pin_ranges)))
+                # pin name of each shape of the macro
+                self.macro_shape_pins.append(
+                    [name for name, (start, end) in zip(pin_names, pin_ranges)
+                     for i in range(start, end)])
+                macro_layers.append(layers)
+                macro_rects.append(rects)
+            comps.append(comp)
+            comp_macros.append(macro_id[comp.macro])
+        self.comp_names = [comp.name for comp in comps]
+        self.comp_id = {name: i for i, name in enumerate(self.comp_names)}
+        self.comp_macro = np.array(comp_macros, dtype=np.int64)
+        # shapes of every macro in one table
+        counts = np.array([len(rects) for rects in macro_rects],
+                          dtype=np.int64)
+        macro_start = np.zeros(len(macro_rects) + 1, dtype=np.int64)
+        np.cumsum(counts, out=macro_start[1:])
+        table = (np.concatenate(macro_rects) if macro_rects
+                 else np.zeros((0, 4)))
+        self.layer_names = sorted(set(name for layers in macro_layers
+                                      for name in layers))
+        layer_code = {name: i for i, name in enumerate(self.layer_names)}
+        table_layers = np.array([layer_code[name] for layers in macro_layers
+                                 for name in layers], dtype=np.int64)
+        sizes = np.array([lef_data.macro_dict[name].size for name in
+                          macro_names], dtype=np.float64).reshape(-1, 2)
+        sizes = np.rint(sizes * SCALE)
+
+        # one row per shape of each component
+        comp_counts = counts[self.comp_macro]
+        self.comp_start = np.zeros(len(comps) + 1, dtype=np.int64)
+        np.cumsum(comp_counts, out=self.comp_start[1:])
+        num_shapes = int(self.comp_start[-1])
+        shape_comp = np.repeat(np.arange(len(comps)), comp_counts)
+        shape_macro = self.comp_macro[shape_comp]
+        rows = (macro_start[shape_macro] + np.arange(num_shapes) -
+                self.comp_start[shape_comp])
+        rects = table[rows]
+        self.shape_comp = shape_comp
+        self.shape_row = rows - macro_start[shape_macro]
+        self.shape_layer = table_layers[rows]
+
+        # orientation transform of both corners
+        placed = np.array([comp.placed for comp in comps],
+                          dtype=np.float64).reshape(-1, 2)[shape_comp]
+        orients = np.array([ORIENTS.get(comp.orient, 0) for comp in comps],
+                           dtype=np.int64)[shape_comp]
+        width = sizes[shape_macro, 0]
+        height = sizes[shape_macro, 1]
+        x0, y0 = orient_points(orients, rects[:, 0], rects[:, 1], width,
+                               height)
+        x1, y1 = orient_points(orients, rects[:, 2], rects[:, 3], width,
+                               height)
+        self.x0 = np.minimum(x0, x1) + placed[:, 0]
+        self.x1 = np.maximum(x0, x1) + placed[:, 0]
+        self.y0 = np.minimum(y0, y1) + placed[:, 1]
+        self.y1 = np.maximum(y0, y1) + placed[:, 1]
+
+        # sorted copy for the spatial queries
+        self.order = np.argsort(self.x0, kind='stable')
+        self.sorted_x0 = self.x0[self.order]
+        self.max_width = (float(np.max(self.x1 - self.x0)) if num_shapes
+                          else 0.0)
+
+    def pin_range(self, comp_name, pin_name):
+        """
+        Get the rows of the shapes of a cell pin.
+        :param comp_name: component name.
+        :param pin_name: pin name.
+        :return: (start, end) rows, (0, 0) if the pin is not found.
+        """
+        comp = self.comp_id.get(comp_name)
+        if comp is None:
+            return 0, 0
+        pin = self.macro_pins[self.comp_macro[comp]].get(pin_name)
+        if pin is None:
+            return 0, 0
+        start = int(self.comp_start[comp])
+        return start + pin[0], start + pin[1]
+
+    def pin_shapes(self, comp_name, pin_name):
+        """
+        Get the absolute shapes of a cell pin.
+        :param comp_name: component name.
+        :param pin_name: pin name.
+        :return: an array of the shapes [x0, y0, x1, y1].
+        """
+        start, end = self.pin_range(comp_name, pin_name)
+        return np.stack([self.x0[start:end], self.y0[start:end],
+                         self.x1[start:end], self.y1[start:end]], axis=1)
+
+    def query(self, x0, y0, x1, y1, layer=None):
+        """
+        Find the shapes that overlap a rectangle (the borders included).
+        :param x0, y0, x1, y1: the rectangle.
+        :param layer: only keep the shapes on this layer (optional).
+        :return: array of the shape rows.
+        """
+        # a shape that overlaps the rectangle starts after x0 - max_width
+        lo = np.searchsorted(self.sorted_x0, x0 - self.max_width, 'left')
+        hi = np.searchsorted(self.sorted_x0, x1, 'right')
+        rows = self.order[lo:hi]
+        keep = ((self.x1[rows] >= x0) & (self.y0[rows] <= y1) &
+                (self.y1[rows] >= y0))
+        if layer is not None:
+            if layer not in self.layer_names:
+                return rows[:0]
+            keep &= self.shape_layer[rows] == self.layer_names.index(layer)
+        return rows[keep]
+
+    def pins_in(self, x0, y0, x1, y1, layer=None):
+        """
+        Find the cell pins that have a shape overlapping a rectangle.
+        :param x0, y0, x1, y1: the rectangle.
+        :param layer: only look at the shapes on this layer (optional).
+        :return: set of (component name, pin name).
+        """
+        pins = set()
+        for row in self.query(x0, y0, x1, y1, layer):
+            comp = self.shape_comp[row]
+            shape_pins = self.macro_shape_pins[self.comp_macro[comp]]
+            pins.add((self.comp_names[comp], shape_pins[self.shape_row[row]]))
+        return pins
+
+    def pins_at(self, x, y, layer=None):
+        """
+        Find the cell pins that have a shape on a point.
+        :param x: x coordinate.
+        :param y: y coordinate.
+        :param layer: only look at the shapes on this layer (optional).
+        :return: set of (component name, pin name).
+        """
+        return self.pins_in(x, y, x, y, layer)
@@ -0,0 +1,262 @@
+"""
+Columnar on-disk store of the DEF routes, read through numpy.memmap
+Author: Tri Minh Cao
+Email: tricao@utdallas.edu
+Date: December 2016
+"""
+from def_util import Routed
+import array
+import json
+import numpy as np
+import os
+
+ROUTE_STORE_VERSION = 1
+
+# columns of the store: (array typecode, numpy dtype). The route columns have
+# one value per route, the point columns have one value per point. The rank
+# column is written when the LEF is known (see RouteStore.rank_layers).
+ROUTE_COLUMNS = {'layer': ('h', np.int16), 'net': ('i', np.int32),
+                 'via': ('i', np.int32)}
+POINT_COLUMNS = {'x': ('i', np.int32), 'y': ('i', np.int32),
+                 'ext': ('i', np.int32)}
+# first point of each route, and the number of points at the end
+OFFSET_COLUMN = {'offset': ('q', np.int64)}
+# number of points buffered in memory before they are written to disk
+FLUSH_SIZE = 1 << 18
+
+
+class RouteStore:
+    """
+    Class RouteStore keeps the routes of a DEF file in a directory, one
+    binary file per column. The points of route i are the rows offset[i] to
+    offset[i + 1] of the point columns. The layer and via names are numbered
+    in the order they are first seen, a via id of -1 means no end via, and an
+    ext of -1 means a point without extension value.
+    Routes are added while the DEF file is parsed, close() writes the last
+    rows and maps the columns (read only) with numpy.memmap.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: directory of the store, it is created if needed and the
+        old files are overwritten.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.layer_names = []
+        self.layer_ids = {}
+        self.via_names = []
+        self.via_ids = {}
+        self.num_routes = 0
+        self.num_points = 0
+        # rank column, None until rank_layers() is called
+        self.rank = None
+        # write buffers and files of the columns
+        self.buffers = {}
+        self.files = {}
+        for columns in (ROUTE_COLUMNS, POINT_COLUMNS, OFFSET_COLUMN):
+            for name, (typecode, dtype) in columns.items():
+                self.buffers[name] = array.array(typecode)
+                self.files[name] = open(self.column_file(name), 'wb')
+        self.buffers['offset'].append(0)
+
+    def column_file(self, name):
+        return os.path.join(self.path, name + '.bin')
+
+    def add(self, net_id, route):
+        """
+        Add a route to the store.
+        :param net_id: index of the net of the route.
+        :param route: a Routed object, it is not kept.
+        :return: a StoredRoute object that replaces the route.
+        """
+        layer = route.layer
+        if layer not in self.layer_ids:
+            self.layer_ids[layer] = len(self.layer_names)
+            self.layer_names.append(layer)
+        via = -1
+        if route.end_via:
+            if route.end_via not in self.via_ids:
+                self.via_ids[route.end_via] = len(self.via_names)
+                self.via_names.append(route.end_via)
+            via = self.via_ids[route.end_via]
+        buffers = self.buffers
+        buffers['layer'].append(self.layer_ids[layer])
+        buffers['net'].append(net_id)
+        buffers['via'].append(via)
+        for each_pt in route.points:
+            buffers['x'].append(each_pt[0])
+            buffers['y'].append(each_pt[1])
+            buffers['ext'].append(each_pt[2] if len(each_pt) > 2 else -1)
+        self.num_points += len(route.points)
+        buffers['offset'].append(self.num_points)
+        if len(buffers['x']) >= FLUSH_SIZE:
+            self.flush()
+        index = self.num_routes
+        self.num_routes += 1
+        return StoredRoute(self, index)
+
+    def flush(self):
+        """
+        Write the buffered rows to the column files.
+        :return: void
+        """
+        for name, buffer in self.buffers.items():
+            buffer.tofile(self.files[name])
+            del buffer[:]
+
+    def close(self):
+        """
+        Finish writing the store, save its description (meta.json) and open
+        it for reading.
+        :return: void
+        """
+        self.flush()
+        for each_file in self.files.values():
+            each_file.close()
+        self.files = {}
+        self.buffers = {}
+        meta = {'version': ROUTE_STORE_VERSION, 'num_routes': self.num_routes,
+                'num_points': self.num_points, 'layers': self.layer_names,
+                'vias': self.via_names}
+        f = open(os.path.join(self.path, 'meta.json'), 'w')
+        json.dump(meta, f)
+        f.close()
+        self.open()
+
+    def open(self):
+        """
+        Map the columns of the store.
+        :return: void
+        """
+        sizes = [(ROUTE_COLUMNS, self.num_routes),
+                 (POINT_COLUMNS, self.num_points),
+                 (OFFSET_COLUMN, self.num_routes + 1)]
+        for columns, size in sizes:
+            for name, (typecode, dtype) in columns.items():
+                if size == 0:
+                    # an empty file can not be mapped
+                    column = np.zeros(0, dtype=dtype)
+                else:
+                    column = np.memmap(self.column_file(name), dtype=dtype,
+                                       mode='r', shape=(size,))
+                # e.g. self.x is the x column
+                setattr(self, name, column)
+
+    def rank_layers(self, ranks):
+        """
+        Write the rank column of the store.
+        :param ranks: layer ranks (see util.layer_ranks).
+        :return: void
+        """
+        layer_rank = np.array([ranks[name] for name in self.layer_names],
+                              dtype=np.int8)
+        if self.num_routes == 0:
+            self.rank = np.zeros(0, dtype=np.int8)
+            return
+        layer_rank[self.layer].tofile(self.column_file('rank'))
+        self.rank = np.memmap(self.column_file('rank'), dtype=np.int8,
+                              mode='r', shape=(self.num_routes,))
+
+    def route_points(self, index):
+        """
+        Get the points of a route in the DEF format.
+        :param index: route index.
+        :return: list of [x, y] or [x, y, ext] points.
+        """
+        return self.routes_points([index])[0]
+
+    def routes_points(self, indices):
+        """
+        Get the points of many routes, with one read of each point column.
+        :param indices: route indices.
+        :return: a list of the points of each route (see route_points).
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.offset[indices]
+        counts = self.offset[indices + 1] - starts
+        # rows of the points of the routes, one route after the other
+        first = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(counts, out=first[1:])
+        rows = np.arange(first[-1]) + np.repeat(starts - first[:-1], counts)
+        points = []
+        for x, y, ext in zip(self.x[rows].tolist(), self.y[rows].tolist(),
+                             self.ext[rows].tolist()):
+            if ext < 0:
+                points.append([x, y])
+            else:
+                points.append([x, y, ext])
+        first = first.tolist()
+        return [points[first[k]:first[k + 1]] for k in range(len(indices))]
+
+
+def routes_points(routes):
+    """
+    Get the points of a list of routes. The points of the stored routes are
+    read from the columns of their store at once, instead of route by route.
+    :param routes: list of Routed or StoredRoute objects.
+    :return: a list of the points of each route.
+    """
+    result = [None] * len(routes)
+    stored = {}
+    for k in range(len(routes)):
+        if isinstance(routes[k], StoredRoute):
+            stored.setdefault(routes[k].store, []).append(k)
+        else:
+            result[k] = routes[k].points
+    for store, positions in stored.items():
+        indices = [routes[k].index for k in positions]
+        for k, points in zip(positions, store.routes_points(indices)):
+            result[k] = points
+    return result
+
+
+class StoredRoute(Routed):
+    """
+    Class StoredRoute is a ROUTED definition kept in a RouteStore. It has the
+    interface of Routed, the points are read from the store when they are
+    used and are not kept in memory.
+    """
+
+    def __init__(self, store, index):
+        self.type = "ROUTED_DEF"
+        self.store = store
+        self.index = index
+
+    @property
+    def rank(self):
+        if self.store.rank is None:
+            raise ValueError('The routes of ' + self.store.path + ' have no '
+                             'layer rank, rank the DEF data with '
+                             'DefParser.rank_layers() first')
+        return int(self.store.rank[self.index])
+
+    @property
+    def layer(self):
+        store = self.store
+        return store.layer_names[store.layer[self.index]]
+
+    @property
+    def points(self):
+        return self.store.route_points(self.index)
+
+    @property
+    def end_via(self):
+        via = self.store.via[self.index]
+        if via < 0:
+            return None
+        return self.store.via_names[via]
+
+    @property
+    def end_via_loc(self):
+        if self.store.via[self.index] < 0:
+            return None
+        return self.get_last_pt()
+
+    def get_last_pt(self):
+        store = self.store
+        last = store.offset[self.index + 1] - 1
+        ext = int(store.ext[last])
+        if ext < 0:
+            return [int(store.x[last]), int(store.y[last])]
+        return [int(store.x[last]), int(store.y[last]), ext]
@@ -0,0 +1,209 @@
+"""
+Cost model of the candidate modes and flow solvers of the network flow attack
+Author: Tri Minh Cao
+Email: tricao@utdallas.edu
+Date: December 2016
+"""
+import math
+
+# The constants are fitted on the run time (seconds) and peak traced memory
+# (bytes) of the attack stages on the benchmark designs (compare_solvers.py
+# for the flow solvers).
+
+# dense candidates (build_distances): time and memory per (source, sink) pair
+PAIR_TIME = 23e-6
+PAIR_MEMORY = 17
+# tiled attack (tiled_flow): time per window, per pin of a window and per
+# pair of a window (candidates and flow), memory per pin of the design and
+# per pair of the windows being solved
+WINDOW_TIME = 1e-3
+WINDOW_PIN_TIME = 60e-6
+WINDOW_PAIR_TIME = 4.2e-6
+PIN_MEMORY = 1500
+WINDOW_PAIR_MEMORY = 85
+# memory of a candidate edge kept for the flow (tuple and list slot)
+EDGE_MEMORY = 90
+# memory of a net end point sent to a window
+END_POINT_MEMORY = 200
+# the fraction of the pairs that are candidate edges is about
+# EDGE_FRACTION * (number of nets) ^ EDGE_EXPONENT
+EDGE_FRACTION = 0.30
+EDGE_EXPONENT = -0.23
+# flow solvers: time = a * edges ^ b, memory = bytes per edge
+SOLVER_TIME = {'networkx': (6.2e-5, 1.22),
+               'residual': (35e-6, 1.0),
+               'auction': (30e-6, 1.0),
+               'budget': (35e-6, 1.0),
+               'multilevel': (55e-6, 1.0)}
+SOLVER_MEMORY = {'networkx': 1450,
+                 'residual': 270,
+                 'auction': 120,
+                 'budget': 150,
+                 'multilevel': 360}
+# start time of the worker processes
+POOL_TIME = 0.1
+# sink pins per tile of the multilevel solver
+MULTILEVEL_TILE = 1000
+# candidate edges per sink pin of the budget solver
+CANDIDATE_BUDGET = 2
+# the tiled attack splits the die side into this number of tiles
+TILE_SPLITS = [2, 4, 8, 16, 32]
+
+
+def design_stats(def_data, source_pins, sink_pins, net_ends_dict):
+    """
+    Quick statistics of the design, the inputs of the cost model.
+    :param def_data: DEF data
+    :param source_pins: the source pins.
+    :param sink_pins: the sink pins.
+    :param net_ends_dict: dictionary that store the end points of each net.
+    :return: a dictionary of the statistics.
+    """
+    width = def_data.diearea[1][0] - def_data.diearea[0][0]
+    height = def_data.diearea[1][1] - def_data.diearea[0][1]
+    end_points = 0
+    for each_net in net_ends_dict:
+        end_points += len(net_ends_dict[each_net][0])
+    area = max(1, width * height)
+    return {'num_nets': len(def_data.nets.nets),
+            'num_sources': len(source_pins),
+            'num_sinks': len(sink_pins),
+            'num_end_points': end_points,
+            'die_width': width,
+            'die_height': height,
+            'end_point_density': end_points / float(area)}
+
+
+def candidate_fraction(num_nets):
+    """
+    Expected fraction of the (source, sink) pairs that are candidate edges.
+    :param num_nets: number of nets.
+    :return: a fraction between 0 and 1.
+    """
+    return min(1.0, EDGE_FRACTION * max(1, num_nets) ** EDGE_EXPONENT)
+
+
+def solver_cost(solver, num_edges, num_sinks, workers=1):
+    """
+    Predict the time and memory of a flow solver.
+    :param solver: a key of SOLVER_TIME.
+    :param num_edges: number of candidate edges.
+    :param num_sinks: number of sink pins.
+    :param workers: number of worker processes (multilevel solver).
+    :return: predicted time in seconds and memory in bytes.
+    """
+    a, b = SOLVER_TIME[solver]
+    run_time = a * num_edges ** b
+    memory = SOLVER_MEMORY[solver] * num_edges
+    if solver == 'multilevel':
+        num_tiles = int(math.ceil(num_sinks / float(MULTILEVEL_TILE)))
+        parallel = min(workers, num_tiles)
+        if parallel > 1:
+            # the tiles are solved in parallel, the coarse flow and the
+            # border refinement are not
+            run_time = run_time * (0.3 + 0.7 / parallel) + POOL_TIME
+    return run_time, memory
+
+
+def predict_modes(stats, workers=1):
+    """
+    Predict the time and memory of each candidate mode and flow solver.
+    Dense: the candidate edges of every (source, sink) pair, then one of the
+    exact flow solvers. Tiled: the candidate edges and the flow of the tile
+    windows (see network_attack.tiled_flow), for several tile sizes.
+    :param stats: output of design_stats().
+    :param workers: number of worker processes.
+    :return: a list of dictionaries with 'name', 'options' (solver options of
+    network_attack), 'exact' (the same cost as the dense attack), 'time'
+    (seconds) and 'memory' (bytes).
+    """
+    num_sources = stats['num_sources']
+    num_sinks = stats['num_sinks']
+    num_pairs = num_sources * num_sinks
+    fraction = candidate_fraction(stats['num_nets'])
+    num_edges = num_pairs * fraction
+    candidate_time = num_pairs * PAIR_TIME
+    candidate_memory = num_pairs * PAIR_MEMORY + num_edges * EDGE_MEMORY
+    modes = []
+    solvers = ['networkx', 'residual', 'auction', 'budget']
+    if num_sinks >= 2 * MULTILEVEL_TILE:
+        solvers.append('multilevel')
+    for solver in solvers:
+        run_time, memory = solver_cost(solver, num_edges, num_sinks, workers)
+        if solver == 'networkx':
+            options = {'solver': 'networkx'}
+        elif solver == 'residual':
+            options = {'solver': 'networkx', 'deadline': float('inf')}
+        elif solver == 'auction':
+            options = {'solver': 'auction'}
+        elif solver == 'budget':
+            options = {'candidate_budget': CANDIDATE_BUDGET}
+        else:
+            options = {'multilevel': MULTILEVEL_TILE}
+        modes.append({'name': 'dense + ' + solver, 'options': options,
+                      'exact': True, 'time': candidate_time + run_time,
+                      # the distance table is freed before the flow
+                      'memory': max(candidate_memory,
+                                    num_edges * EDGE_MEMORY + memory)})
+
+    width = stats['die_width']
+    height = stats['die_height']
+    area = max(1, width * height)
+    side = math.sqrt(area)
+    for splits in TILE_SPLITS:
+        tile_size = max(1, int(side / splits))
+        overlap = tile_size // 4
+        columns = max(1, int(math.ceil(width / float(tile_size))))
+        rows = max(1, int(math.ceil(height / float(tile_size))))
+        if columns * rows == 1:
+            continue
+        # the pins are spread evenly over the die area
+        window_area = min(width, tile_size + 2 * overlap) * \
+            min(height, tile_size + 2 * overlap)
+        share = window_area / float(area)
+        window_pairs = num_pairs * share * share
+        window_pins = (num_sources + num_sinks) * share
+        num_windows = columns * rows
+        parallel = min(workers, num_windows)
+        run_time = num_windows * (WINDOW_TIME + window_pins * WINDOW_PIN_TIME +
+                                  window_pairs * WINDOW_PAIR_TIME) / parallel
+        if parallel > 1:
+            run_time += POOL_TIME
+        window_memory = window_pairs * WINDOW_PAIR_MEMORY + \
+            stats['num_end_points'] * share * END_POINT_MEMORY
+        modes.append({'name': 'tiled ' + str(tile_size),
+                      'options': {'tile_size': tile_size,
+                                  'tile_overlap': overlap},
+                      'exact': False, 'time': run_time,
+                      'memory': (num_sources + num_sinks) * PIN_MEMORY +
+                      parallel * window_memory})
+    return modes
+
+
+def select_mode(modes, max_time=None, max_memory=None):
+    """
+    Select the mode to run within the time and memory limits. The exact
+    modes come first (the fastest one), then the tiled modes with the largest
+    tiles (the fewest missed edges). If no mode fits, the mode closest to
+    the limits is selected.
+    :param modes: output of predict_modes().
+    :param max_time: time limit in seconds (optional).
+    :param max_memory: memory limit in bytes (optional).
+    :return: the selected mode, and True if it fits the limits.
+    """
+    def overrun(mode):
+        ratio = 0
+        if max_time is not None:
+            ratio = max(ratio, mode['time'] / max_time)
+        if max_memory is not None:
+            ratio = max(ratio, mode['memory'] / float(max_memory))
+        return ratio
+
+    fitting = [mode for mode in modes if overrun(mode) <= 1]
+    exact = [mode for mode in fitting if mode['exact']]
+    if exact:
+        return min(exact, key=lambda mode: mode['time']), True
+    if fitting:
+        return max(fitting, key=lambda mode: (mode['options']['tile_size'],
+                                              -mode['time'])), True
+    return min(modes, key=overrun), False
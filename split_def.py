@@ -7,251 +7,45 @@ Date: August 2016
 from def_parser import *
 from lef_parser import *
 from util import *
+from load_util import load_inputs
+from pin_util import PinIndex
+from route_store import routes_points
+import copy
+import os
 
 
-def proper_layers(back_end, front_end, split_layer):
+def proper_layers(back_end, front_end, split_layer, ranks):
+    """
+    Get the layers that are kept.
+    :param ranks: layer ranks of the LEF (see util.layer_ranks).
+    :return: set of layer names.
+    """
     layers = set()
+    split_rank = ranks[split_layer]
     if back_end == False and front_end == False:
         return layers
     elif back_end == True and front_end == False:
-        for each in LAYERS:
-            if compare_metal(each, split_layer) >= 0:
+        for each in ranks:
+            if ranks[each] >= split_rank:
                 layers.add(each)
         return layers
     elif back_end == False and front_end == True:
-        for each in LAYERS:
-            if compare_metal(each, split_layer) < 0:
+        for each in ranks:
+            if ranks[each] < split_rank:
                 layers.add(each)
         return layers
     else:
-        return LAYERS
+        return set(ranks)
+
 
+# buffer size of the split DEF writer
+WRITE_BUFFER_SIZE = 1 << 20
 
 # names of back-end and front-end layers
 LAYERS = {"poly", "metal1", "metal2", "metal3", "metal4", "metal5", "metal6",
           "metal7", "metal8", "metal9", "metal10"}
 
 
-# outside function needed to output the NETS data selectively, because
-# possibly we need to check LEF data and that requires bigger scope.
-def output_nets(nets, def_info, lef_info):
-    """
-    Output the NETS section information with possible back end and front
-    end selections.
-    :param def_info: a DefParser object that contains DEF info.
-    :param lef_info: a LefParser object
-    :return: string
-    """
-    s = ""
-    # add each net's data to nets_str
-    nets_str = ""
-    num_nets = 0
-    for net in nets.nets:
-        net_data = output_net(net, def_info, lef_info)
-        if net_data != "":
-            nets_str += net_data
-            nets_str += "\n"
-            num_nets += 1
-    if num_nets > 0:
-        s += "NETS " + str(num_nets) + " ;\n"
-        s += nets_str
-        s += "END NETS"
-    return s
-
-
-def output_net_routes(net, def_info, lef_info):
-    """
-    Return None if there are no routes in the Net.
-    :param net: a Net object
-    :param def_info: a DefParser object that contains DEF info.
-    :param lef_info: a LefParser object
-    :return: routes if good route exists, None if no route available.
-    """
-    s = ""
-    # output routes
-    num_route = 0
-    first_route_done = False
-    for i in range(len(net.routed)):
-        if net.routed[i].get_layer() in GOOD_LAYERS:
-            num_route += 1
-            if first_route_done:
-                s += "    " + "NEW " + net.routed[i].to_def_format() + "\n"
-            else:
-                s += "  + ROUTED " + net.routed[i].to_def_format() + "\n"
-                first_route_done = True
-    if num_route == 0:
-        return "no route"
-    else:
-        return s
-
-
-def output_net(net, def_info, lef_info):
-    """
-    Output a Net object inside the NETS section information with possible back
-    end and front end selections.
-    :param def_info: a DefParser object that contains DEF info.
-    :param lef_info: a LefParser object
-    :return: string
-    """
-    # check number of routes and get the routes
-    routes = output_net_routes(net, def_info, lef_info)
-    if routes == "no route":
-        routes = ""
-    elif routes == -1:
-        return ""
-    # start setting up the string
-    s = ""
-    s += "- " + net.name + "\n"
-    s += " "
-    for each_comp in net.comp_pin:
-        # study each comp/pin
-        # if it's a pin, check the Pin object layer (already parsed)
-        if each_comp[0] == "PIN":
-            pin_name = each_comp[1]
-            if def_info.pins.get_pin(pin_name).get_metal_layer() in GOOD_LAYERS:
-                s += " ( " + " ".join(each_comp) + " )"
-        else:
-            # for component, need to check LEF info
-            comp_id = each_comp[0]
-            pin_name = each_comp[1]
-            comp = def_info.components.get_comp(comp_id).get_macro()
-            # print (comp)
-            # get info from LEF Parser
-            comp_info = lef_info.macro_dict[comp]
-            # get pin layer info
-            pin_info = comp_info.pin_dict[pin_name]
-            if pin_info.get_top_metal() in GOOD_LAYERS:
-                s += " ( " + " ".join(each_comp) + " )"
-    # output routes
-    s += "\n"
-    s += routes
-    s += " ;"
-    return s
-
-
-def output_comps(comps):
-    """
-    Method to write/output a component to the DEF file
-    :param comp: component to be written
-    :param def_info: DEF file data
-    :param lef_info: LEF file data
-    :return: a string that contains Components section in DEF format.
-    """
-    # assume all components are in bottom layers
-    if "metal1" in GOOD_LAYERS:
-        return comps.to_def_format()
-    else:
-        return ""
-
-
-def output_pin(pin, def_info):
-    """
-    Method to write/output a pin to the DEF file
-    :param pin: Pin object
-    :param def_info: DEF data
-    :return: a string that contains a Pin in DEF format.
-    """
-    # Note: all pins are available to the attacker.
-    # return pin.to_def_format()
-    if pin.get_metal_layer() in GOOD_LAYERS:
-        return pin.to_def_format()
-    else:
-        return pin.to_def_format()
-    #     s = ""
-    #     s += "- " + pin.name + " + NET " + pin.net
-    #     s += " + DIRECTION " + pin.direction + " + USE " + pin.use + "\n ;"
-    #     return s
-
-
-def output_pins(pins, def_info):
-    """
-    Method to write/output the PINS section to the DEF file.
-    :param pins: Pin object
-    :param def_info: DEF data
-    :return: a tring that contains the PINS section in DEF format
-    """
-    s = ""
-    num_pins = 0
-    pins_string = ""
-    for each_pin in pins.pins:
-        pin_data = output_pin(each_pin, def_info)
-        pins_string += pin_data
-        pins_string += "\n"
-        # all pins are observable by the attacker
-        # if each_pin.get_metal_layer() in GOOD_LAYERS:
-        num_pins += 1
-    # only write PINS section when we have > 0 pins
-    s = "PINS " + str(num_pins) + " ;\n"
-    s += pins_string
-    s += "END PINS"
-    return s
-
-
-def output_tracks(def_info):
-    """
-    Method to write/output TRACKS to DEF file.
-    :param def_info: DEF data
-    :return: a string that contains TRACKS info in DEF format.
-    """
-    s = ""
-    for track in def_info.tracks:
-        if track.get_layer() in GOOD_LAYERS:
-            s += track.to_def_format()
-            s += "\n"
-    return s
-
-
-def output_new_def(def_info, lef_info):
-    """
-    Output DEF data to new DEF file with selected metal layers.
-    :param def_info: DEF data
-    :param lef_info: LEF data
-    :return: a string that contains new DEF data in DEF format.
-    """
-    s = ""
-    s += "#  Generated by tricao@utdallas.edu for testing only.\n"
-    s += "#  Included Metal Layers:"
-    for each in GOOD_LAYERS:
-        s += " " + each
-    s += "\n\n"
-    s += "VERSION " + def_info.version + " ;" + "\n"
-    s += "DIVIDERCHAR " + def_info.dividerchar + " ;" + "\n"
-    s += "BUSBITCHARS " + def_info.busbitchars + " ;" + "\n"
-    s += "DESIGN " + def_info.design_name + " ;" + "\n"
-    s += "UNITS DISTANCE " + def_info.units + " " + def_info.scale + " ;" + "\n"
-    s += "\n"
-    props = def_info.property
-    s += props.to_def_format()
-    s += "\n"
-    s += "DIEAREA"
-    s += (
-    " ( " + str(def_info.diearea[0][0]) + " " + str(def_info.diearea[0][1]) +
-    " )")
-    s += (
-    " ( " + str(def_info.diearea[1][0]) + " " + str(def_info.diearea[1][1]) +
-    " )" + " ;")
-    s += "\n\n"
-    for each_row in def_info.rows:
-        s += each_row.to_def_format()
-        s += "\n"
-    s += "\n"
-    s += output_tracks(def_info)
-    s += "\n"
-    for each_gcell in def_info.gcellgrids:
-        s += each_gcell.to_def_format()
-        s += "\n"
-    s += "\n"
-    comps = def_parser.components
-    s += output_comps(comps)
-    s += "\n\n"
-    pins = def_parser.pins
-    s += output_pins(pins, def_info)
-    s += "\n\n"
-    nets = def_parser.nets
-    s += output_nets(nets, def_info, lef_info)
-    return s
-
-
 def to_bool(str):
     if str.lower() == "false":
         return False
@@ -280,125 +74,412 @@ def connected_primary_pin_route(pin, route, def_data):
     return False
 
 
-def connected_cell_pin_routed(pin, route, def_data, lef_data):
+def routed_cell_pins(routes, pin_index, pin_layer):
     """
-    Check if a route connects to a cell pin.
-    :param pin:
-    :param route:
-    :param def_data:
-    :param lef_data:
-    :return: True or False
+    Find the cell pins connected to a group of routes. Only the pin layer
+    (metal1) and via_1 can connect to a cell pin: a route on the pin layer is
+    matched at each of its points, a higher route only at the location of its
+    via_1. The pin shapes on other layers are not used.
+    :param routes: list of routes.
+    :param pin_index: pin_util.PinIndex of the design.
+    :param pin_layer: name of the pin layer (the layer of rank 1).
+    :return: set of (component name, pin name).
     """
-    # check for end_via of the route
-    # only via_1 can connect to a cell pin, or the wire is metal1.
-    end_via = route.end_via
-    end_via_loc = route.end_via_loc
-    if (end_via and end_via[:4] != 'via1') and route.layer != 'metal1':
-        return False
-    # get pin data from LEF
-    comp = def_parser.components.comp_dict[pin[0]]
-    macro_name = comp.macro
-    macro_data = lef_data.macro_dict[macro_name]
-    pin_data = macro_data.pin_dict[pin[1]]
-
-    # method 2: check if the wire or via is inside the cell, because I guess
-    # a net usually connects only one pin of a cell.
-    macro_size = macro_data.size
-    cell_loc = comp.placed
-    corners = [cell_loc, [cell_loc[0] + macro_size[0] * SCALE, cell_loc[1] + macro_size[1] * SCALE]]
-    for each_pt in route.points:
-        if inside_area(each_pt, corners):
-            return True
-    return False
-
-
-def split_net(def_data, lef_data, split_layer):
+    pins = set()
+    for each_route, points in zip(routes, routes_points(routes)):
+        if each_route.rank == 1:
+            for each_pt in points:
+                pins |= pin_index.pins_at(each_pt[0], each_pt[1], pin_layer)
+        elif each_route.end_via and each_route.end_via[:4] == 'via1':
+            via_loc = each_route.end_via_loc
+            pins |= pin_index.pins_at(via_loc[0], via_loc[1], pin_layer)
+    return pins
+
+
+class Splitter:
     """
-    Modify the DEF data to split the net affected by split manufacturing.
-    :param def_data: a DefParser instantiation.
-    :param lef_data
-    :param split_layer: the split layer, e.g. metal3.
-    :return: void
+    Splitter splits a layout for split manufacturing. It stores the layer
+    selection and the design data, so there is no global state and many
+    split jobs (different designs or different split layers) can run at the
+    same time in one process.
     """
-    split_num = int(split_layer[-1])
-    via_split = 'via' + str(split_num - 1)
-    nets = def_data.nets
-    net_dict = nets.net_dict
-    new_nets = []
-    new_net_dict = {}
-    for each_net in nets.nets:
-        if each_net.top_layer in GOOD_LAYERS:
-            # add the net to a list of good nets.
-            new_nets.append(each_net)
-            new_net_dict[each_net.name] = each_net
-        else:
-            # find the routes that belong to FEOL
+
+    def __init__(self, def_data, lef_data, split_layer, back_end=False,
+                 front_end=True):
+        """
+        :param def_data: a DefParser object of the original layout.
+        :param lef_data: a LefParser object
+        :param split_layer: the split layer, e.g. metal3.
+        :param back_end: keep the layers from the split layer and above.
+        :param front_end: keep the layers below the split layer.
+        """
+        self.def_data = def_data
+        self.lef_data = lef_data
+        self.split_layer = split_layer
+        self.back_end = back_end
+        self.front_end = front_end
+        # layer ranks of the LEF (see util.layer_ranks)
+        self.layer_ranks = lef_data.layer_ranks
+        if def_data.layer_ranks is None:
+            # the DEF data was not loaded by load_inputs
+            def_data.rank_layers(self.layer_ranks)
+        # names of the layers that we keep
+        self.good_layers = proper_layers(back_end, front_end, split_layer,
+                                         self.layer_ranks)
+        # bit mask of the ranks of the good layers (see util.layer_mask)
+        self.good_mask = layer_mask(self.good_layers, self.layer_ranks)
+        # absolute pin shapes, built by the first split
+        self.pin_index = None
+
+    def split(self):
+        """
+        Split the layout in memory. The original DEF data is not changed.
+        The result only contains the routes, comp/pins and tracks in the
+        selected metal layers, so it is the same as what we get by parsing the
+        output of output_new_def(), and the attack can use it directly.
+        :return: a new DefParser object with the split layout.
+        """
+        def_data = self.def_data
+        new_nets = self.split_net()
+        self.filter_layers(new_nets)
+        new_tracks = []
+        for track in def_data.tracks:
+            if self.good_layer(track.get_layer()):
+                new_tracks.append(track)
+        # shallow copy, the other sections are shared with the original
+        split_data = copy.copy(def_data)
+        split_data.nets = new_nets
+        split_data.tracks = new_tracks
+        split_data.sections = []
+        for sec in def_data.sections:
+            if sec.type == "NETS_DEF":
+                split_data.sections.append(new_nets)
+            else:
+                split_data.sections.append(sec)
+        return split_data
+
+    def split_net(self):
+        """
+        Split the nets affected by split manufacturing.
+        :return: a new Nets object.
+        """
+        def_data = self.def_data
+        split_layer = self.split_layer
+        good_mask = self.good_mask
+        split_rank = self.layer_ranks[split_layer]
+        via_split = 'via' + str(split_rank - 1)
+        # the routing layer under the split layer
+        below_layer = rank_layer(self.layer_ranks, split_rank - 1)
+        # the cell pins are on the lowest routing layer
+        pin_layer = rank_layer(self.layer_ranks, 1)
+        nets = def_data.nets
+        new_nets = Nets(nets.num_nets)
+        if self.pin_index is None:
+            self.pin_index = PinIndex(def_data, self.lef_data)
+        pin_index = self.pin_index
+        for each_net in nets.nets:
+            if (good_mask >> each_net.top_rank) & 1:
+                # add a copy of the net to the list of good nets.
+                new_net = Net(each_net.name)
+                new_net.comp_pin = list(each_net.comp_pin)
+                new_net.routed = list(each_net.routed)
+                new_net.top_layer = each_net.top_layer
+                new_net.top_rank = each_net.top_rank
+                new_nets.nets.append(new_net)
+                new_nets.net_dict[new_net.name] = new_net
+            else:
+                # find the routes that belong to FEOL
+                new_routed = []
+                for each_route in each_net.routed:
+                    if (good_mask >> each_route.rank) & 1:
+                        new_routed.append(each_route)
+                    elif each_route.end_via and each_route.end_via[:4] == via_split:
+                        # we can still see the via
+                        # we need to create a new route that has only the via
+                        a_route = Routed()
+                        a_route.layer = below_layer
+                        a_route.rank = split_rank - 1
+                        a_route.end_via = each_route.end_via
+                        a_route.end_via_loc = each_route.end_via_loc
+                        a_route.points.append(a_route.end_via_loc)
+                        new_routed.append(a_route)
+                # find the groups of connected routes
+                union = [i for i in range(len(new_routed))]
+                # the points of the stored routes are read at once
+                points = routes_points(new_routed)
+                for i in range(len(new_routed) - 1):
+                    for j in range(i + 1, len(new_routed)):
+                        if connected_points(points[i], points[j]):
+                            # need to change the union of all routes that has the
+                            # value of union[j]
+                            temp = union[j]
+                            for k in range(len(union)):
+                                if union[k] == temp:
+                                    union[k] = union[i]
+                groups = {}
+                for i in range(len(new_routed)):
+                    if union[i] not in groups:
+                        groups[union[i]] = [new_routed[i]]
+                    else:
+                        groups[union[i]].append(new_routed[i])
+
+                # now find the comp/pin for each union
+                comp_pin = each_net.comp_pin
+                comp_pin_groups = {}
+                for each in groups:
+                    comp_pin_groups[each] = []
+                    each_group = groups[each]
+                    cell_pins = routed_cell_pins(each_group, pin_index,
+                                                 pin_layer)
+                    for each_comp_pin in comp_pin:
+                        if each_comp_pin[0] == 'PIN':
+                            for each_route in each_group:
+                                # find connection with a primary pin
+                                if connected_primary_pin_route(each_comp_pin, each_route, def_data):
+                                    comp_pin_groups[each].append(each_comp_pin)
+                        elif tuple(each_comp_pin) in cell_pins:
+                            # connection with a cell pin
+                            if not each_comp_pin in comp_pin_groups[each]:
+                                comp_pin_groups[each].append(each_comp_pin)
+
+                # Now create new nets
+                net_name = each_net.name
+                for each in groups:
+                    new_name = net_name + '_' + str(each)
+                    new_net = Net(new_name)
+                    new_net.comp_pin = comp_pin_groups[each]
+                    new_net.routed = groups[each]
+                    new_nets.nets.append(new_net)
+                    new_nets.net_dict[new_name] = new_net
+                    new_net.find_top_layer(self.layer_ranks)
+        new_nets.num_nets = len(new_nets.nets)
+        return new_nets
+
+    def good_layer(self, layer):
+        """
+        Check if a layer is one of the selected metal layers.
+        :param layer: layer name.
+        :return: True or False
+        """
+        rank = self.layer_ranks.get(layer)
+        return rank is not None and (self.good_mask >> rank) & 1 == 1
+
+    def filter_layers(self, nets):
+        """
+        Remove the routes and comp/pins that are not in the selected metal
+        layers from the nets.
+        :param nets: a Nets object returned by split_net().
+        :return: void
+        """
+        good_mask = self.good_mask
+        for each_net in nets.nets:
             new_routed = []
             for each_route in each_net.routed:
-                if each_route.layer in GOOD_LAYERS:
+                if (good_mask >> each_route.rank) & 1:
                     new_routed.append(each_route)
-                elif each_route.end_via and each_route.end_via[:4] == via_split:
-                    # we can still see the via
-                    # we need to create a new route that has only the via
-                    a_route = Routed()
-                    a_route.layer = 'metal' + str(split_num - 1)
-                    a_route.end_via = each_route.end_via
-                    a_route.end_via_loc = each_route.end_via_loc
-                    a_route.points.append(a_route.end_via_loc)
-                    new_routed.append(a_route)
-            # find the groups of connected routes
-            union = [i for i in range(len(new_routed))]
-            for i in range(len(new_routed) - 1):
-                for j in range(i + 1, len(new_routed)):
-                    if connected_routes(new_routed[i], new_routed[j]):
-                        # need to change the union of all routes that has the
-                        # value of union[j]
-                        temp = union[j]
-                        for k in range(len(union)):
-                            if union[k] == temp:
-                                union[k] = union[i]
-            groups = {}
-            for i in range(len(new_routed)):
-                if union[i] not in groups:
-                    groups[union[i]] = [new_routed[i]]
+            each_net.routed = new_routed
+            new_comp_pin = []
+            for each_comp in each_net.comp_pin:
+                if self.good_comp_pin(each_comp, self.def_data):
+                    new_comp_pin.append(each_comp)
+            each_net.comp_pin = new_comp_pin
+            each_net.find_top_layer(self.layer_ranks)
+
+    # the output methods are here because possibly we need to check LEF data
+    # and that requires bigger scope.
+    # They write straight to a file object (a buffered file or a StringIO),
+    # so we never build the whole DEF as one string.
+    def output_nets(self, nets, def_info, f):
+        """
+        Output the NETS section information with possible back end and front
+        end selections.
+        :param nets: a Nets object
+        :param def_info: a DefParser object that contains DEF info.
+        :param f: file object to write to, must support tell() and seek().
+        :return: void
+        """
+        if len(nets.nets) == 0:
+            return
+        # the number of nets written is not known yet, so we write a
+        # placeholder that is wide enough and patch it at the end.
+        width = len(str(len(nets.nets)))
+        f.write("NETS ")
+        count_pos = f.tell()
+        f.write(" " * width + " ;\n")
+        num_nets = 0
+        for net in nets.nets:
+            if self.output_net(net, def_info, f):
+                num_nets += 1
+        f.write("END NETS")
+        end_pos = f.tell()
+        f.seek(count_pos)
+        f.write(str(num_nets).ljust(width))
+        f.seek(end_pos)
+
+    def output_net_routes(self, net, def_info, f):
+        """
+        Write the routes of a Net that are in the selected metal layers.
+        :param net: a Net object
+        :param def_info: a DefParser object that contains DEF info.
+        :param f: file object to write to.
+        :return: number of routes written.
+        """
+        num_route = 0
+        for each_route in net.routed:
+            if (self.good_mask >> each_route.rank) & 1:
+                if num_route > 0:
+                    f.write("    NEW " + each_route.to_def_format() + "\n")
                 else:
-                    groups[union[i]].append(new_routed[i])
-
-            # now find the comp/pin for each union
-            comp_pin = each_net.comp_pin
-            comp_pin_groups = {}
-            for each in groups:
-                comp_pin_groups[each] = []
-                each_group = groups[each]
-                for each_comp_pin in comp_pin:
-                    for each_route in each_group:
-                        if each_comp_pin[0] == 'PIN':
-                            # find connection with a primary pin
-                            if connected_primary_pin_route(each_comp_pin, each_route, def_data):
-                                comp_pin_groups[each].append(each_comp_pin)
-                        else:
-                            # find connection with a cell pin
-                            if connected_cell_pin_routed(each_comp_pin, each_route, def_data, lef_data):
-                                if not each_comp_pin in comp_pin_groups[each]:
-                                    comp_pin_groups[each].append(each_comp_pin)
-                # print(comp_pin_groups[each])
-
-            # Now create new nets
-            net_name = each_net.name
-            for each in groups:
-                new_name = net_name + '_' + str(each)
-                new_net = Net(new_name)
-                new_net.comp_pin = comp_pin_groups[each]
-                # print(new_net.comp_pin)
-                new_net.routed = groups[each]
-                # print(new_net.routed)
-                new_nets.append(new_net)
-                new_net_dict[new_name] = new_net
-                new_net.find_top_layer()
-
-    # Change the nets list in the DEF
-    nets.nets = new_nets
-    nets.net_dict = new_net_dict
+                    f.write("  + ROUTED " + each_route.to_def_format() + "\n")
+                num_route += 1
+        return num_route
+
+    def good_comp_pin(self, comp_pin, def_info):
+        """
+        Check if a comp/pin of a net belongs to the selected metal layers.
+        :param comp_pin: a comp/pin pair, e.g. ['PIN', 'N1'] or ['U1', 'A'].
+        :param def_info: a DefParser object that contains DEF info.
+        :return: True or False
+        """
+        # if it's a pin, check the Pin object layer (already parsed)
+        if comp_pin[0] == "PIN":
+            pin_name = comp_pin[1]
+            return self.good_layer(def_info.pins.get_pin(pin_name).get_metal_layer())
+        # for component, need to check LEF info
+        comp_id = comp_pin[0]
+        pin_name = comp_pin[1]
+        comp = def_info.components.get_comp(comp_id).get_macro()
+        # get info from LEF Parser
+        comp_info = self.lef_data.macro_dict[comp]
+        # get pin layer info
+        pin_info = comp_info.pin_dict[pin_name]
+        return self.good_layer(pin_info.get_top_metal(self.layer_ranks))
+
+    def output_net(self, net, def_info, f):
+        """
+        Output a Net object inside the NETS section information with possible
+        back end and front end selections.
+        :param net: a Net object
+        :param def_info: a DefParser object that contains DEF info.
+        :param f: file object to write to.
+        :return: True if the net is written.
+        """
+        s = "- " + net.name + "\n"
+        s += " "
+        for each_comp in net.comp_pin:
+            if self.good_comp_pin(each_comp, def_info):
+                s += " ( " + " ".join(each_comp) + " )"
+        s += "\n"
+        f.write(s)
+        # output routes
+        self.output_net_routes(net, def_info, f)
+        f.write(" ;\n")
+        return True
+
+    def output_comps(self, comps, f):
+        """
+        Method to write/output the COMPONENTS section to the DEF file
+        :param comps: Components object
+        :param f: file object to write to.
+        :return: void
+        """
+        # assume all components are in bottom layers
+        if (self.good_mask >> 1) & 1:
+            f.write("COMPONENTS " + str(comps.num_comps) + " ;\n")
+            for each_comp in comps.comps:
+                f.write(each_comp.to_def_format() + "\n")
+            f.write("END COMPONENTS")
+
+    def output_pin(self, pin, def_info):
+        """
+        Method to write/output a pin to the DEF file
+        :param pin: Pin object
+        :param def_info: DEF data
+        :return: a string that contains a Pin in DEF format.
+        """
+        # Note: all pins are available to the attacker.
+        return pin.to_def_format()
+
+    def output_pins(self, pins, def_info, f):
+        """
+        Method to write/output the PINS section to the DEF file.
+        :param pins: Pins object
+        :param def_info: DEF data
+        :param f: file object to write to.
+        :return: void
+        """
+        # all pins are observable by the attacker
+        f.write("PINS " + str(len(pins.pins)) + " ;\n")
+        for each_pin in pins.pins:
+            f.write(self.output_pin(each_pin, def_info) + "\n")
+        f.write("END PINS")
+
+    def output_tracks(self, def_info, f):
+        """
+        Method to write/output TRACKS to DEF file.
+        :param def_info: DEF data
+        :param f: file object to write to.
+        :return: void
+        """
+        for track in def_info.tracks:
+            if self.good_layer(track.get_layer()):
+                f.write(track.to_def_format() + "\n")
+
+    def output_new_def(self, def_info, f):
+        """
+        Output DEF data to new DEF file with selected metal layers.
+        :param def_info: DEF data, usually the result of split().
+        :param f: file object to write to, must support tell() and seek().
+        :return: void
+        """
+        s = ""
+        s += "#  Generated by tricao@utdallas.edu for testing only.\n"
+        s += "#  Included Metal Layers:"
+        for each in self.good_layers:
+            s += " " + each
+        s += "\n\n"
+        s += "VERSION " + def_info.version + " ;" + "\n"
+        s += "DIVIDERCHAR " + def_info.dividerchar + " ;" + "\n"
+        s += "BUSBITCHARS " + def_info.busbitchars + " ;" + "\n"
+        s += "DESIGN " + def_info.design_name + " ;" + "\n"
+        s += "UNITS DISTANCE " + def_info.units + " " + def_info.scale + " ;" + "\n"
+        s += "\n"
+        props = def_info.property
+        s += props.to_def_format()
+        s += "\n"
+        s += "DIEAREA"
+        s += (
+        " ( " + str(def_info.diearea[0][0]) + " " + str(def_info.diearea[0][1]) +
+        " )")
+        s += (
+        " ( " + str(def_info.diearea[1][0]) + " " + str(def_info.diearea[1][1]) +
+        " )" + " ;")
+        s += "\n\n"
+        f.write(s)
+        for each_row in def_info.rows:
+            f.write(each_row.to_def_format() + "\n")
+        f.write("\n")
+        self.output_tracks(def_info, f)
+        f.write("\n")
+        for each_gcell in def_info.gcellgrids:
+            f.write(each_gcell.to_def_format() + "\n")
+        f.write("\n")
+        self.output_comps(def_info.components, f)
+        f.write("\n\n")
+        self.output_pins(def_info.pins, def_info, f)
+        f.write("\n\n")
+        self.output_nets(def_info.nets, def_info, f)
+
+    def write_def(self, def_info, def_file):
+        """
+        Write the DEF data with selected metal layers to a new DEF file.
+        :param def_info: DEF data, usually the result of split().
+        :param def_file: path of the new DEF file.
+        :return: void
+        """
+        f = open(def_file, "w", buffering=WRITE_BUFFER_SIZE)
+        self.output_new_def(def_info, f)
+        f.close()
 
 
 # Main Class
@@ -466,23 +547,18 @@ if __name__ == '__main__':
     else:
         print("The program will use the last setup listed above.")
 
-    # need to know what layers are good for the current back-end and
-    # front-end settings
-    GOOD_LAYERS = proper_layers(BACK_END, FRONT_END, SPLIT_LAYER)
-
     print()
     # lef_file = "./c17_example/NangateOpenCellLibrary.lef"
-    lef_parser = LefParser(LEF_FILE)
-    lef_parser.parse()
-    print()
-    def_file = INPUT_FILE
-    def_parser = DefParser(def_file)
-    def_parser.parse()
+    # the LEF file is scanned while the DEF file is parsed
+    lef_parser, def_parser, lib_data = load_inputs(LEF_FILE, INPUT_FILE,
+                                                   workers=os.cpu_count())
 
-    split_net(def_parser, lef_parser, SPLIT_LAYER)
+    # the splitter knows what layers are good for the current back-end and
+    # front-end settings
+    splitter = Splitter(def_parser, lef_parser, SPLIT_LAYER, BACK_END,
+                        FRONT_END)
+    split_data = splitter.split()
 
     print("Writing data to new DEF file with path: " + OUTPUT_FILE)
-    out_file = open(OUTPUT_FILE, "w+")
-    out_file.write(output_new_def(def_parser, lef_parser))
-    out_file.close()
+    splitter.write_def(split_data, OUTPUT_FILE)
     print("Writing data done.")
@@ -0,0 +1,53 @@
+"""
+Tests of the auction solver, checked against the residual graph solver
+Author: Tri Minh Cao
+Email: tricao@utdallas.edu
+Date: December 2016
+"""
+from auction_util import auction_assignment
+from flow_util import optimal_network
+from network_attack import solve_flow
+import random
+
+
+def check_auction(num_sources, num_sinks, edges, caps):
+    used, cost = auction_assignment(num_sources, num_sinks, edges, caps)[:2]
+    network, edge_ids = optimal_network(num_sources, num_sinks, edges, caps)
+    value = sum(network.flow(e) for e in edge_ids)
+    assert len(used) == value
+    assert cost == network.total_cost()
+    assert sum(edges[k][2] for k in used) == cost
+    for i in range(num_sources):
+        assert sum(1 for k in used if edges[k][0] == i) <= caps[i]
+    return used
+
+
+def test_auction_zero_capacity_source():
+    # source 0 has candidate edges but no capacity
+    edges = [(0, 0, 1), (1, 0, 2), (0, 1, 3)]
+    used = check_auction(2, 2, edges, [0, 2])
+    assert used == [1]
+
+
+def test_solve_flow_auction_zero_capacity_source():
+    source_pins = [('U1', 'ZN'), ('U2', 'ZN')]
+    sink_pins = [('U3', 'A'), ('U4', 'A')]
+    edges = [(0, 0, 1), (1, 0, 2), (0, 1, 3), (1, 1, 5)]
+    results = []
+    for solver in ['networkx', 'auction']:
+        stats = {}
+        connections, cost = solve_flow(source_pins, sink_pins, edges, stats,
+                                       {'solver': solver}, None, [0, 1])
+        results.append(cost)
+    assert results[0] == results[1] == 2
+
+
+def test_auction_random_capacities():
+    rand = random.Random(1)
+    for each in range(200):
+        num_sources = rand.randint(1, 4)
+        num_sinks = rand.randint(1, 5)
+        edges = [(i, j, rand.randint(0, 15)) for i in range(num_sources)
+                 for j in range(num_sinks) if rand.random() < 0.6]
+        caps = [rand.randint(0, 3) for i in range(num_sources)]
+        check_auction(num_sources, num_sinks, edges, caps)
@@ -0,0 +1,58 @@
+"""
+Tests of the flow solvers, checked against a brute force solution
+Author: Tri Minh Cao
+Email: tricao@utdallas.edu
+Date: December 2016
+"""
+from flow_util import ban_costs, optimal_network, used_edges
+import random
+
+
+def solve(num_sources, num_sinks, edges, caps):
+    network, edge_ids = optimal_network(num_sources, num_sinks, edges, caps)
+    value = sum(network.flow(e) for e in edge_ids)
+    return network, edge_ids, value, network.total_cost()
+
+
+def brute_ban_costs(num_sources, num_sinks, edges, caps, used):
+    """
+    Ban each used edge and solve the flow again.
+    :return: a dictionary, edge index -> cost increase (None if the flow
+    value drops).
+    """
+    network, edge_ids, value, cost = solve(num_sources, num_sinks, edges,
+                                           caps)
+    costs = {}
+    for k in used:
+        rest = edges[:k] + edges[k + 1:]
+        new_value, new_cost = solve(num_sources, num_sinks, rest, caps)[2:]
+        costs[k] = None if new_value < value else new_cost - cost
+    return costs
+
+
+def check_ban_costs(num_sources, num_sinks, edges, caps):
+    network, edge_ids = solve(num_sources, num_sinks, edges, caps)[:2]
+    used = used_edges(network, edge_ids)
+    costs = ban_costs(network, edge_ids, used)
+    assert costs == brute_ban_costs(num_sources, num_sinks, edges, caps, used)
+    return costs
+
+
+def test_ban_costs_path_back_to_s():
+    # the cheapest replacement of edge 4 goes back to s through other nodes,
+    # not through the edge s -> source 1
+    edges = [(0, 0, 7), (0, 1, 12), (1, 0, 0), (1, 1, 8), (1, 2, 1), (1, 3, 4),
+             (2, 2, 15), (2, 3, 2)]
+    costs = check_ban_costs(3, 4, edges, [2, 1, 3])
+    assert costs[4] == 7
+
+
+def test_ban_costs_random():
+    rand = random.Random(1)
+    for each in range(300):
+        num_sources = rand.randint(1, 4)
+        num_sinks = rand.randint(1, 5)
+        edges = [(i, j, rand.randint(0, 15)) for i in range(num_sources)
+                 for j in range(num_sinks) if rand.random() < 0.6]
+        caps = [rand.randint(0, 3) for i in range(num_sources)]
+        check_ban_costs(num_sources, num_sinks, edges, caps)
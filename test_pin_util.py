@@ -0,0 +1,172 @@
+"""
+Tests of the pin shape index, checked against the DEF orientations
+Author: Tri Minh Cao
+Email: tricao@utdallas.edu
+Date: December 2016
+"""
+from def_parser import DefParser
+from def_util import Routed
+from lef_parser import LefParser
+from pin_util import ORIENTS, PinIndex, orient_points
+from split_def import routed_cell_pins
+import numpy as np
+
+LEF = """VERSION 5.5 ;
+UNITS
+  DATABASE MICRONS 2000 ;
+END UNITS
+
+LAYER metal1
+  TYPE ROUTING ;
+  WIDTH 0.07 ;
+END metal1
+
+LAYER via1
+  TYPE CUT ;
+END via1
+
+LAYER metal2
+  TYPE ROUTING ;
+  WIDTH 0.07 ;
+END metal2
+
+MACRO BUF_X1
+  CLASS core ;
+  ORIGIN 0 0 ;
+  SIZE 0.4 BY 1.4 ;
+  PIN A
+    DIRECTION INPUT ;
+    PORT
+      LAYER metal1 ;
+        RECT 0.05 0.2 0.15 0.4 ;
+    END
+  END A
+  PIN Z
+    DIRECTION OUTPUT ;
+    PORT
+      LAYER metal2 ;
+        RECT 0.25 1.0 0.35 1.3 ;
+    END
+  END Z
+END BUF_X1
+
+END LIBRARY
+"""
+
+# size of BUF_X1 and the shape of its pin A in DEF units
+WIDTH = 800
+HEIGHT = 2800
+PIN_A = [100, 400, 300, 800]
+
+
+def reference_point(orient, x, y):
+    """
+    Rotate and flip a point of the macro as in the DEF reference: FN is the
+    mirror about the y axis, W is a counterclockwise rotation by 90 degrees,
+    and the lower left corner of the transformed macro is the PLACED point.
+    """
+    def transform(px, py):
+        if orient[0] == 'F':
+            px = -px
+        if orient[-1] == 'S':
+            return -px, -py
+        if orient[-1] == 'W':
+            return -py, px
+        if orient[-1] == 'E':
+            return py, -px
+        return px, py
+    corners = [transform(px, py) for px in (0, WIDTH) for py in (0, HEIGHT)]
+    x, y = transform(x, y)
+    return (x - min(pt[0] for pt in corners),
+            y - min(pt[1] for pt in corners))
+
+
+def reference_rect(orient, rect, placed):
+    x0, y0 = reference_point(orient, rect[0], rect[1])
+    x1, y1 = reference_point(orient, rect[2], rect[3])
+    return [min(x0, x1) + placed[0], min(y0, y1) + placed[1],
+            max(x0, x1) + placed[0], max(y0, y1) + placed[1]]
+
+
+def make_design(tmpdir):
+    """
+    Place one BUF_X1 in each orientation, component Uk at (10000 * k, 0).
+    """
+    lef_file = tmpdir.join('test.lef')
+    lef_file.write(LEF)
+    lines = ['VERSION 5.7 ;', 'DESIGN test ;',
+             'UNITS DISTANCE MICRONS 2000 ;',
+             'DIEAREA ( 0 0 ) ( 100000 10000 ) ;',
+             'COMPONENTS ' + str(len(ORIENTS)) + ' ;']
+    for k, orient in enumerate(ORIENTS):
+        lines.append('- U' + str(k) + ' BUF_X1 + PLACED ( ' +
+                     str(10000 * k) + ' 0 ) ' + orient)
+        lines.append(' ;')
+    lines += ['END COMPONENTS', 'END DESIGN']
+    def_file = tmpdir.join('test.def')
+    def_file.write('\n'.join(lines) + '\n')
+    lef_data = LefParser(str(lef_file))
+    lef_data.parse()
+    def_data = DefParser(str(def_file))
+    def_data.parse()
+    return def_data, lef_data
+
+
+def test_orient_points():
+    points = [(0, 0), (100, 400), (300, 800), (WIDTH, HEIGHT)]
+    for orient in ORIENTS:
+        codes = np.array([ORIENTS[orient]] * len(points))
+        x, y = orient_points(codes, np.array([pt[0] for pt in points]),
+                             np.array([pt[1] for pt in points]),
+                             np.array([WIDTH] * len(points)),
+                             np.array([HEIGHT] * len(points)))
+        for k, pt in enumerate(points):
+            assert (x[k], y[k]) == reference_point(orient, pt[0], pt[1])
+
+
+def test_pin_shapes_orientations(tmpdir):
+    def_data, lef_data = make_design(tmpdir)
+    pin_index = PinIndex(def_data, lef_data)
+    for k, orient in enumerate(ORIENTS):
+        shapes = pin_index.pin_shapes('U' + str(k), 'A')
+        assert shapes.tolist() == [reference_rect(orient, PIN_A,
+                                                  (10000 * k, 0))]
+        # the center of the shape finds the pin, on its own layer only
+        rect = reference_rect(orient, PIN_A, (10000 * k, 0))
+        x = (rect[0] + rect[2]) / 2
+        y = (rect[1] + rect[3]) / 2
+        assert pin_index.pins_at(x, y) == {('U' + str(k), 'A')}
+        assert pin_index.pins_at(x, y, 'metal1') == {('U' + str(k), 'A')}
+        assert pin_index.pins_at(x, y, 'metal2') == set()
+
+
+def make_route(layer, rank, points, end_via=None):
+    route = Routed()
+    route.layer = layer
+    route.rank = rank
+    route.points = points
+    if end_via:
+        route.end_via = end_via
+        route.end_via_loc = points[-1]
+    return route
+
+
+def test_routed_cell_pins_layers(tmpdir):
+    def_data, lef_data = make_design(tmpdir)
+    pin_index = PinIndex(def_data, lef_data)
+    # U0 is placed N at (0, 0): pin A is (100, 400) (300, 800) on metal1
+    # a metal2 wire that starts over pin A and ends away from it in via1
+    route = make_route('metal2', 2, [[200, 600], [200, 5000]], 'via1_4')
+    assert routed_cell_pins([route], pin_index, 'metal1') == set()
+    # the via1 of the metal2 wire lands on pin A
+    route = make_route('metal2', 2, [[200, 5000], [200, 600]], 'via1_4')
+    assert routed_cell_pins([route], pin_index, 'metal1') == {('U0', 'A')}
+    # a metal2 wire without a via1 does not reach pin A
+    route = make_route('metal2', 2, [[200, 5000], [200, 600]])
+    assert routed_cell_pins([route], pin_index, 'metal1') == set()
+    # a metal1 wire touches pin A with any of its points
+    route = make_route('metal1', 1, [[200, 600], [200, 5000]])
+    assert routed_cell_pins([route], pin_index, 'metal1') == {('U0', 'A')}
+    # pin Z is on metal2 and is not a cell pin of the routes
+    route = make_route('metal1', 1, [[500, 2200], [500, 5000]])
+    assert routed_cell_pins([route], pin_index, 'metal1') == set()
@@ -0,0 +1,129 @@
+"""
+Tests of the layer ranks of the DEF routes and of the in-memory split
+Author: Tri Minh Cao
+Email: tricao@utdallas.edu
+Date: December 2016
+"""
+from def_parser import DefParser
+from lef_parser import LefParser
+from split_def import Splitter
+import pytest
+
+# the layers are not named metalN, their order comes from the LEF file
+LEF = """VERSION 5.5 ;
+UNITS
+  DATABASE MICRONS 2000 ;
+END UNITS
+
+LAYER M1
+  TYPE ROUTING ;
+  WIDTH 0.07 ;
+END M1
+
+LAYER via1
+  TYPE CUT ;
+END via1
+
+LAYER M2
+  TYPE ROUTING ;
+  WIDTH 0.07 ;
+END M2
+
+LAYER via2
+  TYPE CUT ;
+END via2
+
+LAYER M3
+  TYPE ROUTING ;
+  WIDTH 0.07 ;
+END M3
+
+MACRO BUF_X1
+  CLASS core ;
+  ORIGIN 0 0 ;
+  SIZE 0.4 BY 1.4 ;
+  PIN A
+    DIRECTION INPUT ;
+    PORT
+      LAYER M1 ;
+        RECT 0.05 0.2 0.15 0.4 ;
+    END
+  END A
+  PIN Z
+    DIRECTION OUTPUT ;
+    PORT
+      LAYER M1 ;
+        RECT 0.25 1.0 0.35 1.3 ;
+    END
+  END Z
+END BUF_X1
+
+END LIBRARY
+"""
+
+DEF = """VERSION 5.7 ;
+DESIGN test ;
+UNITS DISTANCE MICRONS 2000 ;
+DIEAREA ( 0 0 ) ( 20000 10000 ) ;
+COMPONENTS 2 ;
+- U0 BUF_X1 + PLACED ( 0 0 ) N
+ ;
+- U1 BUF_X1 + PLACED ( 10000 0 ) N
+ ;
+END COMPONENTS
+NETS 2 ;
+- n0
+  ( U0 Z ) ( U1 A )
+  + ROUTED M1 ( 600 2200 ) via1_4
+    NEW M2 ( 600 2200 ) ( 600 5000 ) via2_8
+    NEW M3 ( 600 5000 ) ( 10200 5000 ) via2_8
+    NEW M2 ( 10200 5000 ) ( 10200 600 ) via1_4
+ ;
+- n1
+  ( U0 A )
+  + ROUTED M1 ( 200 600 ) ( 200 1000 )
+ ;
+END NETS
+END DESIGN
+"""
+
+
+def parse_design(tmpdir):
+    lef_file = tmpdir.join('test.lef')
+    lef_file.write(LEF)
+    def_file = tmpdir.join('test.def')
+    def_file.write(DEF)
+    lef_data = LefParser(str(lef_file))
+    lef_data.parse()
+    def_data = DefParser(str(def_file))
+    def_data.parse()
+    return def_data, lef_data
+
+
+def test_unranked_routes(tmpdir):
+    def_data, lef_data = parse_design(tmpdir)
+    net = def_data.nets.net_dict['n0']
+    assert net.top_layer is None
+    with pytest.raises(ValueError):
+        net.find_top_layer(lef_data.layer_ranks)
+    def_data.rank_layers(lef_data.layer_ranks)
+    assert (net.top_layer, net.top_rank) == ('M3', 3)
+    assert def_data.nets.net_dict['n1'].top_layer == 'M1'
+    assert def_data.nets.get_top_layer(lef_data.layer_ranks) == 'M3'
+
+
+def test_split_ranks_lazily(tmpdir):
+    # the DEF data is not loaded by load_inputs, the Splitter ranks it
+    def_data, lef_data = parse_design(tmpdir)
+    split_data = Splitter(def_data, lef_data, 'M3').split()
+    nets = {}
+    for each_net in split_data.nets.nets:
+        nets[each_net.name] = each_net
+    # n0 is cut in two fragments, each with the pin under its via1
+    fragments = [each_net for each_net in split_data.nets.nets
+                 if each_net.name.startswith('n0_')]
+    assert sorted(tuple(each_net.comp_pin[0]) for each_net in fragments) == \
+        [('U0', 'Z'), ('U1', 'A')]
+    for each_net in fragments:
+        assert each_net.top_layer == 'M2'
+    assert nets['n1'].top_layer == 'M1'
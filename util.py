@@ -167,6 +167,51 @@ def split_space(line):
 #         draw_pin(pin)
 
 
+def layer_ranks(layers):
+    """
+    Rank the layers in the order of the LEF file: the MASTERSLICE layers
+    (poly) have rank 0, and the ROUTING layers have rank 1, 2, etc. A higher
+    rank is a higher layer.
+    :param layers: list of lef_util.Layer objects in LEF order.
+    :return: a dictionary, layer name -> rank.
+    """
+    ranks = {}
+    rank = 0
+    for each_layer in layers:
+        if each_layer.layer_type == "ROUTING":
+            rank += 1
+            ranks[each_layer.name] = rank
+        elif each_layer.layer_type == "MASTERSLICE":
+            ranks[each_layer.name] = 0
+    return ranks
+
+
+def rank_layer(ranks, rank):
+    """
+    Get the name of the layer of a rank.
+    :param ranks: layer ranks (see layer_ranks).
+    :param rank: the rank, 1 is the lowest routing layer.
+    :return: the layer name, or None if no layer has this rank.
+    """
+    for each_layer in ranks:
+        if ranks[each_layer] == rank:
+            return each_layer
+    return None
+
+
+def layer_mask(layers, ranks):
+    """
+    Get the bit mask of a set of layers, bit k is set for the layer of rank k.
+    :param layers: layer names.
+    :param ranks: layer ranks (see layer_ranks).
+    :return: the bit mask
+    """
+    mask = 0
+    for each_layer in layers:
+        mask |= 1 << ranks[each_layer]
+    return mask
+
+
 def compare_metal(metal_a, metal_b):
     """
     Compare metal layers
@@ -402,9 +447,20 @@ def connected_routes(route1, route2):
     :param route2: route 2
     :return: True or False
     """
+    return connected_points(route1.points, route2.points)
+
+
+def connected_points(points1, points2):
+    """
+    check if two routes, given by their points, are connected (see
+    connected_routes).
+    :param points1: points of route 1
+    :param points2: points of route 2
+    :return: True or False
+    """
     result = False
-    for each_pt1 in route1.points:
-        for each_pt2 in route2.points:
+    for each_pt1 in points1:
+        for each_pt2 in points2:
             if each_pt1[:2] == each_pt2[:2]:
                 return True
     return result